@@ -6,20 +6,27 @@ from tqdm import tqdm
 from collections import defaultdict
 import numpy as np
 
+from .batch_autotune import get_batch_autotuner, get_shape_bucket
 from .model_init import AtomModelSingleton
 from .model_list import AtomicModel
 from ...utils.config_reader import get_formula_enable, get_table_enable
 from ...utils.model_utils import crop_img, get_res_list_from_layout_res, clean_vram
 from ...utils.ocr_utils import merge_det_boxes, update_det_boxes, sorted_boxes
 from ...utils.ocr_utils import get_adjusted_mfdetrec_res, get_ocr_result_list, OcrConfidence, get_rotate_crop_image
+from ...utils.ocr_utils import get_text_layer_result_lists
+from ...utils.page_buffer import PageBuffer
 from ...utils.pdf_image_tools import get_crop_np_img
 
+# layout模型在batch size为1时使用更低的置信度阈值，不参与batch size调优，以免改变版面检测结果
 YOLO_LAYOUT_BASE_BATCH_SIZE = 1
+# 以下为没有调优记录（或未开启MINERU_BATCH_AUTOTUNE）时的初始batch size，开启后由BatchSizeAutotuner按设备调整
 MFD_BASE_BATCH_SIZE = 1
 MFR_BASE_BATCH_SIZE = 16
 OCR_DET_BASE_BATCH_SIZE = 16
 TABLE_ORI_CLS_BATCH_SIZE = 16
 TABLE_Wired_Wireless_CLS_BATCH_SIZE = 16
+TABLE_WIRED_BATCH_SIZE = 4
+OCR_DET_RESOLUTION_GROUP_STRIDE = 64
 
 
 class BatchAnalyze:
@@ -29,6 +36,7 @@ class BatchAnalyze:
         self.table_enable = get_table_enable(table_enable)
         self.model_manager = model_manager
         self.enable_ocr_det_batch = enable_ocr_det_batch
+        self.autotuner = get_batch_autotuner()
 
     def __call__(self, images_with_extra_info: list) -> list:
         if len(images_with_extra_info) == 0:
@@ -43,9 +51,16 @@ class BatchAnalyze:
         )
         atom_model_manager = AtomModelSingleton()
 
-        pil_images = [image for image, _, _ in images_with_extra_info]
-
-        np_images = [np.asarray(image) for image, _, _ in images_with_extra_info]
+        # PageBuffer 直接提供零拷贝的numpy视图，兼容直接传入PIL图片的调用方
+        pil_images = []
+        np_images = []
+        for image, *_ in images_with_extra_info:
+            if isinstance(image, PageBuffer):
+                pil_images.append(image.pil_img)
+                np_images.append(image.np_img)
+            else:
+                pil_images.append(image)
+                np_images.append(np.asarray(image))
 
         # doclayout_yolo
 
@@ -53,17 +68,25 @@ class BatchAnalyze:
             pil_images, YOLO_LAYOUT_BASE_BATCH_SIZE
         )
 
-        if self.formula_enable:
-            # 公式检测
-            images_mfd_res = self.model.mfd_model.batch_predict(
-                np_images, MFD_BASE_BATCH_SIZE
-            )
+        # 后续阶段只使用numpy视图，释放layout阶段转换出的PIL图片
+        del pil_images
+        for image, *_ in images_with_extra_info:
+            if isinstance(image, PageBuffer):
+                image.release_pil()
 
-            # 公式识别
-            images_formula_list = self.model.mfr_model.batch_predict(
-                images_mfd_res,
-                np_images,
-                batch_size=self.batch_ratio * MFR_BASE_BATCH_SIZE,
+        if self.formula_enable:
+            # 公式检测，与layout相同不参与batch size调优：YOLO对同一批次中尺寸不同的图片按批次统一letterbox，
+            # batch size变化会改变检测结果
+            images_mfd_res = self.model.mfd_model.batch_predict(np_images, MFD_BASE_BATCH_SIZE)
+
+            # 公式识别，模型内部对全部公式排序后分批，OOM时整体以减半的batch size重试
+            images_formula_list = self.autotuner.run_with_batch_size(
+                f'mfr:{type(self.model.mfr_model).__name__}',
+                lambda batch_size: self.model.mfr_model.batch_predict(
+                    images_mfd_res, np_images, batch_size=batch_size,
+                ),
+                self.batch_ratio * MFR_BASE_BATCH_SIZE,
+                work_count=sum(len(mfd_res.boxes) for mfd_res in images_mfd_res),
             )
             mfr_count = 0
             for image_index in range(len(np_images)):
@@ -76,7 +99,8 @@ class BatchAnalyze:
         ocr_res_list_all_page = []
         table_res_list_all_page = []
         for index in range(len(np_images)):
-            _, ocr_enable, _lang = images_with_extra_info[index]
+            # 第4项（可选）为页面文本层的行，只有启用文本层span的txt页面才会提供
+            _, ocr_enable, _lang, *text_lines = images_with_extra_info[index]
             layout_res = images_layout_res[index]
             np_img = np_images[index]
 
@@ -90,6 +114,7 @@ class BatchAnalyze:
                                           'np_img':np_img,
                                           'single_page_mfdetrec_res':single_page_mfdetrec_res,
                                           'layout_res':layout_res,
+                                          'text_lines':text_lines[0] if text_lines else None,
                                           })
 
             for table_res in table_res_list:
@@ -141,7 +166,7 @@ class BatchAnalyze:
                     f"Table classification failed: {e}, using default model"
                 )
 
-            # OCR det 过程，顺序执行
+            # OCR det 过程，批处理模式下与正文OCR det相同，按分辨率分组后批量检测
             rec_img_lang_group = defaultdict(list)
             det_ocr_engine = atom_model_manager.get_atom_model(
                 atom_model_name=AtomicModel.OCR,
@@ -149,14 +174,32 @@ class BatchAnalyze:
                 det_db_unclip_ratio=1.6,
                 enable_merge_det_boxes=False,
             )
-            for index, table_res_dict in enumerate(
-                    tqdm(table_res_list_all_page, desc="Table-ocr det")
+            table_bgr_images = [
+                cv2.cvtColor(table_res_dict["table_img"], cv2.COLOR_RGB2BGR)
+                for table_res_dict in table_res_list_all_page
+            ]
+            if self.enable_ocr_det_batch:
+                table_dt_boxes_list = [None] * len(table_bgr_images)
+                for index, dt_boxes in iter_batch_text_det(
+                        det_ocr_engine, table_bgr_images,
+                        det_batch_size=self.batch_ratio * OCR_DET_BASE_BATCH_SIZE,
+                        desc="Table-ocr det", autotuner=self.autotuner,
+                ):
+                    dt_boxes = clip_padded_det_boxes(dt_boxes, table_bgr_images[index].shape)
+                    table_dt_boxes_list[index] = [box.tolist() for box in sorted_boxes(dt_boxes)] if len(dt_boxes) > 0 else []
+            else:
+                table_dt_boxes_list = [
+                    det_ocr_engine.ocr(bgr_image, rec=False)[0]
+                    for bgr_image in tqdm(table_bgr_images, desc="Table-ocr det")
+                ]
+            for index, (table_res_dict, bgr_image, dt_boxes) in enumerate(
+                    zip(table_res_list_all_page, table_bgr_images, table_dt_boxes_list)
             ):
-                bgr_image = cv2.cvtColor(table_res_dict["table_img"], cv2.COLOR_RGB2BGR)
-                ocr_result = det_ocr_engine.ocr(bgr_image, rec=False)[0]
-                # 构造需要 OCR 识别的图片字典，包括cropped_img, dt_box, table_id，并按照语言进行分组
-                for dt_box in ocr_result:
-                    rec_img_lang_group[_lang].append(
+                if not dt_boxes:
+                    continue
+                # 构造需要 OCR 识别的图片字典，包括cropped_img, dt_box, table_id，并按照表格自身的语言进行分组
+                for dt_box in dt_boxes:
+                    rec_img_lang_group[table_res_dict["lang"]].append(
                         {
                             "cropped_img": get_rotate_crop_image(
                                 bgr_image, np.asarray(dt_box, dtype=np.float32)
@@ -165,6 +208,7 @@ class BatchAnalyze:
                             "table_id": index,
                         }
                     )
+            del table_bgr_images
 
             # OCR rec，按照语言分批处理
             for _lang, rec_img_list in rec_img_lang_group.items():
@@ -208,21 +252,16 @@ class BatchAnalyze:
                 del table_res_dict["table_res"]["cls_label"]
                 del table_res_dict["table_res"]["cls_score"]
             if wired_table_res_list:
-                for table_res_dict in tqdm(
-                        wired_table_res_list, desc="Table-wired Predict"
-                ):
-                    if not table_res_dict.get("ocr_result", None):
-                        continue
-
+                # 有线表格模型按语言区分，同一语言的表格跨页批量预测
+                wired_table_lang_groups = defaultdict(list)
+                for table_res_dict in wired_table_res_list:
+                    wired_table_lang_groups[table_res_dict["lang"]].append(table_res_dict)
+                for _lang, lang_table_res_list in wired_table_lang_groups.items():
                     wired_table_model = atom_model_manager.get_atom_model(
                         atom_model_name=AtomicModel.WiredTable,
-                        lang=table_res_dict["lang"],
-                    )
-                    table_res_dict["table_res"]["html"] = wired_table_model.predict(
-                        table_res_dict["wired_table_img"],
-                        table_res_dict["ocr_result"],
-                        table_res_dict["table_res"].get("html", None)
+                        lang=_lang,
                     )
+                    wired_table_model.batch_predict(lang_table_res_list, batch_size=TABLE_WIRED_BATCH_SIZE)
 
             # 表格格式清理
             for table_res_dict in table_res_list_all_page:
@@ -235,6 +274,23 @@ class BatchAnalyze:
                     end_index = html_code.rfind("</table>") + len("</table>")
                     table_res_dict["table_res"]["html"] = html_code[start_index:end_index]
 
+        # 文本层span：txt页面直接用文本层的行构造span骨架，只有文本层为空或乱码的区域继续执行OCR det
+        for ocr_res_list_dict in ocr_res_list_all_page:
+            if ocr_res_list_dict['ocr_enable'] or ocr_res_list_dict['text_lines'] is None:
+                continue
+            text_layer_result_lists = get_text_layer_result_lists(
+                ocr_res_list_dict['ocr_res_list'],
+                ocr_res_list_dict['text_lines'],
+                ocr_res_list_dict['single_page_mfdetrec_res'],
+            )
+            need_det_res_list = []
+            for res, ocr_result_list in zip(ocr_res_list_dict['ocr_res_list'], text_layer_result_lists):
+                if ocr_result_list is None:
+                    need_det_res_list.append(res)
+                else:
+                    ocr_res_list_dict['layout_res'].extend(ocr_result_list)
+            ocr_res_list_dict['ocr_res_list'] = need_det_res_list
+
         # OCR det
         if self.enable_ocr_det_batch:
             # 批处理模式 - 按语言和分辨率分组
@@ -279,56 +335,30 @@ class BatchAnalyze:
                     lang=lang
                 )
 
-                # 按分辨率分组并同时完成padding
-                # RESOLUTION_GROUP_STRIDE = 32
-                RESOLUTION_GROUP_STRIDE = 64
-
-                resolution_groups = defaultdict(list)
-                for crop_info in lang_crop_list:
-                    cropped_img = crop_info[0]
-                    h, w = cropped_img.shape[:2]
-                    # 直接计算目标尺寸并用作分组键
-                    target_h = ((h + RESOLUTION_GROUP_STRIDE - 1) // RESOLUTION_GROUP_STRIDE) * RESOLUTION_GROUP_STRIDE
-                    target_w = ((w + RESOLUTION_GROUP_STRIDE - 1) // RESOLUTION_GROUP_STRIDE) * RESOLUTION_GROUP_STRIDE
-                    group_key = (target_h, target_w)
-                    resolution_groups[group_key].append(crop_info)
-
-                # 对每个分辨率组进行批处理
-                for (target_h, target_w), group_crops in tqdm(resolution_groups.items(), desc=f"OCR-det {lang}"):
-                    # 对所有图像进行padding到统一尺寸
-                    batch_images = []
-                    for crop_info in group_crops:
-                        img = crop_info[0]
-                        h, w = img.shape[:2]
-                        # 创建目标尺寸的白色背景
-                        padded_img = np.ones((target_h, target_w, 3), dtype=np.uint8) * 255
-                        padded_img[:h, :w] = img
-                        batch_images.append(padded_img)
-
-                    # 批处理检测
-                    det_batch_size = min(len(batch_images), self.batch_ratio * OCR_DET_BASE_BATCH_SIZE)
-                    batch_results = ocr_model.text_detector.batch_predict(batch_images, det_batch_size)
-
-                    # 处理批处理结果
-                    for crop_info, (dt_boxes, _) in zip(group_crops, batch_results):
-                        bgr_image, useful_list, ocr_res_list_dict, res, adjusted_mfdetrec_res, _lang = crop_info
-
-                        if dt_boxes is not None and len(dt_boxes) > 0:
-                            # 处理检测框
-                            dt_boxes_sorted = sorted_boxes(dt_boxes)
-                            dt_boxes_merged = merge_det_boxes(dt_boxes_sorted) if dt_boxes_sorted else []
-
-                            # 根据公式位置更新检测框
-                            dt_boxes_final = (update_det_boxes(dt_boxes_merged, adjusted_mfdetrec_res)
-                                              if dt_boxes_merged and adjusted_mfdetrec_res
-                                              else dt_boxes_merged)
-
-                            if dt_boxes_final:
-                                ocr_res = [box.tolist() if hasattr(box, 'tolist') else box for box in dt_boxes_final]
-                                ocr_result_list = get_ocr_result_list(
-                                    ocr_res, useful_list, ocr_res_list_dict['ocr_enable'], bgr_image, _lang
-                                )
-                                ocr_res_list_dict['layout_res'].extend(ocr_result_list)
+                # 按分辨率分组并padding后批量检测
+                for crop_index, dt_boxes in iter_batch_text_det(
+                        ocr_model, [crop_info[0] for crop_info in lang_crop_list],
+                        det_batch_size=self.batch_ratio * OCR_DET_BASE_BATCH_SIZE,
+                        desc=f"OCR-det {lang}", autotuner=self.autotuner,
+                ):
+                    bgr_image, useful_list, ocr_res_list_dict, res, adjusted_mfdetrec_res, _lang = lang_crop_list[crop_index]
+
+                    if dt_boxes is not None and len(dt_boxes) > 0:
+                        # 处理检测框
+                        dt_boxes_sorted = sorted_boxes(dt_boxes)
+                        dt_boxes_merged = merge_det_boxes(dt_boxes_sorted) if dt_boxes_sorted else []
+
+                        # 根据公式位置更新检测框
+                        dt_boxes_final = (update_det_boxes(dt_boxes_merged, adjusted_mfdetrec_res)
+                                          if dt_boxes_merged and adjusted_mfdetrec_res
+                                          else dt_boxes_merged)
+
+                        if dt_boxes_final:
+                            ocr_res = [box.tolist() if hasattr(box, 'tolist') else box for box in dt_boxes_final]
+                            ocr_result_list = get_ocr_result_list(
+                                ocr_res, useful_list, ocr_res_list_dict['ocr_enable'], bgr_image, _lang
+                            )
+                            ocr_res_list_dict['layout_res'].extend(ocr_result_list)
 
         else:
             # 原始单张处理模式
@@ -426,3 +456,62 @@ class BatchAnalyze:
                     total_processed += len(img_crop_list)
 
         return images_layout_res
+
+
+def iter_batch_text_det(ocr_model, bgr_images, det_batch_size, desc="OCR-det", autotuner=None):
+    """
+    按分辨率将图片分组（向上取整到OCR_DET_RESOLUTION_GROUP_STRIDE的倍数），组内图片在右侧和下方用白色padding到统一尺寸后批量检测。
+    padding只在右下方，检测框坐标与原图坐标一致。按分组顺序产出 (图片在bgr_images中的索引, dt_boxes)。
+    传入autotuner时，每个分组按其像素面积分桶使用调优的batch size，det_batch_size作为初始值。
+    """
+    resolution_groups = defaultdict(list)
+    for index, img in enumerate(bgr_images):
+        h, w = img.shape[:2]
+        # 直接计算目标尺寸并用作分组键
+        target_h = ((h + OCR_DET_RESOLUTION_GROUP_STRIDE - 1) // OCR_DET_RESOLUTION_GROUP_STRIDE) * OCR_DET_RESOLUTION_GROUP_STRIDE
+        target_w = ((w + OCR_DET_RESOLUTION_GROUP_STRIDE - 1) // OCR_DET_RESOLUTION_GROUP_STRIDE) * OCR_DET_RESOLUTION_GROUP_STRIDE
+        resolution_groups[(target_h, target_w)].append(index)
+
+    # 对每个分辨率组进行批处理
+    for (target_h, target_w), group_indexes in tqdm(resolution_groups.items(), desc=desc):
+        batch_images = []
+        for index in group_indexes:
+            img = bgr_images[index]
+            h, w = img.shape[:2]
+            # 创建目标尺寸的白色背景
+            padded_img = np.ones((target_h, target_w, 3), dtype=np.uint8) * 255
+            padded_img[:h, :w] = img
+            batch_images.append(padded_img)
+
+        def predict(images, batch_size):
+            return ocr_model.text_detector.batch_predict(images, min(len(images), batch_size))
+
+        if autotuner is None:
+            batch_results = predict(batch_images, det_batch_size)
+        else:
+            batch_results = autotuner.run_batches(
+                'ocr_det', batch_images, predict, det_batch_size, shape_bucket=get_shape_bucket(target_h, target_w),
+            )
+        for index, (dt_boxes, _) in zip(group_indexes, batch_results):
+            yield index, dt_boxes
+
+
+def clip_padded_det_boxes(dt_boxes, image_shape):
+    """
+    将padding后图片上的检测框裁剪回原图范围，与单张检测时filter_tag_det_res按原图尺寸裁剪的结果一致，
+    裁剪后宽或高不超过3像素的框（落在padding区域内的框）被丢弃。
+    """
+    if dt_boxes is None or len(dt_boxes) == 0:
+        return []
+    img_height, img_width = image_shape[:2]
+    clipped_boxes = []
+    for box in dt_boxes:
+        box = np.array(box, dtype=np.float32)
+        box[:, 0] = np.clip(box[:, 0], 0, img_width - 1)
+        box[:, 1] = np.clip(box[:, 1], 0, img_height - 1)
+        rect_width = int(np.linalg.norm(box[0] - box[1]))
+        rect_height = int(np.linalg.norm(box[0] - box[3]))
+        if rect_width <= 3 or rect_height <= 3:
+            continue
+        clipped_boxes.append(box)
+    return np.array(clipped_boxes)
@@ -0,0 +1,275 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import math
+import os
+import threading
+import time
+
+from loguru import logger
+
+from mineru.utils.config_reader import get_device
+from mineru.utils.model_utils import clean_memory
+
+try:
+    import torch
+except ImportError:
+    pass
+
+PROFILE_VERSION = 1
+# 加倍batch size后吞吐提升不足该比例时停止探测
+MIN_THROUGHPUT_GAIN = 0.05
+
+
+def get_batch_autotune_enable(device=None):
+    """环境变量MINERU_BATCH_AUTOTUNE未设置时，只在GPU/NPU等加速设备上开启"""
+    autotune_env = os.getenv('MINERU_BATCH_AUTOTUNE', None)
+    if autotune_env is not None:
+        return str(autotune_env).lower() in ('1', 'true', 'yes')
+    device = get_device() if device is None else device
+    return not str(device).startswith('cpu')
+
+
+def get_batch_autotune_max_size():
+    try:
+        max_size = int(os.getenv('MINERU_BATCH_AUTOTUNE_MAX_SIZE', 256))
+    except ValueError:
+        max_size = 256
+    return max(1, max_size)
+
+
+def get_batch_profile_path():
+    default_path = os.path.join(os.path.expanduser('~'), '.cache', 'mineru', 'batch_profile.json')
+    return os.getenv('MINERU_BATCH_PROFILE_PATH', default_path)
+
+
+def is_oom_error(e):
+    try:
+        if isinstance(e, torch.cuda.OutOfMemoryError):
+            return True
+    except NameError:
+        pass
+    return isinstance(e, RuntimeError) and 'out of memory' in str(e).lower()
+
+
+def get_device_signature(device):
+    """设备标识包含型号和显存，换卡后不会复用旧的调优结果"""
+    device = str(device)
+    try:
+        if device.startswith('cuda') and torch.cuda.is_available():
+            properties = torch.cuda.get_device_properties(device)
+            return f"{device}|{properties.name}|{round(properties.total_memory / (1024 ** 3))}GB"
+    except Exception:
+        pass
+    return device
+
+
+def get_shape_bucket(height, width):
+    """按像素面积向上取整到2的幂分桶，显存占用主要由输入面积决定"""
+    return f"{2 ** math.ceil(math.log2(max(1, height * width)))}px"
+
+
+class _TuneState:
+    __slots__ = ('batch_size', 'max_batch_size', 'tuned', 'best_batch_size', 'best_throughput', 'oom_count')
+
+    def __init__(self, batch_size, max_batch_size=None, tuned=False):
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.tuned = tuned
+        self.best_batch_size = batch_size
+        self.best_throughput = 0.0
+        self.oom_count = 0
+
+    def to_dict(self):
+        return {'batch_size': self.batch_size, 'max_batch_size': self.max_batch_size, 'oom_count': self.oom_count}
+
+
+class BatchSizeAutotuner:
+    """
+    按 (模型, 设备, 输入尺寸分桶) 自适应选择batch size：
+
+    - 没有调优记录时从调用方给出的初始值开始，每个满批次测量吞吐，吞吐提升超过5%就把batch size加倍，
+      直到吞吐不再提升、达到MINERU_BATCH_AUTOTUNE_MAX_SIZE或出现显存不足；
+    - 推理出现OOM时释放显存并将batch size减半（上限同时记录下来），失败的批次拆成两半重试；
+    - 调优结果保存在磁盘上的profile（MINERU_BATCH_PROFILE_PATH）中，下次启动直接使用。
+
+    未开启时（CPU设备默认关闭）按初始值调用，与调优前的行为完全一致。
+    """
+
+    def __init__(self, profile_path=None, max_batch_size=None, enable=None):
+        self.profile_path = get_batch_profile_path() if profile_path is None else profile_path
+        self.max_batch_size = get_batch_autotune_max_size() if max_batch_size is None else max_batch_size
+        self.enable = enable
+        self._lock = threading.Lock()
+        self._states = {}
+        self._load_profile()
+
+    def _is_enabled(self, device):
+        return get_batch_autotune_enable(device) if self.enable is None else self.enable
+
+    def _load_profile(self):
+        if not self.profile_path or not os.path.exists(self.profile_path):
+            return
+        try:
+            with open(self.profile_path, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+            if profile.get('version') != PROFILE_VERSION:
+                return
+            for key, entry in profile.get('entries', {}).items():
+                self._states[key] = _TuneState(entry['batch_size'], entry.get('max_batch_size'), tuned=True)
+            logger.info(f'Loaded {len(self._states)} tuned batch sizes from {self.profile_path}')
+        except Exception as e:
+            logger.warning(f'Failed to load batch size profile {self.profile_path}: {e}')
+
+    def _save_profile(self):
+        """调用方需持有self._lock"""
+        if not self.profile_path:
+            return
+        entries = {key: state.to_dict() for key, state in self._states.items() if state.tuned}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.profile_path)), exist_ok=True)
+            tmp_path = f'{self.profile_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': PROFILE_VERSION, 'entries': entries}, f, indent=2)
+            os.replace(tmp_path, self.profile_path)
+        except Exception as e:
+            logger.warning(f'Failed to save batch size profile {self.profile_path}: {e}')
+
+    def _get_state(self, key, initial_batch_size):
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = _TuneState(max(1, min(initial_batch_size, self.max_batch_size)))
+                self._states[key] = state
+            return state
+
+    def get_batch_size(self, model_name, initial_batch_size, shape_bucket=None):
+        """只读取当前的batch size（例如传给内部自行分批的模型），不参与探测"""
+        device = get_device()
+        if not self._is_enabled(device):
+            return initial_batch_size
+        return self._get_state(self._make_key(model_name, device, shape_bucket), initial_batch_size).batch_size
+
+    @staticmethod
+    def _make_key(model_name, device, shape_bucket):
+        return f"{model_name}|{get_device_signature(device)}|{shape_bucket or 'any'}"
+
+    def _observe(self, key, state, work_count, batch_size, elapsed):
+        """记录一个满批次的吞吐，探测阶段据此决定下一个batch size"""
+        if state.tuned or work_count < batch_size or elapsed <= 0:
+            return
+        throughput = work_count / elapsed
+        with self._lock:
+            if state.tuned or batch_size != state.batch_size:
+                return
+            ceiling = min(self.max_batch_size, state.max_batch_size or self.max_batch_size)
+            if throughput > state.best_throughput * (1 + MIN_THROUGHPUT_GAIN):
+                state.best_throughput = throughput
+                state.best_batch_size = batch_size
+                if batch_size * 2 <= ceiling:
+                    state.batch_size = batch_size * 2
+                    return
+            state.batch_size = state.best_batch_size
+            state.tuned = True
+            logger.info(f'Batch size tuned: {key} -> {state.batch_size} ({state.best_throughput:.1f} items/s)')
+            self._save_profile()
+
+    def _on_oom(self, key, state, batch_size, device):
+        clean_memory(device)
+        with self._lock:
+            state.oom_count += 1
+            state.max_batch_size = max(1, batch_size // 2)
+            state.batch_size = min(state.batch_size, state.max_batch_size)
+            state.best_batch_size = min(state.best_batch_size, state.max_batch_size)
+            if state.tuned:
+                self._save_profile()
+        logger.warning(f'Out of memory at batch size {batch_size} for {key}, backing off to {state.batch_size}')
+
+    def _predict_with_backoff(self, key, state, chunk, predict_fn, device):
+        # 已知会OOM的大小直接拆分，不再尝试
+        if state.max_batch_size is None or len(chunk) <= state.max_batch_size:
+            try:
+                return predict_fn(chunk, len(chunk))
+            except Exception as e:
+                if not is_oom_error(e) or len(chunk) == 1:
+                    raise
+            # 在except块之外释放显存，异常的traceback不再引用推理中的张量
+            self._on_oom(key, state, len(chunk), device)
+        half = len(chunk) // 2
+        return (
+            self._predict_with_backoff(key, state, chunk[:half], predict_fn, device)
+            + self._predict_with_backoff(key, state, chunk[half:], predict_fn, device)
+        )
+
+    def run_batches(self, model_name, items, predict_fn, initial_batch_size, shape_bucket=None):
+        """
+        按调优的batch size将items分批调用 predict_fn(batch, batch_size)，返回按顺序拼接的结果。
+        未开启时直接调用 predict_fn(items, initial_batch_size)。
+        """
+        device = get_device()
+        if not items or not self._is_enabled(device):
+            return predict_fn(items, initial_batch_size)
+        key = self._make_key(model_name, device, shape_bucket)
+        state = self._get_state(key, initial_batch_size)
+
+        results = []
+        index = 0
+        while index < len(items):
+            batch_size = state.batch_size
+            chunk = items[index:index + batch_size]
+            start_time = time.perf_counter()
+            results.extend(self._predict_with_backoff(key, state, chunk, predict_fn, device))
+            self._observe(key, state, len(chunk), batch_size, time.perf_counter() - start_time)
+            index += len(chunk)
+        return results
+
+    def run_with_batch_size(self, model_name, predict_fn, initial_batch_size, work_count, shape_bucket=None):
+        """
+        用于内部自行分批的模型（例如公式识别先对全部公式排序再分批）：以调优的batch size调用 predict_fn(batch_size)，
+        OOM时batch size减半后整体重试。work_count为本次调用的工作量（例如公式数），用于计算吞吐。
+        """
+        device = get_device()
+        if not self._is_enabled(device):
+            return predict_fn(initial_batch_size)
+        key = self._make_key(model_name, device, shape_bucket)
+        state = self._get_state(key, initial_batch_size)
+        while True:
+            batch_size = state.batch_size
+            start_time = time.perf_counter()
+            try:
+                results = predict_fn(batch_size)
+            except Exception as e:
+                if not is_oom_error(e) or batch_size == 1:
+                    raise
+                results = None
+            # 在except块之外释放显存，异常的traceback不再引用推理中的张量
+            if results is None:
+                self._on_oom(key, state, batch_size, device)
+                continue
+            self._observe(key, state, work_count, batch_size, time.perf_counter() - start_time)
+            return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'profile_path': self.profile_path,
+                'entries': {key: dict(state.to_dict(), tuned=state.tuned) for key, state in self._states.items()},
+            }
+
+
+_batch_autotuner = None
+_batch_autotuner_lock = threading.Lock()
+
+
+def get_batch_autotuner():
+    """进程内共享的batch size调优器，首次调用时加载磁盘上的profile"""
+    global _batch_autotuner
+    with _batch_autotuner_lock:
+        if _batch_autotuner is None:
+            _batch_autotuner = BatchSizeAutotuner()
+        return _batch_autotuner
+
+
+def get_batch_autotune_stats():
+    with _batch_autotuner_lock:
+        autotuner = _batch_autotuner
+    return autotuner.stats() if autotuner is not None else None
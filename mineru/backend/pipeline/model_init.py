@@ -1,4 +1,5 @@
 import os
+import threading
 
 import torch
 from loguru import logger
@@ -14,7 +15,9 @@ from ...model.table.cls.paddle_table_cls import PaddleTableClsModel
 # from ...model.table.rec.RapidTable import RapidTableModel
 from ...model.table.rec.slanet_plus.main import RapidTableModel
 from ...model.table.rec.unet_table.main import UnetTableModel
+from ...utils.config_reader import get_device, get_model_replica_key
 from ...utils.enum_class import ModelPath
+from ...utils.model_registry import track_model_load
 from ...utils.models_download_utils import auto_download_and_get_model_root_path
 
 MFR_MODEL = os.getenv('MINERU_FORMULA_CH_SUPPORT', 'False')
@@ -120,6 +123,7 @@ def ocr_model_init(det_db_box_thresh=0.3,
 class AtomModelSingleton:
     _instance = None
     _models = {}
+    _lock = threading.RLock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -145,11 +149,25 @@ class AtomModelSingleton:
             )
         else:
             key = atom_model_name
+        # 多设备推理时每个设备的模型副本单独缓存
+        key = (key, get_model_replica_key())
 
-        if key not in self._models:
-            self._models[key] = atom_model_init(model_name=atom_model_name, **kwargs)
+        with self._lock:
+            if key not in self._models:
+                with track_model_load(get_atom_model_label(key), kwargs.get('device') or get_device()):
+                    self._models[key] = atom_model_init(model_name=atom_model_name, **kwargs)
         return self._models[key]
 
+
+def get_atom_model_label(key):
+    """将AtomModelSingleton的缓存key转换为/models接口中展示的名称，例如 ocr:0.3:ch:1.8:True"""
+    model_key, replica_key = key
+    parts = model_key if isinstance(model_key, tuple) else (model_key,)
+    label = ':'.join(str(part) for part in parts if part is not None)
+    if replica_key is not None:
+        label += f'@{replica_key[0]}#{replica_key[1]}'
+    return label
+
 def atom_model_init(model_name: str, **kwargs):
     atom_model = None
     if model_name == AtomicModel.Layout:
@@ -10,27 +10,49 @@ from mineru.utils.config_reader import get_device, get_llm_aided_config, get_for
 from mineru.backend.pipeline.model_init import AtomModelSingleton
 from mineru.backend.pipeline.para_split import para_split
 from mineru.utils.block_pre_proc import prepare_block_bboxes, process_groups
-from mineru.utils.block_sort import sort_blocks_by_bbox
+from mineru.utils.block_sort import sort_blocks_by_bbox, batch_sort_blocks_by_bbox
 from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio
 from mineru.utils.cut_image import cut_image_and_table
+from mineru.utils.document_handle import DocumentHandle
 from mineru.utils.enum_class import ContentType
 from mineru.utils.llm_aided import llm_aided_title
 from mineru.utils.model_utils import clean_memory
+from mineru.backend.pipeline.page_batcher import run_model_call
 from mineru.backend.pipeline.pipeline_magic_model import MagicModel
 from mineru.utils.ocr_utils import OcrConfidence
+from mineru.utils.pdfium_lock import pdfium_lock
 from mineru.utils.span_block_fix import fill_spans_in_blocks, fix_discarded_block, fix_block_spans
 from mineru.utils.span_pre_proc import remove_outside_spans, remove_overlaps_low_confidence_spans, \
     remove_overlaps_min_spans, txt_spans_extract
 from mineru.version import __version__
-from mineru.utils.hash_utils import bytes_md5
+from mineru.utils.page_buffer import get_page_buffer
 
 
 def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer, page_index, ocr_enable=False, formula_enabled=True):
+    page_blocks = page_model_info_to_page_blocks(
+        page_model_info, image_dict, page, image_writer, page_index, ocr_enable=ocr_enable, formula_enabled=formula_enabled
+    )
+    if page_blocks is None:
+        return None
+    fix_blocks, fix_discarded_blocks, footnote_blocks, page_w, page_h = page_blocks
+
+    """对block进行排序"""
+    sorted_blocks = run_model_call(sort_blocks_by_bbox, fix_blocks, page_w, page_h, footnote_blocks)
+
+    """构造page_info"""
+    page_info = make_page_info_dict(sorted_blocks, page_index, page_w, page_h, fix_discarded_blocks)
+
+    return page_info
+
+
+def page_model_info_to_page_blocks(page_model_info, image_dict, page, image_writer, page_index, ocr_enable=False, formula_enabled=True):
+    """完成排序之前的所有单页处理，返回(fix_blocks, fix_discarded_blocks, footnote_blocks, page_w, page_h)，页面没有有效bbox时返回None"""
     scale = image_dict["scale"]
-    page_pil_img = image_dict["img_pil"]
+    page_buffer = get_page_buffer(image_dict)
     # page_img_md5 = str_md5(image_dict["img_base64"])
-    page_img_md5 = bytes_md5(page_pil_img.tobytes())
-    page_w, page_h = map(int, page.get_size())
+    page_img_md5 = page_buffer.md5
+    with pdfium_lock:
+        page_w, page_h = map(int, page.get_size())
     magic_model = MagicModel(page_model_info, scale)
 
     """从magic_model对象中获取后面会用到的区块信息"""
@@ -139,7 +161,7 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
         pass
     else:
         """使用新版本的混合ocr方案."""
-        spans = txt_spans_extract(page, spans, page_pil_img, scale, all_bboxes, all_discarded_blocks)
+        spans = txt_spans_extract(page, spans, page_buffer, scale, all_bboxes, all_discarded_blocks)
 
     """先处理不需要排版的discarded_blocks"""
     discarded_block_with_spans, spans = fill_spans_in_blocks(
@@ -155,7 +177,7 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
     for span in spans:
         if span['type'] in [ContentType.IMAGE, ContentType.TABLE, ContentType.INTERLINE_EQUATION]:
             span = cut_image_and_table(
-                span, page_pil_img, page_img_md5, page_index, image_writer, scale=scale
+                span, page_buffer, page_img_md5, page_index, image_writer, scale=scale
             )
 
     """span填充进block"""
@@ -164,34 +186,73 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
     """对block进行fix操作"""
     fix_blocks = fix_block_spans(block_with_spans)
 
-    """对block进行排序"""
-    sorted_blocks = sort_blocks_by_bbox(fix_blocks, page_w, page_h, footnote_blocks)
+    return fix_blocks, fix_discarded_blocks, footnote_blocks, page_w, page_h
 
-    """构造page_info"""
-    page_info = make_page_info_dict(sorted_blocks, page_index, page_w, page_h, fix_discarded_blocks)
 
-    return page_info
+def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=None, ocr_enable=False, formula_enabled=True):
+    middle_json = init_middle_json()
+    append_batch_results_to_middle_json(
+        middle_json, model_list, images_list, pdf_doc, image_writer,
+        page_start_index=0, lang=lang, ocr_enable=ocr_enable, formula_enabled=formula_enabled
+    )
+    finalize_middle_json(middle_json, pdf_doc, page_count=len(model_list))
+    return middle_json
 
 
-def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=None, ocr_enable=False, formula_enabled=True):
-    middle_json = {"pdf_info": [], "_backend":"pipeline", "_version_name": __version__}
+def init_middle_json():
+    return {"pdf_info": [], "_backend":"pipeline", "_version_name": __version__}
+
+
+def append_batch_results_to_middle_json(
+        middle_json,
+        batch_model_list,
+        batch_images_list,
+        pdf_doc,
+        image_writer,
+        page_start_index=0,
+        lang=None,
+        ocr_enable=False,
+        formula_enabled=True,
+):
+    """将一批连续页面的模型结果转换为page_info并追加到middle_json中，供按页面窗口流式处理时复用"""
     formula_enabled = get_formula_enable(formula_enabled)
-    for page_index, page_model_info in tqdm(enumerate(model_list), total=len(model_list), desc="Processing pages"):
-        page = pdf_doc[page_index]
-        image_dict = images_list[page_index]
-        page_info = page_model_info_to_page_info(
+    batch_page_infos = []
+    sort_page_indexes = []
+    sort_page_list = []
+    for batch_index, page_model_info in tqdm(enumerate(batch_model_list), total=len(batch_model_list), desc="Processing pages"):
+        page_index = page_start_index + batch_index
+        image_dict = batch_images_list[batch_index]
+        # 只有取页面、页面尺寸和文本层的pdfium调用持有pdfium_lock（在各自的调用处加锁），
+        # 截图写出和span处理不持锁，可以与渲染线程和其他请求并行
+        with pdfium_lock:
+            page = pdf_doc[page_index]
+        page_blocks = page_model_info_to_page_blocks(
             page_model_info, image_dict, page, image_writer, page_index, ocr_enable=ocr_enable, formula_enabled=formula_enabled
         )
-        if page_info is None:
-            page_w, page_h = map(int, page.get_size())
+        with pdfium_lock:
+            if page_blocks is None:
+                page_w, page_h = map(int, page.get_size())
+            # PdfPage在持锁时释放，避免在其他线程调用pdfium时关闭页面
+            del page
+        if page_blocks is None:
             page_info = make_page_info_dict([], page_index, page_w, page_h, [])
-        middle_json["pdf_info"].append(page_info)
+        else:
+            fix_blocks, fix_discarded_blocks, footnote_blocks, page_w, page_h = page_blocks
+            page_info = make_page_info_dict(None, page_index, page_w, page_h, fix_discarded_blocks)
+            sort_page_indexes.append(batch_index)
+            sort_page_list.append((fix_blocks, page_w, page_h, footnote_blocks))
+        batch_page_infos.append(page_info)
+
+    """对整批页面的block排序，layoutreader跨页批量推理"""
+    sorted_blocks_list = run_model_call(batch_sort_blocks_by_bbox, sort_page_list)
+    for batch_index, sorted_blocks in zip(sort_page_indexes, sorted_blocks_list):
+        batch_page_infos[batch_index]['preproc_blocks'] = sorted_blocks
 
     """后置ocr处理"""
     need_ocr_list = []
     img_crop_list = []
     text_block_list = []
-    for page_info in middle_json["pdf_info"]:
+    for page_info in batch_page_infos:
         for block in page_info['preproc_blocks']:
             if block['type'] in ['table', 'image']:
                 for sub_block in block['blocks']:
@@ -215,7 +276,8 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
             det_db_box_thresh=0.3,
             lang=lang
         )
-        ocr_res_list = ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
+        # 与调度线程中的批次推理共用同一个OCR模型
+        ocr_res_list = run_model_call(ocr_model.ocr, img_crop_list, det=False, tqdm_enable=True)[0]
         assert len(ocr_res_list) == len(
             need_ocr_list), f'ocr_res_list: {len(ocr_res_list)}, need_ocr_list: {len(need_ocr_list)}'
         for index, span in enumerate(need_ocr_list):
@@ -227,6 +289,12 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
                 span['content'] = ''
                 span['score'] = 0.0
 
+    middle_json["pdf_info"].extend(batch_page_infos)
+    return batch_page_infos
+
+
+def finalize_middle_json(middle_json, pdf_doc, page_count=None):
+    """所有页面追加完成后执行文档级的后处理（分段、跨页表格合并、llm优化），并释放pdf_doc"""
     """分段"""
     para_split(middle_json["pdf_info"])
 
@@ -246,8 +314,13 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
                 logger.info(f'llm aided title time: {round(time.time() - llm_aided_title_start_time, 2)}')
 
     """清理内存"""
-    pdf_doc.close()
-    if os.getenv('MINERU_DONOT_CLEAN_MEM') is None and len(model_list) >= 10:
+    # DocumentHandle在整个解析流程中共享，由创建方关闭
+    if not isinstance(pdf_doc, DocumentHandle):
+        with pdfium_lock:
+            pdf_doc.close()
+    if page_count is None:
+        page_count = len(middle_json["pdf_info"])
+    if os.getenv('MINERU_DONOT_CLEAN_MEM') is None and page_count >= 10:
         clean_memory(get_device())
 
     return middle_json
@@ -0,0 +1,236 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from loguru import logger
+from PIL import Image, ImageDraw
+
+from mineru.utils.config_reader import device_context, get_device, get_formula_enable, get_table_enable
+from mineru.utils.model_registry import get_loaded_models
+from .multi_device import get_pipeline_devices
+from .page_batcher import run_model_call
+
+# 合成页面的尺寸，与pipeline后端按200dpi渲染的A4页面一致
+WARMUP_PAGE_SIZE = (1654, 2339)
+
+
+def get_model_preload_enable(default=False):
+    """环境变量MINERU_MODEL_PRELOAD未设置时返回default，mineru-api默认不预加载，LitServe服务默认预加载"""
+    preload_env = os.getenv('MINERU_MODEL_PRELOAD', None)
+    if preload_env is None:
+        return default
+    return str(preload_env).lower() in ('1', 'true', 'yes')
+
+
+def get_preload_langs():
+    langs = [lang.strip() for lang in os.getenv('MINERU_PRELOAD_LANGS', 'ch').split(',') if lang.strip()]
+    return langs or ['ch']
+
+
+def get_warmup_replicas():
+    """
+    需要预热的模型副本：MINERU_PIPELINE_DEVICES配置了多个设备时为各设备线程使用的(replica, device)，
+    否则为默认设备上的模型（None）
+    """
+    devices = get_pipeline_devices()
+    if devices is None or len(devices) < 2:
+        return [None]
+    return list(enumerate(devices))
+
+
+def make_warmup_page():
+    """生成一页包含标题、正文、公式和表格框线的合成页面，使各阶段的模型都执行一次前向推理"""
+    width, height = WARMUP_PAGE_SIZE
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.text((150, 150), 'MinerU warm-up page', fill='black')
+    for line_index in range(12):
+        draw.text((150, 260 + line_index * 40), 'The quick brown fox jumps over the lazy dog 0123456789', fill='black')
+    draw.text((150, 800), 'E = mc^2 + \\sum_{i=1}^{n} x_i', fill='black')
+    table_left, table_top, cell_width, cell_height = 150, 950, 300, 80
+    for row in range(5):
+        for col in range(4):
+            x0, y0 = table_left + col * cell_width, table_top + row * cell_height
+            draw.rectangle((x0, y0, x0 + cell_width, y0 + cell_height), outline='black', width=2)
+            draw.text((x0 + 20, y0 + 30), f'{row}-{col}', fill='black')
+    return image
+
+
+class _WarmupStatus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = 'not_started'  # not_started / loading / ready / failed
+        self.error = None
+        self.config = None
+        self.duration = None
+        self.stages = []
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'error': self.error,
+                'config': self.config,
+                'duration': self.duration,
+                'stages': list(self.stages),
+            }
+
+
+_warmup_status = _WarmupStatus()
+
+
+def _run_stage(stage, fn):
+    start_time = time.perf_counter()
+    # 服务在预热期间已经可以接收请求，预热的模型调用与请求线程中的模型调用串行
+    run_model_call(fn)
+    stage_time = round(time.perf_counter() - start_time, 3)
+    with _warmup_status.lock:
+        _warmup_status.stages.append({'stage': stage, 'time': stage_time})
+    logger.info(f'Warm-up stage {stage}: {stage_time}s')
+
+
+def warmup_pipeline_models(langs=None, formula_enable=None, table_enable=None):
+    """
+    预加载pipeline后端的模型并用一页合成页面对每个阶段执行一次推理（layout、公式检测/识别、各语言的OCR检测/识别、
+    表格方向/有线无线分类、阅读顺序），使第一个请求不再承担权重加载和CUDA/cuDNN的初始化开销。
+    有线/无线表格识别模型只加载不推理（它们需要完整的表格检测结果作为输入）。
+    MINERU_PIPELINE_DEVICES配置了多个设备时，在每个设备的device_context中分别预热该设备的模型副本，全部完成后才就绪。
+    langs默认由环境变量MINERU_PRELOAD_LANGS设置，公式/表格开关默认遵循MINERU_FORMULA_ENABLE/MINERU_TABLE_ENABLE。
+    """
+    langs = get_preload_langs() if langs is None else langs
+    formula_enable = get_formula_enable(True) if formula_enable is None else formula_enable
+    table_enable = get_table_enable(True) if table_enable is None else table_enable
+    with _warmup_status.lock:
+        _warmup_status.state = 'loading'
+        _warmup_status.error = None
+        _warmup_status.config = None
+        _warmup_status.stages = []
+
+    start_time = time.perf_counter()
+    try:
+        config = {
+            'langs': langs, 'formula_enable': formula_enable, 'table_enable': table_enable, 'device': get_device(),
+            'devices': get_pipeline_devices(),
+        }
+        with _warmup_status.lock:
+            _warmup_status.config = config
+        logger.info(f'Warming up pipeline models: {config}')
+
+        pil_image = make_warmup_page()
+        replicas = get_warmup_replicas()
+        for replica in replicas:
+            if replica is None:
+                _warmup_analyze_models(pil_image, langs, formula_enable, table_enable)
+            else:
+                replica_index, device = replica
+                with device_context(device, replica_index):
+                    _warmup_analyze_models(
+                        pil_image, langs, formula_enable, table_enable, stage_prefix=f'{device}#{replica_index}:'
+                    )
+        if replicas != [None]:
+            # 多设备推理时，middle_json后处理中的OCR仍在请求线程中使用默认设备的模型
+            _warmup_ocr_models(np.asarray(pil_image), langs)
+        _warmup_reading_order()
+    except Exception as e:
+        with _warmup_status.lock:
+            _warmup_status.state = 'failed'
+            _warmup_status.error = str(e)
+            _warmup_status.duration = round(time.perf_counter() - start_time, 3)
+        logger.exception(e)
+        raise
+
+    with _warmup_status.lock:
+        _warmup_status.state = 'ready'
+        _warmup_status.duration = round(time.perf_counter() - start_time, 3)
+    logger.info(f'Pipeline models ready in {_warmup_status.duration}s')
+
+
+def _warmup_ocr_models(np_image, langs, stage_prefix=''):
+    from .model_init import AtomModelSingleton
+    from .model_list import AtomicModel
+
+    text_bgr = cv2.cvtColor(np_image[140:760, 140:1400], cv2.COLOR_RGB2BGR)
+    for lang in langs:
+        ocr_model = AtomModelSingleton().get_atom_model(atom_model_name=AtomicModel.OCR, det_db_box_thresh=0.3, lang=lang)
+        _run_stage(f'{stage_prefix}ocr:{lang}', lambda: ocr_model.ocr(text_bgr))
+
+
+def _warmup_analyze_models(pil_image, langs, formula_enable, table_enable, stage_prefix=''):
+    """在当前线程的设备（device_context）上加载并预热页面推理阶段的模型"""
+    from .model_init import AtomModelSingleton
+    from .model_list import AtomicModel
+    from .pipeline_analyze import ModelSingleton
+    from mineru.utils.model_utils import clean_memory
+
+    np_image = np.asarray(pil_image)
+    table_crop = np_image[940:1360, 140:1360]
+    atom_model_manager = AtomModelSingleton()
+
+    model = ModelSingleton().get_model(lang=None, formula_enable=formula_enable, table_enable=table_enable)
+    _run_stage(f'{stage_prefix}layout', lambda: model.layout_model.batch_predict([pil_image], 1))
+    if formula_enable:
+        _run_stage(f'{stage_prefix}mfd', lambda: model.mfd_model.batch_predict([np_image], 1))
+        _run_stage(f'{stage_prefix}mfr', lambda: model.mfr_model.recognize_crops([np_image[790:840, 140:700]], 1))
+
+    _warmup_ocr_models(np_image, langs, stage_prefix)
+
+    if table_enable:
+        _run_stage(f'{stage_prefix}table_cls', lambda: (
+            atom_model_manager.get_atom_model(atom_model_name=AtomicModel.ImgOrientationCls).predict(table_crop),
+            atom_model_manager.get_atom_model(atom_model_name=AtomicModel.TableCls).predict(table_crop),
+        ))
+        for lang in langs:
+            _run_stage(f'{stage_prefix}table_models:{lang}', lambda: (
+                atom_model_manager.get_atom_model(
+                    atom_model_name=AtomicModel.OCR, det_db_box_thresh=0.5, det_db_unclip_ratio=1.6,
+                    lang=lang, enable_merge_det_boxes=False,
+                ),
+                atom_model_manager.get_atom_model(atom_model_name=AtomicModel.WirelessTable, lang=lang),
+                atom_model_manager.get_atom_model(atom_model_name=AtomicModel.WiredTable, lang=lang),
+            ))
+    clean_memory(get_device())
+
+
+def _warmup_reading_order():
+    # 阅读顺序模型在请求线程中调用，只有默认设备上的一个副本
+    from mineru.utils.block_sort import ModelSingleton as SortModelSingleton, do_predict
+
+    sort_model = SortModelSingleton().get_model('layoutreader')
+    _run_stage('reading_order', lambda: do_predict(
+        [[100, 100 + index * 50, 900, 130 + index * 50] for index in range(8)], sort_model
+    ))
+
+
+def start_background_warmup(**kwargs):
+    """在后台线程中执行warmup_pipeline_models，服务可以先启动并通过/ready报告进度"""
+    thread = threading.Thread(target=_background_warmup, kwargs=kwargs, name='mineru-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def _background_warmup(**kwargs):
+    try:
+        warmup_pipeline_models(**kwargs)
+    except Exception:
+        # 错误已记录在预热状态中，由/ready报告
+        pass
+
+
+def get_warmup_status():
+    return _warmup_status.to_dict()
+
+
+def is_models_ready():
+    """未开启预加载时模型按需加载，始终视为就绪；开启后预热完成才就绪"""
+    state = get_warmup_status()['state']
+    return state == 'ready' or (state == 'not_started' and not get_model_preload_enable())
+
+
+def get_models_info():
+    return {
+        'warmup': get_warmup_status(),
+        'models': get_loaded_models(),
+    }
@@ -0,0 +1,191 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from loguru import logger
+
+from mineru.utils.config_reader import device_context
+
+# 自动分片时每个设备平均分到的分片数，分片越多负载越均衡，但每个分片都有一次BatchAnalyze的调度开销
+SHARDS_PER_DEVICE = 4
+
+
+def parse_device_list(devices):
+    """将 'cuda:0,cuda:1' 形式的字符串或设备列表规范化为设备列表，空值返回None"""
+    if devices is None:
+        return None
+    if isinstance(devices, str):
+        devices = devices.split(',')
+    devices = [str(device).strip() for device in devices if str(device).strip()]
+    return devices or None
+
+
+def get_pipeline_devices():
+    """pipeline后端的数据并行设备列表，由环境变量MINERU_PIPELINE_DEVICES设置，例如 cuda:0,cuda:1"""
+    return parse_device_list(os.getenv('MINERU_PIPELINE_DEVICES', None))
+
+
+def get_pipeline_shard_pages():
+    try:
+        shard_pages = int(os.getenv('MINERU_PIPELINE_SHARD_PAGES', 0))
+    except ValueError:
+        shard_pages = 0
+    return max(0, shard_pages)
+
+
+class _ShardJob:
+    """一次analyze调用：所有分片完成（或任一分片失败）后唤醒调用方"""
+
+    def __init__(self, shard_count, page_count):
+        self.results = [None] * page_count
+        self.remaining = shard_count
+        self.error = None
+        self.done = threading.Event()
+
+
+class MultiDeviceAnalyzer:
+    """
+    进程内多设备数据并行推理：每个设备一个常驻推理线程和一套模型副本，页面按分片放入共享队列，
+    空闲的设备线程从队列中取下一个分片（work stealing），速度快的设备自然处理更多分片。
+    分片结果按原页面顺序拼回，对调用方与analyze_fn(images_with_extra_info, formula_enable, table_enable)等价。
+
+    设备线程在device_context中执行analyze_fn，get_device()返回该线程的设备，ModelSingleton/AtomModelSingleton
+    按设备和副本序号分别创建模型。同一设备可以重复出现（例如 cpu,cpu），每次出现对应一个独立的副本。
+
+    只有analyze_fn在设备线程中执行；生成middle_json时的OCR（无文本层span的识别）和layoutreader阅读顺序
+    仍在请求线程中执行，使用默认设备（MINERU_DEVICE_MODE，未设置时自动选择）上的模型，
+    因此默认设备上除副本外还会常驻一套OCR和layoutreader模型。
+    """
+
+    def __init__(self, analyze_fn, devices, shard_pages=None):
+        self.analyze_fn = analyze_fn
+        self.devices = list(devices)
+        self.shard_pages = get_pipeline_shard_pages() if shard_pages is None else shard_pages
+        self._cond = threading.Condition()
+        self._shards = deque()  # (job, start, images_with_extra_info, formula_enable, table_enable)
+        self._closed = False
+        self._device_stats = [
+            {'device': device, 'shards': 0, 'pages': 0, 'busy_time': 0.0, 'failed_shards': 0}
+            for device in self.devices
+        ]
+        self._threads = []
+        for replica, device in enumerate(self.devices):
+            thread = threading.Thread(
+                target=self._loop, args=(replica, device), name=f'mineru-device-{replica}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _get_shard_pages(self, page_count):
+        if self.shard_pages > 0:
+            return self.shard_pages
+        return max(1, math.ceil(page_count / (len(self.devices) * SHARDS_PER_DEVICE)))
+
+    def analyze(self, images_with_extra_info, formula_enable=True, table_enable=True):
+        """将页面分片后交给各设备并行推理，阻塞等待并按页面顺序返回结果"""
+        images_with_extra_info = list(images_with_extra_info)
+        if not images_with_extra_info:
+            return []
+        shard_pages = self._get_shard_pages(len(images_with_extra_info))
+        starts = range(0, len(images_with_extra_info), shard_pages)
+        job = _ShardJob(len(starts), len(images_with_extra_info))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('multi-device analyzer is shut down')
+            for start in starts:
+                shard = images_with_extra_info[start:start + shard_pages]
+                self._shards.append((job, start, shard, formula_enable, table_enable))
+            self._cond.notify_all()
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.results
+
+    def _loop(self, replica, device):
+        with device_context(device, replica):
+            while True:
+                with self._cond:
+                    while not self._shards and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    job, start, shard, formula_enable, table_enable = self._shards.popleft()
+                self._run_shard(replica, job, start, shard, formula_enable, table_enable)
+
+    def _run_shard(self, replica, job, start, shard, formula_enable, table_enable):
+        # 同一次调用的其他分片已失败时跳过剩余分片
+        if job.error is None:
+            start_time = time.perf_counter()
+            try:
+                results = self.analyze_fn(shard, formula_enable, table_enable)
+                job.results[start:start + len(shard)] = results
+                failed = False
+            except Exception as e:
+                logger.warning(f'Shard of {len(shard)} pages failed on {self.devices[replica]}: {e}')
+                job.error = e
+                failed = True
+            busy_time = time.perf_counter() - start_time
+            with self._cond:
+                device_stats = self._device_stats[replica]
+                device_stats['busy_time'] += busy_time
+                if failed:
+                    device_stats['failed_shards'] += 1
+                else:
+                    device_stats['shards'] += 1
+                    device_stats['pages'] += len(shard)
+
+        with self._cond:
+            job.remaining -= 1
+            if job.remaining == 0 or job.error is not None:
+                job.done.set()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued_shards': len(self._shards),
+                'shard_pages': self.shard_pages,
+                'devices': [
+                    dict(device_stats, busy_time=round(device_stats['busy_time'], 3))
+                    for device_stats in self._device_stats
+                ],
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            pending = list(self._shards)
+            self._shards.clear()
+            self._cond.notify_all()
+        for job, _, _, _, _ in pending:
+            job.error = job.error or RuntimeError('multi-device analyzer is shut down')
+            job.done.set()
+        for thread in self._threads:
+            thread.join()
+
+
+_multi_device_analyzers = {}
+_multi_device_analyzers_lock = threading.Lock()
+
+
+def get_multi_device_analyzer(analyze_fn, devices):
+    """按设备列表返回进程内共享的多设备推理器，设备数不足2时返回None（在当前线程中直接推理）"""
+    devices = parse_device_list(devices)
+    if devices is None or len(devices) < 2:
+        return None
+    key = tuple(devices)
+    with _multi_device_analyzers_lock:
+        if key not in _multi_device_analyzers:
+            _multi_device_analyzers[key] = MultiDeviceAnalyzer(analyze_fn, devices)
+            logger.info(f'Pipeline inference sharded across devices: {", ".join(devices)}')
+        return _multi_device_analyzers[key]
+
+
+def get_multi_device_stats():
+    with _multi_device_analyzers_lock:
+        analyzers = list(_multi_device_analyzers.values())
+    if not analyzers:
+        return None
+    return [analyzer.stats() for analyzer in analyzers]
@@ -0,0 +1,257 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+
+from loguru import logger
+
+# 每批页面数直方图的分桶上界
+BATCH_PAGES_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+# 页面排队等待和推理耗时直方图的分桶上界（毫秒）
+LATENCY_MS_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+def get_page_batch_wait_ms():
+    try:
+        wait_ms = int(os.getenv('MINERU_PAGE_BATCH_WAIT_MS', 0))
+    except ValueError:
+        wait_ms = 0
+    return max(0, wait_ms)
+
+
+def get_page_batch_timeout():
+    """请求等待微批推理结果的最长时间（秒），0表示不限制"""
+    try:
+        timeout = int(os.getenv('MINERU_PAGE_BATCH_TIMEOUT', 1800))
+    except ValueError:
+        timeout = 1800
+    return max(0, timeout)
+
+
+def get_page_batch_max_pages():
+    try:
+        max_pages = int(os.getenv('MINERU_PAGE_BATCH_MAX_PAGES', os.getenv('MINERU_MIN_BATCH_INFERENCE_SIZE', 384)))
+    except ValueError:
+        max_pages = 384
+    return max(1, max_pages)
+
+
+# 调度线程中的批次推理与请求线程中组装middle_json时的模型调用（layoutreader排序、span OCR）使用同一套模型，
+# 两者都持有这把锁，模型不会被多个线程同时调用
+_model_call_lock = threading.RLock()
+
+
+def run_model_call(fn, *args, **kwargs):
+    """持有模型调用锁执行fn，用于请求线程中不经过调度器批次的模型调用"""
+    with _model_call_lock:
+        return fn(*args, **kwargs)
+
+
+class Histogram:
+    """固定分桶的计数直方图，最后一个桶统计超过所有上界的值"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def to_dict(self):
+        buckets = {f"<={bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+        return {
+            "count": self.total,
+            "avg": round(self.sum / self.total, 3) if self.total else 0.0,
+            "buckets": buckets,
+        }
+
+
+class _PageRequest:
+    __slots__ = ('pages', 'future', 'submit_time')
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.future = Future()
+        self.submit_time = time.perf_counter()
+
+
+class PageBatchScheduler:
+    """
+    跨请求的页面微批调度器：同时处理的多个请求提交的页面在调度线程中合并为一个批次推理，
+    避免每个请求只有一两页时模型以极小的batch运行。
+
+    每个分组（formula_enable、table_enable相同的页面，语言和OCR开关由BatchAnalyze在批次内部分组）
+    最早的页面最多等待max_wait_ms毫秒，或累计到max_pages页后立即推理，推理结果按页拆分回各请求。
+    合并的批次推理失败时逐个请求重试，单个请求的错误不会影响其他请求。
+    批次推理持有模型调用锁，与请求线程中通过run_model_call执行的模型调用串行；请求最多等待timeout秒
+    （MINERU_PAGE_BATCH_TIMEOUT），超时后尚未开始推理的页面从队列中移除。
+    """
+
+    def __init__(self, analyze_fn, max_wait_ms=None, max_pages=None, timeout=None):
+        self.analyze_fn = analyze_fn
+        self.max_wait_ms = get_page_batch_wait_ms() if max_wait_ms is None else max_wait_ms
+        self.max_pages = get_page_batch_max_pages() if max_pages is None else max_pages
+        self.timeout = get_page_batch_timeout() if timeout is None else timeout
+        self._cond = threading.Condition()
+        self._groups = {}  # (formula_enable, table_enable) -> deque[_PageRequest]
+        self._closed = False
+        self._batch_pages = Histogram(BATCH_PAGES_BUCKETS)
+        self._batch_requests = Histogram(BATCH_PAGES_BUCKETS)
+        self._queue_latency_ms = Histogram(LATENCY_MS_BUCKETS)
+        self._request_latency_ms = Histogram(LATENCY_MS_BUCKETS)
+        self._failed_batches = 0
+        self._thread = threading.Thread(target=self._loop, name='mineru-page-batcher', daemon=True)
+        self._thread.start()
+
+    def analyze(self, images_with_extra_info, formula_enable=True, table_enable=True):
+        """提交一组页面并阻塞等待其结果，与analyze_fn(images_with_extra_info, formula_enable, table_enable)等价"""
+        if not images_with_extra_info:
+            return []
+        request = _PageRequest(list(images_with_extra_info))
+        group_key = (formula_enable, table_enable)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('page batch scheduler is shut down')
+            self._groups.setdefault(group_key, deque()).append(request)
+            self._cond.notify_all()
+        try:
+            return request.future.result(timeout=self.timeout or None)
+        except FuturesTimeoutError:
+            with self._cond:
+                requests = self._groups.get(group_key)
+                if requests is not None and request in requests:
+                    requests.remove(request)
+            raise TimeoutError(f'page batch inference did not finish within {self.timeout}s') from None
+
+    def _pending_pages(self, group_key):
+        return sum(len(request.pages) for request in self._groups[group_key])
+
+    def _next_batch(self):
+        """等待并取出下一个批次，调用方需持有self._cond"""
+        while True:
+            if self._closed:
+                return None, None
+            group_keys = [key for key, requests in self._groups.items() if requests]
+            if not group_keys:
+                self._cond.wait()
+                continue
+
+            # 优先处理最早提交的请求所在的分组
+            group_key = min(group_keys, key=lambda key: self._groups[key][0].submit_time)
+            deadline = self._groups[group_key][0].submit_time + self.max_wait_ms / 1000
+            remaining = deadline - time.perf_counter()
+            if self._pending_pages(group_key) < self.max_pages and remaining > 0:
+                self._cond.wait(remaining)
+                continue
+
+            requests = self._groups[group_key]
+            batch = [requests.popleft()]
+            batch_pages = len(batch[0].pages)
+            while requests and batch_pages + len(requests[0].pages) <= self.max_pages:
+                batch_pages += len(requests[0].pages)
+                batch.append(requests.popleft())
+            return group_key, batch
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                group_key, batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(group_key, batch)
+
+    def _run_batch(self, group_key, batch):
+        formula_enable, table_enable = group_key
+        start_time = time.perf_counter()
+        pages = [page for request in batch for page in request.pages]
+        try:
+            with _model_call_lock:
+                results = self.analyze_fn(pages, formula_enable, table_enable)
+        except Exception as e:
+            with self._cond:
+                self._failed_batches += 1
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            logger.warning(f'Merged page batch of {len(batch)} requests failed: {e}, retrying requests one by one')
+            for request in batch:
+                self._run_batch(group_key, [request])
+            return
+
+        end_time = time.perf_counter()
+        with self._cond:
+            self._batch_pages.observe(len(pages))
+            self._batch_requests.observe(len(batch))
+            for request in batch:
+                self._queue_latency_ms.observe((start_time - request.submit_time) * 1000)
+                self._request_latency_ms.observe((end_time - request.submit_time) * 1000)
+        offset = 0
+        for request in batch:
+            request.future.set_result(results[offset:offset + len(request.pages)])
+            offset += len(request.pages)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_wait_ms': self.max_wait_ms,
+                'max_pages': self.max_pages,
+                'timeout': self.timeout,
+                'queued_requests': sum(len(requests) for requests in self._groups.values()),
+                'failed_batches': self._failed_batches,
+                'batch_pages': self._batch_pages.to_dict(),
+                'batch_requests': self._batch_requests.to_dict(),
+                'queue_latency_ms': self._queue_latency_ms.to_dict(),
+                'request_latency_ms': self._request_latency_ms.to_dict(),
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            pending = [request for requests in self._groups.values() for request in requests]
+            self._groups.clear()
+            self._cond.notify_all()
+        for request in pending:
+            request.future.set_exception(RuntimeError('page batch scheduler is shut down'))
+        self._thread.join()
+
+
+_page_batch_schedulers = {}
+_page_batch_schedulers_lock = threading.Lock()
+
+
+def get_page_batch_scheduler(analyze_fn, key=None):
+    """
+    MINERU_PAGE_BATCH_WAIT_MS大于0时返回进程内共享的调度器，否则返回None（每个请求直接推理）。
+    调度器按key（推理使用的设备元组，单设备时为None）区分，不同设备配置的请求各自合并批次，
+    每个调度器固定使用创建时传入的analyze_fn。
+    """
+    if get_page_batch_wait_ms() <= 0:
+        return None
+    with _page_batch_schedulers_lock:
+        if key not in _page_batch_schedulers:
+            scheduler = PageBatchScheduler(analyze_fn)
+            _page_batch_schedulers[key] = scheduler
+            logger.info(
+                f'Cross-request page batching enabled{f" for devices {key}" if key else ""}: '
+                f'wait up to {scheduler.max_wait_ms}ms or {scheduler.max_pages} pages'
+            )
+        return _page_batch_schedulers[key]
+
+
+def get_page_batch_stats():
+    with _page_batch_schedulers_lock:
+        schedulers = list(_page_batch_schedulers.items())
+    if not schedulers:
+        return None
+    return [
+        {'devices': list(key) if key else None, **scheduler.stats()}
+        for key, scheduler in schedulers
+    ]
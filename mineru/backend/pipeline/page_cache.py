@@ -0,0 +1,112 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from mineru.utils.hash_utils import bytes_md5, dict_md5
+from mineru.utils.page_buffer import PageBuffer
+
+
+def get_page_cache_size():
+    """进程内缓存的最大页数，默认为0（关闭页面级推理缓存），需要通过环境变量MINERU_PAGE_CACHE_SIZE开启"""
+    try:
+        return max(0, int(os.getenv('MINERU_PAGE_CACHE_SIZE', 0)))
+    except ValueError:
+        return 0
+
+
+def get_text_lines_hash(text_lines):
+    """页面文本层（get_page_text_lines的结果）的hash，未提取文本层时为None"""
+    if text_lines is None:
+        return None
+    return dict_md5(text_lines)
+
+
+def get_page_render_hash(image):
+    """页面渲染结果的hash，PageBuffer在渲染进程中已经算好，PIL图片则现场计算"""
+    if isinstance(image, PageBuffer):
+        return image.md5
+    return bytes_md5(image.convert('RGB').tobytes())
+
+
+class PageInferenceCache:
+    """按页面渲染hash缓存单页的推理结果（layout_dets），进程内LRU。
+
+    key由渲染hash和影响推理结果的参数（ocr、lang、公式、表格开关、文本层的hash）组成，渲染结果相同但文本层不同的页面
+    （例如带隐藏OCR文本层的扫描件）不会共用缓存；
+    多个文档中渲染结果完全相同的页面只需推理一次。
+
+    缓存条目以pickle序列化后的不可变字节保存：常驻内存比Python对象小得多，put/get也无需deepcopy，
+    get每次反序列化出新的对象，后续middle_json转换可以原地修改。
+    """
+
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(render_hash, ocr_enable, lang, formula_enable, table_enable, text_lines_hash=None):
+        return render_hash, bool(ocr_enable), lang, bool(formula_enable), bool(table_enable), text_lines_hash
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(data)
+
+    def put(self, key, layout_dets):
+        data = pickle.dumps(layout_dets, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            old_data = self._entries.pop(key, None)
+            if old_data is not None:
+                self._bytes -= len(old_data)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while len(self._entries) > self.max_pages:
+                _, expired_data = self._entries.popitem(last=False)
+                self._bytes -= len(expired_data)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': True,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_pages': self.max_pages,
+            }
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_inference_cache():
+    """返回进程内共享的页面推理缓存，MINERU_PAGE_CACHE_SIZE为0时返回None"""
+    global _page_cache
+    max_pages = get_page_cache_size()
+    if max_pages <= 0:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None or _page_cache.max_pages != max_pages:
+            _page_cache = PageInferenceCache(max_pages)
+        return _page_cache
+
+
+def get_page_inference_cache_stats():
+    page_cache = get_page_inference_cache()
+    if page_cache is None:
+        return {'enabled': False}
+    return page_cache.stats()
@@ -1,15 +1,24 @@
+import copy
 import os
+import threading
 import time
-from typing import List, Tuple
-from PIL import Image
+from typing import List
+
 from loguru import logger
 
 from .model_init import MineruPipelineModel
-from mineru.utils.config_reader import get_device
+from .multi_device import get_multi_device_analyzer, get_pipeline_devices
+from .page_batcher import get_page_batch_scheduler
+from .page_cache import get_page_inference_cache, get_page_render_hash, get_text_lines_hash
+from .model_json_to_middle_json import init_middle_json, append_batch_results_to_middle_json, finalize_middle_json
+from mineru.utils.config_reader import get_device, get_model_replica_key, get_text_layer_spans_enable
+from ...utils.document_handle import DocumentHandle, is_pdf_bytes
 from ...utils.enum_class import ImageType
+from ...utils.inference_executor import raise_if_cancelled
 from ...utils.pdf_classify import classify
 from ...utils.pdf_image_tools import load_images_from_pdf
 from ...utils.model_utils import get_vram, clean_memory
+from ...utils.run_async import iter_in_thread
 
 
 os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'  # 让mps可以fallback
@@ -18,6 +27,7 @@ os.environ['NO_ALBUMENTATIONS_UPDATE'] = '1'  # 禁止albumentations检查更新
 class ModelSingleton:
     _instance = None
     _models = {}
+    _lock = threading.RLock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -30,13 +40,15 @@ class ModelSingleton:
         formula_enable=None,
         table_enable=None,
     ):
-        key = (lang, formula_enable, table_enable)
-        if key not in self._models:
-            self._models[key] = custom_model_init(
-                lang=lang,
-                formula_enable=formula_enable,
-                table_enable=table_enable,
-            )
+        # 多设备推理时每个设备线程使用自己的模型副本
+        key = (lang, formula_enable, table_enable, get_model_replica_key())
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = custom_model_init(
+                    lang=lang,
+                    formula_enable=formula_enable,
+                    table_enable=table_enable,
+                )
         return self._models[key]
 
 
@@ -73,12 +85,17 @@ def doc_analyze(
         parse_method: str = 'auto',
         formula_enable=True,
         table_enable=True,
+        use_page_cache=True,
+        devices=None,
 ):
     """
     适当调大MIN_BATCH_INFERENCE_SIZE可以提高性能，更大的 MIN_BATCH_INFERENCE_SIZE会消耗更多内存，
     可通过环境变量MINERU_MIN_BATCH_INFERENCE_SIZE设置，默认值为384。
+    pdf_bytes_list的元素也可以是DocumentHandle，此时复用其已解析的文档，返回的pdf_doc即该handle，由调用方关闭。
+    devices为设备列表（例如['cuda:0', 'cuda:1']，默认由环境变量MINERU_PIPELINE_DEVICES设置）时，
+    每个批次的页面分片到各设备的模型副本上并行推理，结果按页面顺序拼回。
     """
-    min_batch_inference_size = int(os.environ.get('MINERU_MIN_BATCH_INFERENCE_SIZE', 384))
+    min_batch_inference_size = get_min_batch_inference_size()
 
     # 收集所有页面信息
     all_pages_info = []  # 存储(dataset_index, page_index, img, ocr, lang, width, height)
@@ -87,20 +104,20 @@ def doc_analyze(
     all_pdf_docs = []
     ocr_enabled_list = []
     for pdf_idx, pdf_bytes in enumerate(pdf_bytes_list):
+        # 收集每个数据集中的页面
+        # load_images_start = time.time()
+        if isinstance(pdf_bytes, DocumentHandle) or not is_pdf_bytes(pdf_bytes):
+            # 图片输入直接解码，不经过PDF渲染
+            pdf_doc, _ = DocumentHandle.wrap(pdf_bytes)
+            images_list = pdf_doc.load_images(image_type=ImageType.PIL)
+        else:
+            images_list, pdf_doc = load_images_from_pdf(pdf_bytes, image_type=ImageType.PIL)
+
         # 确定OCR设置
-        _ocr_enable = False
-        if parse_method == 'auto':
-            if classify(pdf_bytes) == 'ocr':
-                _ocr_enable = True
-        elif parse_method == 'ocr':
-            _ocr_enable = True
+        _ocr_enable = get_ocr_enable(pdf_doc if isinstance(pdf_doc, DocumentHandle) else pdf_bytes, parse_method)
 
         ocr_enabled_list.append(_ocr_enable)
         _lang = lang_list[pdf_idx]
-
-        # 收集每个数据集中的页面
-        # load_images_start = time.time()
-        images_list, pdf_doc = load_images_from_pdf(pdf_bytes, image_type=ImageType.PIL)
         # load_images_time = round(time.time() - load_images_start, 2)
         # logger.debug(f"load images cost: {load_images_time}, speed: {round(len(images_list) / load_images_time, 3)} images/s")
         all_image_lists.append(images_list)
@@ -121,6 +138,8 @@ def doc_analyze(
     ]
 
     # 执行批处理
+    page_cache = get_page_inference_cache() if use_page_cache else None
+    cache_stats = {'pages': 0, 'cached_pages': 0}
     results = []
     processed_images_count = 0
     for index, batch_image in enumerate(batch_images):
@@ -129,8 +148,12 @@ def doc_analyze(
             f'Batch {index + 1}/{len(batch_images)}: '
             f'{processed_images_count} pages/{len(images_with_extra_info)} pages'
         )
-        batch_results = batch_image_analyze(batch_image, formula_enable, table_enable)
+        batch_results = cached_batch_image_analyze(
+            batch_image, formula_enable, table_enable, page_cache=page_cache, cache_stats=cache_stats,
+            devices=devices,
+        )
         results.extend(batch_results)
+    log_page_cache_stats(page_cache, cache_stats)
 
     # 构建返回结果
     infer_results = []
@@ -150,8 +173,323 @@ def doc_analyze(
     return infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list
 
 
+def get_min_batch_inference_size():
+    return int(os.environ.get('MINERU_MIN_BATCH_INFERENCE_SIZE', 384))
+
+
+def get_ocr_enable(pdf_bytes, parse_method):
+    if isinstance(pdf_bytes, DocumentHandle) and not pdf_bytes.has_text_layer:
+        # 图片输入没有文本层，始终使用OCR
+        return True
+    if parse_method == 'auto':
+        return classify(pdf_bytes) == 'ocr'
+    return parse_method == 'ocr'
+
+
+def iter_page_windows(pdf_bytes_list, lang_list, parse_method='auto', window_size=None, text_layer_spans=False,
+                      owned_docs=None):
+    """
+    按页面窗口渲染所有PDF，每次产出 (new_docs, window_pages)，window_pages 最多包含 window_size 页，
+    可跨越多个文档；new_docs 为在当前窗口中首次出现的文档上下文（包括没有页面的文档）。
+    window_pages 中每一项为 (doc_ctx, page_idx, image_dict)。
+    text_layer_spans为True时，不需要OCR的文档在渲染进程中同时提取文本层的行，存放在image_dict['text_lines']中。
+    pdf_bytes_list的元素可以是字节数据或DocumentHandle，字节数据在这里解析为handle（doc_ctx['owns_pdf_doc']为True），
+    分类、渲染和后续的middle_json组装都使用同一个handle。这些handle同时追加到owned_docs中，调用方提前结束时据此关闭。
+    """
+    if window_size is None:
+        window_size = get_min_batch_inference_size()
+    window_size = max(1, window_size)
+
+    new_docs = []
+    window_pages = []
+    for pdf_idx, pdf_bytes in enumerate(pdf_bytes_list):
+        pdf_doc, owns_pdf_doc = DocumentHandle.wrap(pdf_bytes)
+        if owns_pdf_doc and owned_docs is not None:
+            owned_docs.append(pdf_doc)
+        doc_ctx = {
+            'pdf_idx': pdf_idx,
+            'pdf_doc': pdf_doc,
+            'owns_pdf_doc': owns_pdf_doc,
+            'page_count': len(pdf_doc),
+            'ocr_enable': get_ocr_enable(pdf_doc, parse_method),
+            'lang': lang_list[pdf_idx],
+        }
+        new_docs.append(doc_ctx)
+
+        # 同一文档的多个窗口共享handle的渲染文件，渲染进程内的已解析文档也可复用
+        start_page_id = 0
+        while start_page_id < doc_ctx['page_count']:
+            end_page_id = min(start_page_id + window_size - len(window_pages), doc_ctx['page_count']) - 1
+            images_list = pdf_doc.load_images(
+                start_page_id, end_page_id, image_type=ImageType.BUFFER,
+                with_text_lines=text_layer_spans and not doc_ctx['ocr_enable'],
+            )
+            for offset, image_dict in enumerate(images_list):
+                window_pages.append((doc_ctx, start_page_id + offset, image_dict))
+            start_page_id = end_page_id + 1
+
+            if len(window_pages) >= window_size:
+                yield new_docs, window_pages
+                new_docs, window_pages = [], []
+        pdf_doc.release_render_file()
+
+    if new_docs or window_pages:
+        yield new_docs, window_pages
+
+
+def get_pipeline_stage_overlap():
+    return str(os.getenv('MINERU_PIPELINE_STAGE_OVERLAP', '1')).lower() in ('1', 'true', 'yes')
+
+
+def iter_analyzed_windows(windows, formula_enable=True, table_enable=True, page_cache=None, cache_stats=None,
+                          devices=None, cancel_event=None):
+    """对每个页面窗口执行批量推理，产出 (new_docs, window_pages, window_results)，结束或被关闭时同时关闭windows"""
+    processed_pages = 0
+    try:
+        for window_index, (new_docs, window_pages) in enumerate(windows):
+            window_results = []
+            if window_pages:
+                raise_if_cancelled(cancel_event)
+                processed_pages += len(window_pages)
+                logger.info(
+                    f'Window {window_index + 1}: '
+                    f'{len(window_pages)} pages, {processed_pages} pages processed'
+                )
+                images_with_extra_info = [
+                    (image_dict['page_buffer'], doc_ctx['ocr_enable'], doc_ctx['lang'], image_dict.get('text_lines'))
+                    for doc_ctx, _, image_dict in window_pages
+                ]
+                window_results = cached_batch_image_analyze(
+                    images_with_extra_info, formula_enable, table_enable,
+                    page_cache=page_cache, cache_stats=cache_stats, devices=devices,
+                )
+            yield new_docs, window_pages, window_results
+    finally:
+        windows.close()
+
+
+def doc_analyze_streaming(
+        pdf_bytes_list,
+        image_writer_list,
+        lang_list,
+        parse_method: str = 'auto',
+        formula_enable=True,
+        table_enable=True,
+        overlap=None,
+        use_page_cache=True,
+        text_layer_spans=None,
+        progress_callback=None,
+        devices=None,
+        cancel_event=None,
+):
+    """
+    doc_analyze的流式版本：按页面窗口渲染、推理并转换为middle_json，窗口处理完成后立即释放页面图片，
+    峰值内存由窗口大小（MINERU_MIN_BATCH_INFERENCE_SIZE）决定，而不是文档长度。
+    每个文档的全部页面处理完成后，按文档顺序 yield (pdf_idx, model_json, middle_json, ocr_enable)。
+
+    overlap为True时（默认由环境变量MINERU_PIPELINE_STAGE_OVERLAP控制，默认开启），渲染、推理、
+    middle_json组装三个阶段通过有界队列重叠执行：第N个窗口推理时，第N+1个窗口在后台渲染，
+    第N-1个窗口在调用方线程中完成后处理和结果写出。pdfium不是线程安全的，只有单个pdfium调用
+    （渲染一页、取页面尺寸、提取文本页）持有pdfium_lock，截图写出和span处理不持锁，与渲染并行执行。
+
+    use_page_cache为True且通过环境变量MINERU_PAGE_CACHE_SIZE开启了页面缓存（默认关闭）时，渲染结果与之前推理过的
+    页面完全相同的页面直接复用缓存的layout_dets，只有未命中的页面进入模型推理。
+
+    text_layer_spans为True时（默认由环境变量MINERU_TEXT_LAYER_SPANS控制，默认关闭），不需要OCR的文档直接用
+    pdfium文本层的行构造文本区域的span，只有文本层为空或乱码的区域才执行OCR det。
+
+    pdf_bytes_list的元素可以是DocumentHandle（例如do_parse按页码范围创建的handle），此时整个流程不会再次解析
+    或裁剪PDF，handle由调用方关闭；传入字节数据时在这里创建的handle于文档处理完成后关闭。
+
+    progress_callback(pdf_idx, stage, done_pages, total_pages, page_infos)用于流式输出进度：
+    窗口推理完成时以stage='inference'调用（page_infos为None），窗口中的页面完成后处理（分段之前）时
+    以stage='page'调用，page_infos为新追加到middle_json中的页面。回调在调用方线程中执行。
+
+    devices与doc_analyze相同，每个窗口的页面分片到多个设备并行推理。
+
+    cancel_event（threading.Event）被设置后，在下一个窗口推理或后处理开始前抛出ParseCancelledError。
+
+    调用方提前关闭本生成器（或处理出错）时，先关闭渲染和推理阶段并等待其后台线程退出，再关闭这里创建的全部handle，
+    不依赖垃圾回收。
+    """
+    if overlap is None:
+        overlap = get_pipeline_stage_overlap()
+    if text_layer_spans is None:
+        text_layer_spans = get_text_layer_spans_enable()
+    page_cache = get_page_inference_cache() if use_page_cache else None
+    cache_stats = {'pages': 0, 'cached_pages': 0}
+
+    owned_docs = []
+    windows = iter_page_windows(
+        pdf_bytes_list, lang_list, parse_method, text_layer_spans=text_layer_spans, owned_docs=owned_docs,
+    )
+    if overlap:
+        windows = iter_in_thread(windows, maxsize=1, name='mineru-render')
+    analyzed_windows = iter_analyzed_windows(
+        windows, formula_enable, table_enable, page_cache=page_cache, cache_stats=cache_stats, devices=devices,
+        cancel_event=cancel_event,
+    )
+    if overlap:
+        analyzed_windows = iter_in_thread(analyzed_windows, maxsize=1, name='mineru-infer')
+
+    pending_docs = []
+    try:
+        for new_docs, window_pages, window_results in analyzed_windows:
+            raise_if_cancelled(cancel_event)
+            for doc_ctx in new_docs:
+                doc_ctx['model_json'] = []
+                doc_ctx['middle_json'] = init_middle_json()
+                doc_ctx['processed_pages'] = 0
+                pending_docs.append(doc_ctx)
+
+            if window_pages:
+                if progress_callback is not None:
+                    for doc_ctx, window_page_count in count_window_pages(window_pages):
+                        progress_callback(
+                            doc_ctx['pdf_idx'], 'inference',
+                            doc_ctx['processed_pages'] + window_page_count, doc_ctx['page_count'], None,
+                        )
+                doc_page_infos = append_window_results(window_pages, window_results, image_writer_list, formula_enable)
+                if progress_callback is not None:
+                    for doc_ctx, page_infos in doc_page_infos:
+                        progress_callback(
+                            doc_ctx['pdf_idx'], 'page', doc_ctx['processed_pages'], doc_ctx['page_count'], page_infos,
+                        )
+
+            # 释放当前窗口的页面图片
+            del window_pages, window_results
+
+            while pending_docs and pending_docs[0]['processed_pages'] >= pending_docs[0]['page_count']:
+                doc_ctx = pending_docs.pop(0)
+                finalize_middle_json(doc_ctx['middle_json'], doc_ctx['pdf_doc'], page_count=doc_ctx['page_count'])
+                if doc_ctx['owns_pdf_doc']:
+                    doc_ctx['pdf_doc'].close()
+                yield doc_ctx['pdf_idx'], doc_ctx['model_json'], doc_ctx['middle_json'], doc_ctx['ocr_enable']
+    finally:
+        # 关闭推理阶段时依次关闭渲染阶段，两者的后台线程都已退出，可以安全地关闭handle（close可重复调用）
+        analyzed_windows.close()
+        for pdf_doc in owned_docs:
+            pdf_doc.close()
+
+    log_page_cache_stats(page_cache, cache_stats)
+
+
+def count_window_pages(window_pages):
+    """按文档统计窗口中的页数，返回[(doc_ctx, 页数)]，保持文档在窗口中的顺序"""
+    doc_counts = []
+    for doc_ctx, _, _ in window_pages:
+        if not doc_counts or doc_counts[-1][0] is not doc_ctx:
+            doc_counts.append([doc_ctx, 0])
+        doc_counts[-1][1] += 1
+    return [tuple(doc_count) for doc_count in doc_counts]
+
+
+def append_window_results(window_pages, window_results, image_writer_list, formula_enable=True):
+    """将一个窗口的推理结果按文档分组，并追加到各文档的middle_json中，返回[(doc_ctx, 新追加的page_info列表)]"""
+    doc_groups = []
+    for (doc_ctx, page_idx, image_dict), result in zip(window_pages, window_results):
+        page_buffer = image_dict['page_buffer']
+        page_info_dict = {'page_no': page_idx, 'width': page_buffer.width, 'height': page_buffer.height}
+        page_dict = {'layout_dets': result, 'page_info': page_info_dict}
+        if not doc_groups or doc_groups[-1][0] is not doc_ctx:
+            doc_groups.append((doc_ctx, page_idx, [], []))
+        doc_groups[-1][2].append(page_dict)
+        doc_groups[-1][3].append(image_dict)
+
+    doc_page_infos = []
+    for doc_ctx, page_start_index, model_list, images_list in doc_groups:
+        doc_ctx['model_json'].extend(copy.deepcopy(model_list))
+        page_infos = append_batch_results_to_middle_json(
+            doc_ctx['middle_json'], model_list, images_list, doc_ctx['pdf_doc'],
+            image_writer_list[doc_ctx['pdf_idx']], page_start_index=page_start_index,
+            lang=doc_ctx['lang'], ocr_enable=doc_ctx['ocr_enable'], formula_enabled=formula_enable,
+        )
+        doc_ctx['processed_pages'] += len(model_list)
+        doc_page_infos.append((doc_ctx, page_infos))
+    return doc_page_infos
+
+
+def cached_batch_image_analyze(
+        images_with_extra_info,
+        formula_enable=True,
+        table_enable=True,
+        page_cache=None,
+        cache_stats=None,
+        devices=None,
+):
+    """
+    带页面级缓存的batch_image_analyze：按渲染hash查找缓存，命中的页面直接使用缓存结果，
+    同一批次中重复的页面只推理一次，其余未命中的页面送入BatchAnalyze后再按原顺序拼回。
+    cache_stats用于累计当前任务的页面数和缓存命中页数。
+    """
+    if cache_stats is not None:
+        cache_stats['pages'] += len(images_with_extra_info)
+    if page_cache is None:
+        return analyze_pages(images_with_extra_info, formula_enable, table_enable, devices=devices)
+
+    results = [None] * len(images_with_extra_info)
+    miss_positions = {}  # cache key -> 该页面在批次中的所有位置
+    for index, (image, ocr_enable, lang, *text_lines) in enumerate(images_with_extra_info):
+        key = page_cache.make_key(
+            get_page_render_hash(image), ocr_enable, lang, formula_enable, table_enable,
+            get_text_lines_hash(text_lines[0] if text_lines else None),
+        )
+        if key not in miss_positions:
+            layout_dets = page_cache.get(key)
+            if layout_dets is not None:
+                results[index] = layout_dets
+                continue
+        miss_positions.setdefault(key, []).append(index)
+
+    miss_keys = list(miss_positions)
+    if cache_stats is not None:
+        cache_stats['cached_pages'] += len(images_with_extra_info) - len(miss_keys)
+    if not miss_keys:
+        return results
+
+    miss_results = analyze_pages(
+        [images_with_extra_info[miss_positions[key][0]] for key in miss_keys],
+        formula_enable, table_enable, devices=devices,
+    )
+    for key, layout_dets in zip(miss_keys, miss_results):
+        page_cache.put(key, layout_dets)
+        first_index, *duplicate_indexes = miss_positions[key]
+        results[first_index] = layout_dets
+        for index in duplicate_indexes:
+            results[index] = copy.deepcopy(layout_dets)
+    return results
+
+
+def analyze_pages(images_with_extra_info, formula_enable=True, table_enable=True, devices=None):
+    """
+    对页面执行模型推理。MINERU_PAGE_BATCH_WAIT_MS大于0时经过跨请求的微批调度器，
+    与同时处理的其他请求的页面合并为一个批次推理，否则直接调用batch_image_analyze。
+    devices包含多个设备时，（合并后的）批次再按分片交给各设备的推理线程执行。
+    """
+    if devices is None:
+        devices = get_pipeline_devices()
+    analyzer = get_multi_device_analyzer(batch_image_analyze, devices)
+    analyze_fn = analyzer.analyze if analyzer is not None else batch_image_analyze
+
+    # 调度器按设备元组区分，后续请求传入的devices与首个请求不同时不会复用首个请求的推理器
+    scheduler_key = tuple(analyzer.devices) if analyzer is not None else None
+    scheduler = get_page_batch_scheduler(analyze_fn, key=scheduler_key)
+    if scheduler is None:
+        return analyze_fn(images_with_extra_info, formula_enable, table_enable)
+    return scheduler.analyze(images_with_extra_info, formula_enable, table_enable)
+
+
+def log_page_cache_stats(page_cache, cache_stats):
+    if page_cache is None or not cache_stats['pages']:
+        return
+    logger.info(
+        f"Page cache: {cache_stats['cached_pages']}/{cache_stats['pages']} pages served from cache, "
+        f"{cache_stats['pages'] - cache_stats['cached_pages']} pages inferred"
+    )
+
+
 def batch_image_analyze(
-        images_with_extra_info: List[Tuple[Image.Image, bool, str]],
+        images_with_extra_info: List[tuple],
         formula_enable=True,
         table_enable=True):
 
@@ -171,7 +509,12 @@ def batch_image_analyze(
                 "NPU is selected as device, but torch_npu is not available. "
                 "Please ensure that the torch_npu package is installed correctly."
             ) from e
+    elif str(device).startswith('cuda:'):
+        # 多设备推理时，让未显式指定设备的cuda调用（例如empty_cache）作用于当前线程的设备
+        import torch
+        torch.cuda.set_device(device)
 
+    # 显存档位只决定没有调优记录时的初始batch size，开启MINERU_BATCH_AUTOTUNE后由BatchSizeAutotuner按吞吐和OOM调整
     gpu_memory = get_vram(device)
     if gpu_memory >= 16:
         batch_ratio = 16
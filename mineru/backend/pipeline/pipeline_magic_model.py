@@ -1,4 +1,6 @@
-from mineru.utils.boxbase import bbox_relative_pos, calculate_iou, bbox_distance, get_minbox_if_overlap_by_ratio
+import numpy as np
+
+from mineru.utils.boxbase import bbox_relative_pos, bbox_distance, get_minbox_if_overlap_by_ratio, batch_calculate_iou
 from mineru.utils.enum_class import CategoryId, ContentType
 from mineru.utils.magic_model_utils import tie_up_category_by_distance_v3, reduct_overlap
 
@@ -116,17 +118,17 @@ class MagicModel:
                 ], self.__page_model_info['layout_dets']
             )
         )
-        for i in range(len(layout_dets)):
-            for j in range(i + 1, len(layout_dets)):
-                layout_det1 = layout_dets[i]
-                layout_det2 = layout_dets[j]
-
-                if calculate_iou(layout_det1['bbox'], layout_det2['bbox']) > 0.9:
+        # 一次计算所有区块两两之间的iou，按(i, j)的行优先顺序遍历iou>0.9的上三角元素，与逐对比较的顺序一致
+        bboxes = [layout_det['bbox'] for layout_det in layout_dets]
+        high_iou_pairs = np.argwhere(np.triu(batch_calculate_iou(bboxes, bboxes) > 0.9, k=1))
+        for i, j in high_iou_pairs:
+            layout_det1 = layout_dets[i]
+            layout_det2 = layout_dets[j]
 
-                    layout_det_need_remove = layout_det1 if layout_det1['score'] < layout_det2['score'] else layout_det2
+            layout_det_need_remove = layout_det1 if layout_det1['score'] < layout_det2['score'] else layout_det2
 
-                    if layout_det_need_remove not in need_remove_list:
-                        need_remove_list.append(layout_det_need_remove)
+            if layout_det_need_remove not in need_remove_list:
+                need_remove_list.append(layout_det_need_remove)
 
         for need_remove in need_remove_list:
             self.__page_model_info['layout_dets'].remove(need_remove)
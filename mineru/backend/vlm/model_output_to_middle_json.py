@@ -9,9 +9,11 @@ from mineru.backend.utils import cross_page_table_merge
 from mineru.backend.vlm.vlm_magic_model import MagicModel
 from mineru.utils.config_reader import get_table_enable, get_llm_aided_config
 from mineru.utils.cut_image import cut_image_and_table
+from mineru.utils.document_handle import DocumentHandle
 from mineru.utils.enum_class import ContentType
 from mineru.utils.hash_utils import bytes_md5
 from mineru.utils.pdf_image_tools import get_crop_img
+from mineru.utils.pdfium_lock import pdfium_lock
 from mineru.version import __version__
 
 
@@ -102,9 +104,10 @@ def blocks_to_page_info(page_blocks, image_dict, page, image_writer, page_index)
 def result_to_middle_json(model_output_blocks_list, images_list, pdf_doc, image_writer):
     middle_json = {"pdf_info": [], "_backend":"vlm", "_version_name": __version__}
     for index, page_blocks in enumerate(model_output_blocks_list):
-        page = pdf_doc[index]
         image_dict = images_list[index]
-        page_info = blocks_to_page_info(page_blocks, image_dict, page, image_writer, index)
+        with pdfium_lock:
+            page = pdf_doc[index]
+            page_info = blocks_to_page_info(page_blocks, image_dict, page, image_writer, index)
         middle_json["pdf_info"].append(page_info)
 
     """表格跨页合并"""
@@ -118,6 +121,8 @@ def result_to_middle_json(model_output_blocks_list, images_list, pdf_doc, image_
         llm_aided_title(middle_json["pdf_info"], title_aided_config)
         logger.info(f'llm aided title time: {round(time.time() - llm_aided_title_start_time, 2)}')
 
-    # 关闭pdf文档
-    pdf_doc.close()
+    # 关闭pdf文档，DocumentHandle由创建方关闭
+    if not isinstance(pdf_doc, DocumentHandle):
+        with pdfium_lock:
+            pdf_doc.close()
     return middle_json
\ No newline at end of file
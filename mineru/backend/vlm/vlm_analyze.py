@@ -9,6 +9,7 @@ from .utils import enable_custom_logits_processors, set_default_gpu_memory_utili
 from .model_output_to_middle_json import result_to_middle_json
 from ...data.data_reader_writer import DataWriter
 from mineru.utils.pdf_image_tools import load_images_from_pdf
+from mineru.utils.document_handle import DocumentHandle, is_pdf_bytes
 from ...utils.check_sys_env import is_mac_os_version_supported
 from ...utils.config_reader import get_device
 
@@ -190,6 +191,14 @@ class ModelSingleton:
         return self._models[key]
 
 
+def load_pdf_images(pdf_bytes):
+    """pdf_bytes为DocumentHandle时复用其已解析的文档（由调用方关闭），图片直接解码，否则重新解析"""
+    if isinstance(pdf_bytes, DocumentHandle) or not is_pdf_bytes(pdf_bytes):
+        pdf_doc, _ = DocumentHandle.wrap(pdf_bytes)
+        return pdf_doc.load_images(image_type=ImageType.PIL), pdf_doc
+    return load_images_from_pdf(pdf_bytes, image_type=ImageType.PIL)
+
+
 def doc_analyze(
     pdf_bytes,
     image_writer: DataWriter | None,
@@ -203,7 +212,7 @@ def doc_analyze(
         predictor = ModelSingleton().get_model(backend, model_path, server_url, **kwargs)
 
     # load_images_start = time.time()
-    images_list, pdf_doc = load_images_from_pdf(pdf_bytes, image_type=ImageType.PIL)
+    images_list, pdf_doc = load_pdf_images(pdf_bytes)
     images_pil_list = [image_dict["img_pil"] for image_dict in images_list]
     # load_images_time = round(time.time() - load_images_start, 2)
     # logger.info(f"load images cost: {load_images_time}, speed: {round(len(images_base64_list)/load_images_time, 3)} images/s")
@@ -230,7 +239,7 @@ async def aio_doc_analyze(
         predictor = ModelSingleton().get_model(backend, model_path, server_url, **kwargs)
 
     # load_images_start = time.time()
-    images_list, pdf_doc = load_images_from_pdf(pdf_bytes, image_type=ImageType.PIL)
+    images_list, pdf_doc = load_pdf_images(pdf_bytes)
     images_pil_list = [image_dict["img_pil"] for image_dict in images_list]
     # load_images_time = round(time.time() - load_images_start, 2)
     # logger.debug(f"load images cost: {load_images_time}, speed: {round(len(images_pil_list)/load_images_time, 3)} images/s")
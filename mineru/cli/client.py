@@ -6,7 +6,7 @@ from loguru import logger
 
 from mineru.utils.check_sys_env import is_mac_os_version_supported
 from mineru.utils.cli_parser import arg_parse
-from mineru.utils.config_reader import get_device
+from mineru.utils.config_reader import get_device, get_image_native_input_enable
 from mineru.utils.guess_suffix_or_lang import guess_suffix_by_path
 from mineru.utils.model_utils import get_vram
 from ..version import __version__
@@ -189,7 +189,7 @@ def main(
             lang_list = []
             for path in path_list:
                 file_name = str(Path(path).stem)
-                pdf_bytes = read_fn(path)
+                pdf_bytes = read_fn(path, image_native=get_image_native_input_enable())
                 file_name_list.append(file_name)
                 pdf_bytes_list.append(pdf_bytes)
                 lang_list.append(lang)
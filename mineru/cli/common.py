@@ -1,22 +1,22 @@
 # Copyright (c) Opendatalab. All rights reserved.
-import io
+import copy
 import json
 import os
-import copy
 from pathlib import Path
 
 from loguru import logger
-import pypdfium2 as pdfium
 
 from mineru.data.data_reader_writer import FileBasedDataWriter
+from mineru.utils.document_handle import DocumentHandle, open_document
 from mineru.utils.draw_bbox import draw_layout_bbox, draw_span_bbox, draw_line_sort_bbox
 from mineru.utils.enum_class import MakeMode
 from mineru.utils.guess_suffix_or_lang import guess_suffix_by_bytes
+from mineru.utils.inference_executor import get_inference_executor, raise_if_cancelled
 from mineru.utils.pdf_image_tools import images_bytes_to_pdf_bytes
 from mineru.backend.vlm.vlm_middle_json_mkcontent import union_make as vlm_union_make
 from mineru.backend.vlm.vlm_analyze import doc_analyze as vlm_doc_analyze
 from mineru.backend.vlm.vlm_analyze import aio_doc_analyze as aio_vlm_doc_analyze
-from mineru.utils.pdf_page_id import get_end_page_id
+from mineru.utils.result_cache import get_result_cache, make_cache_key
 
 if os.getenv("MINERU_LMDEPLOY_DEVICE", "") == "maca":
     import torch
@@ -28,13 +28,20 @@ image_suffixes = ["png", "jpeg", "jp2", "webp", "gif", "bmp", "jpg", "tiff"]
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-def read_fn(path):
+def read_fn(path, image_native=False):
+    """
+    读取PDF或图片文件，默认始终返回PDF字节（图片先转换为PDF）。
+    image_native为True时图片按原始字节返回，由do_parse/doc_analyze直接解码，多帧TIFF逐帧作为页面；
+    mineru/mineru-api/gradio按环境变量MINERU_IMAGE_NATIVE_INPUT传入该参数，返回值只能交给do_parse/aio_do_parse使用。
+    """
     if not isinstance(path, Path):
         path = Path(path)
     with open(str(path), "rb") as input_file:
         file_bytes = input_file.read()
         file_suffix = guess_suffix_by_bytes(file_bytes, path)
         if file_suffix in image_suffixes:
+            if image_native:
+                return file_bytes
             return images_bytes_to_pdf_bytes(file_bytes)
         elif file_suffix in pdf_suffixes:
             return file_bytes
@@ -51,43 +58,129 @@ def prepare_env(output_dir, pdf_file_name, parse_method):
 
 
 def convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id=0, end_page_id=None):
-    pdf = pdfium.PdfDocument(pdf_bytes)
-    output_pdf = pdfium.PdfDocument.new()
+    """裁剪页码范围并返回新的PDF字节，请求完整页码范围时直接返回原始字节，图片输入转换为PDF"""
+    with open_document(pdf_bytes, start_page_id, end_page_id) as doc:
+        return doc.pdf_bytes
+
+
+def _open_documents(pdf_bytes_list, start_page_id, end_page_id):
+    """每个PDF只解析一次（图片只解码一次），得到的DocumentHandle在缓存key计算、推理和输出的整个流程中共享"""
+    docs = []
     try:
-        end_page_id = get_end_page_id(end_page_id, len(pdf))
-
-        # 逐页导入,失败则跳过
-        output_index = 0
-        for page_index in range(start_page_id, end_page_id + 1):
-            try:
-                output_pdf.import_pages(pdf, pages=[page_index])
-                output_index += 1
-            except Exception as page_error:
-                output_pdf.del_page(output_index)
-                logger.warning(f"Failed to import page {page_index}: {page_error}, skipping this page.")
-                continue
-
-        # 将新PDF保存到内存缓冲区
-        output_buffer = io.BytesIO()
-        output_pdf.save(output_buffer)
-
-        # 获取字节数据
-        output_bytes = output_buffer.getvalue()
-    except Exception as e:
-        logger.warning(f"Error in converting PDF bytes: {e}, Using original PDF bytes.")
-        output_bytes = pdf_bytes
-    pdf.close()
-    output_pdf.close()
-    return output_bytes
+        for pdf_bytes in pdf_bytes_list:
+            docs.append(open_document(pdf_bytes, start_page_id, end_page_id))
+    except Exception:
+        _close_documents(docs)
+        raise
+    return docs
+
+
+def _close_documents(docs):
+    for doc in docs:
+        doc.close()
+
+
+def _get_cache_keys(result_cache, docs, p_lang_list, backend, parse_method,
+                    formula_enable, table_enable, server_url):
+    """计算每个文档的结果缓存key，未启用缓存时返回 None"""
+    if result_cache is None:
+        return None
+    cache_keys = []
+    for idx, doc in enumerate(docs):
+        try:
+            cache_keys.append(make_cache_key(
+                doc, doc.start_page_id, doc.end_page_id, backend, parse_method,
+                p_lang_list[idx] if idx < len(p_lang_list) else None,
+                formula_enable, table_enable, server_url,
+            ))
+        except Exception as e:
+            logger.warning(f"Failed to compute result cache key: {e}")
+            cache_keys.append(None)
+    return cache_keys
+
+
+def _process_cached_results(
+        output_dir,
+        pdf_file_names,
+        pdf_bytes_list,
+        result_cache,
+        cache_keys,
+        parse_method,
+        is_pipeline,
+        f_draw_layout_bbox,
+        f_draw_span_bbox,
+        f_dump_md,
+        f_dump_middle_json,
+        f_dump_model_output,
+        f_dump_orig_pdf,
+        f_dump_content_list,
+        f_make_md_mode,
+        event_callback=None,
+        cancel_event=None,
+):
+    """直接用缓存结果生成命中文档的输出，返回未命中文档的下标列表"""
+    miss_indices = []
+    for idx, cache_key in enumerate(cache_keys):
+        raise_if_cancelled(cancel_event)
+        cached = result_cache.get(cache_key) if cache_key is not None else None
+        if cached is None:
+            miss_indices.append(idx)
+            continue
+
+        model_json, middle_json, cached_images_dir = cached
+        pdf_file_name = pdf_file_names[idx]
+        logger.info(f"Result cache hit for {pdf_file_name}")
+        local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
+        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+        result_cache.restore_images(cached_images_dir, image_writer)
+
+        if event_callback is not None:
+            _emit_page_events(
+                event_callback, pdf_file_name, middle_json["pdf_info"], local_image_dir, f_make_md_mode, is_pipeline
+            )
+        artifacts = _process_output(
+            middle_json["pdf_info"], pdf_bytes_list[idx], pdf_file_name, local_md_dir, local_image_dir,
+            md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
+            f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
+            f_make_md_mode, middle_json, model_json, is_pipeline=is_pipeline
+        )
+        _emit_document_event(event_callback, pdf_file_name, artifacts, cached=True)
+    return miss_indices
+
 
+def _select(items, indices):
+    return [items[idx] for idx in indices] if items is not None else None
 
-def _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id):
-    """准备处理PDF字节数据"""
-    result = []
-    for pdf_bytes in pdf_bytes_list:
-        new_pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id, end_page_id)
-        result.append(new_pdf_bytes)
-    return result
+
+def _emit_page_events(event_callback, pdf_file_name, page_infos, local_image_dir, f_make_md_mode,
+                      is_pipeline=True, split_para=False):
+    """
+    将页面结果作为page事件发送给event_callback，每页附带middle_json片段和markdown片段。
+    split_para为True时对页面副本做单页分段（pipeline后端窗口中的页面尚未分段），跨页段落和表格以document事件为准。
+    """
+    from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as pipeline_union_make
+    from mineru.backend.pipeline.para_split import para_split
+
+    make_func = pipeline_union_make if is_pipeline else vlm_union_make
+    image_dir = str(os.path.basename(local_image_dir))
+    for page_info in page_infos:
+        page_info = copy.deepcopy(page_info)
+        if split_para:
+            para_split([page_info])
+        event_callback({
+            "event": "page",
+            "file": pdf_file_name,
+            "page_idx": page_info["page_idx"],
+            "middle_json": page_info,
+            "md_content": make_func([page_info], f_make_md_mode, image_dir),
+        })
+
+
+def _emit_document_event(event_callback, pdf_file_name, artifacts, cached=False):
+    """文档完成分段、跨页表格合并并写出结果后发送document事件，内容为_process_output生成的结果"""
+    if event_callback is None:
+        return
+    event_callback({"event": "document", "file": pdf_file_name, "cached": cached, **artifacts})
 
 
 def _process_output(
@@ -111,7 +204,8 @@ def _process_output(
 ):
     f_draw_line_sort_bbox = False
     from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as pipeline_union_make
-    """处理输出文件"""
+    """处理输出文件，pdf_bytes可以是DocumentHandle，多个bbox图共享同一次解析；返回生成的结果供流式输出使用"""
+    artifacts = {}
     if f_draw_layout_bbox:
         draw_layout_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_layout.pdf")
 
@@ -121,7 +215,7 @@ def _process_output(
     if f_dump_orig_pdf:
         md_writer.write(
             f"{pdf_file_name}_origin.pdf",
-            pdf_bytes,
+            pdf_bytes.pdf_bytes if isinstance(pdf_bytes, DocumentHandle) else pdf_bytes,
         )
 
     if f_draw_line_sort_bbox:
@@ -136,6 +230,7 @@ def _process_output(
             f"{pdf_file_name}.md",
             md_content_str,
         )
+        artifacts["md_content"] = md_content_str
 
     if f_dump_content_list:
         make_func = pipeline_union_make if is_pipeline else vlm_union_make
@@ -144,20 +239,24 @@ def _process_output(
             f"{pdf_file_name}_content_list.json",
             json.dumps(content_list, ensure_ascii=False, indent=4),
         )
+        artifacts["content_list"] = content_list
 
     if f_dump_middle_json:
         md_writer.write_string(
             f"{pdf_file_name}_middle.json",
             json.dumps(middle_json, ensure_ascii=False, indent=4),
         )
+        artifacts["middle_json"] = middle_json
 
     if f_dump_model_output:
         md_writer.write_string(
             f"{pdf_file_name}_model.json",
             json.dumps(model_output, ensure_ascii=False, indent=4),
         )
+        artifacts["model_output"] = model_output
 
     logger.info(f"local output dir is {local_md_dir}")
+    return artifacts
 
 
 def _process_pipeline(
@@ -176,43 +275,59 @@ def _process_pipeline(
         f_dump_orig_pdf,
         f_dump_content_list,
         f_make_md_mode,
+        result_cache=None,
+        cache_keys=None,
+        use_page_cache=True,
+        event_callback=None,
+        cancel_event=None,
 ):
-    """处理pipeline后端逻辑"""
-    from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json as pipeline_result_to_middle_json
-    from mineru.backend.pipeline.pipeline_analyze import doc_analyze as pipeline_doc_analyze
-
-    infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list = (
-        pipeline_doc_analyze(
-            pdf_bytes_list, p_lang_list, parse_method=parse_method,
-            formula_enable=p_formula_enable, table_enable=p_table_enable
-        )
-    )
+    """处理pipeline后端逻辑，按页面窗口流式推理，每个文档处理完成后立即输出结果"""
+    from mineru.backend.pipeline.pipeline_analyze import doc_analyze_streaming as pipeline_doc_analyze_streaming
 
-    for idx, model_list in enumerate(infer_results):
-        model_json = copy.deepcopy(model_list)
-        pdf_file_name = pdf_file_names[idx]
+    image_writer_list = []
+    output_env_list = []
+    for pdf_file_name in pdf_file_names:
         local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
-        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
-
-        images_list = all_image_lists[idx]
-        pdf_doc = all_pdf_docs[idx]
-        _lang = lang_list[idx]
-        _ocr_enable = ocr_enabled_list[idx]
-
-        middle_json = pipeline_result_to_middle_json(
-            model_list, images_list, pdf_doc, image_writer,
-            _lang, _ocr_enable, p_formula_enable
-        )
+        image_writer_list.append(FileBasedDataWriter(local_image_dir))
+        output_env_list.append((local_image_dir, local_md_dir, FileBasedDataWriter(local_md_dir)))
+
+    progress_callback = None
+    if event_callback is not None:
+        def progress_callback(idx, stage, done_pages, total_pages, page_infos):
+            if stage == "page":
+                _emit_page_events(
+                    event_callback, pdf_file_names[idx], page_infos, output_env_list[idx][0], f_make_md_mode,
+                    is_pipeline=True, split_para=True,
+                )
+            event_callback({
+                "event": "progress",
+                "file": pdf_file_names[idx],
+                "stage": stage,
+                "processed_pages": done_pages,
+                "total_pages": total_pages,
+            })
+
+    for idx, model_json, middle_json, _ocr_enable in pipeline_doc_analyze_streaming(
+            pdf_bytes_list, image_writer_list, p_lang_list, parse_method=parse_method,
+            formula_enable=p_formula_enable, table_enable=p_table_enable, use_page_cache=use_page_cache,
+            progress_callback=progress_callback, cancel_event=cancel_event,
+    ):
+        pdf_file_name = pdf_file_names[idx]
+        local_image_dir, local_md_dir, md_writer = output_env_list[idx]
 
         pdf_info = middle_json["pdf_info"]
         pdf_bytes = pdf_bytes_list[idx]
 
-        _process_output(
+        if result_cache is not None and cache_keys[idx] is not None:
+            result_cache.put(cache_keys[idx], model_json, middle_json, local_image_dir)
+
+        artifacts = _process_output(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
             f_make_md_mode, middle_json, model_json, is_pipeline=True
         )
+        _emit_document_event(event_callback, pdf_file_name, artifacts)
 
 
 async def _async_process_vlm(
@@ -229,6 +344,10 @@ async def _async_process_vlm(
         f_dump_content_list,
         f_make_md_mode,
         server_url=None,
+        result_cache=None,
+        cache_keys=None,
+        event_callback=None,
+        cancel_event=None,
         **kwargs,
 ):
     """异步处理VLM后端逻辑"""
@@ -238,6 +357,7 @@ async def _async_process_vlm(
         server_url = None
 
     for idx, pdf_bytes in enumerate(pdf_bytes_list):
+        raise_if_cancelled(cancel_event)
         pdf_file_name = pdf_file_names[idx]
         local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
         image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
@@ -248,12 +368,23 @@ async def _async_process_vlm(
 
         pdf_info = middle_json["pdf_info"]
 
-        _process_output(
+        if result_cache is not None and cache_keys[idx] is not None:
+            result_cache.put(cache_keys[idx], infer_result, middle_json, local_image_dir)
+
+        # vlm后端整篇文档推理完成后才生成middle_json，页面事件在此时一次性发送
+        if event_callback is not None:
+            event_callback({
+                "event": "progress", "file": pdf_file_name, "stage": "inference",
+                "processed_pages": len(pdf_info), "total_pages": len(pdf_info),
+            })
+            _emit_page_events(event_callback, pdf_file_name, pdf_info, local_image_dir, f_make_md_mode, is_pipeline=False)
+        artifacts = _process_output(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
             f_make_md_mode, middle_json, infer_result, is_pipeline=False
         )
+        _emit_document_event(event_callback, pdf_file_name, artifacts)
 
 
 def _process_vlm(
@@ -270,6 +401,10 @@ def _process_vlm(
         f_dump_content_list,
         f_make_md_mode,
         server_url=None,
+        result_cache=None,
+        cache_keys=None,
+        event_callback=None,
+        cancel_event=None,
         **kwargs,
 ):
     """同步处理VLM后端逻辑"""
@@ -279,6 +414,7 @@ def _process_vlm(
         server_url = None
 
     for idx, pdf_bytes in enumerate(pdf_bytes_list):
+        raise_if_cancelled(cancel_event)
         pdf_file_name = pdf_file_names[idx]
         local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
         image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
@@ -289,12 +425,23 @@ def _process_vlm(
 
         pdf_info = middle_json["pdf_info"]
 
-        _process_output(
+        if result_cache is not None and cache_keys[idx] is not None:
+            result_cache.put(cache_keys[idx], infer_result, middle_json, local_image_dir)
+
+        # vlm后端整篇文档推理完成后才生成middle_json，页面事件在此时一次性发送
+        if event_callback is not None:
+            event_callback({
+                "event": "progress", "file": pdf_file_name, "stage": "inference",
+                "processed_pages": len(pdf_info), "total_pages": len(pdf_info),
+            })
+            _emit_page_events(event_callback, pdf_file_name, pdf_info, local_image_dir, f_make_md_mode, is_pipeline=False)
+        artifacts = _process_output(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
             f_make_md_mode, middle_json, infer_result, is_pipeline=False
         )
+        _emit_document_event(event_callback, pdf_file_name, artifacts)
 
 
 def do_parse(
@@ -317,17 +464,80 @@ def do_parse(
         f_make_md_mode=MakeMode.MM_MD,
         start_page_id=0,
         end_page_id=None,
+        use_cache=True,
+        event_callback=None,
+        cancel_event=None,
         **kwargs,
 ):
-    # 预处理PDF字节数据
-    pdf_bytes_list = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
+    # 每个PDF只解析一次，页码范围由DocumentHandle按下标偏移实现，无需裁剪并重新保存PDF
+    # event_callback(event)在解析过程中依次收到progress/page/document事件（dict），用于流式返回结果
+    # cancel_event（threading.Event）被设置后，解析在下一个页面窗口或文档开始前以ParseCancelledError结束
+    docs = _open_documents(pdf_bytes_list, start_page_id, end_page_id)
+    try:
+        _do_parse_documents(
+            output_dir, pdf_file_names, docs, p_lang_list, backend, parse_method,
+            formula_enable, table_enable, server_url,
+            f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            use_cache, event_callback, cancel_event=cancel_event, **kwargs,
+        )
+    finally:
+        _close_documents(docs)
+
+
+def _do_parse_documents(
+        output_dir,
+        pdf_file_names,
+        pdf_bytes_list,
+        p_lang_list,
+        backend,
+        parse_method,
+        formula_enable,
+        table_enable,
+        server_url,
+        f_draw_layout_bbox,
+        f_draw_span_bbox,
+        f_dump_md,
+        f_dump_middle_json,
+        f_dump_model_output,
+        f_dump_orig_pdf,
+        f_dump_content_list,
+        f_make_md_mode,
+        use_cache,
+        event_callback=None,
+        cancel_event=None,
+        **kwargs,
+):
+    # 结果缓存按原始PDF内容和页码范围计算key
+    result_cache = get_result_cache() if use_cache else None
+    cache_keys = _get_cache_keys(
+        result_cache, pdf_bytes_list, p_lang_list, backend, parse_method,
+        formula_enable, table_enable, server_url
+    )
+
+    if cache_keys is not None:
+        miss_indices = _process_cached_results(
+            output_dir, pdf_file_names, pdf_bytes_list, result_cache, cache_keys,
+            parse_method if backend == "pipeline" else "vlm", backend == "pipeline",
+            f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            event_callback=event_callback, cancel_event=cancel_event,
+        )
+        if not miss_indices:
+            return
+        pdf_file_names = _select(pdf_file_names, miss_indices)
+        pdf_bytes_list = _select(pdf_bytes_list, miss_indices)
+        p_lang_list = _select(p_lang_list, miss_indices)
+        cache_keys = _select(cache_keys, miss_indices)
 
     if backend == "pipeline":
         _process_pipeline(
             output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
             parse_method, formula_enable, table_enable,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            result_cache=result_cache, cache_keys=cache_keys, use_page_cache=use_cache,
+            event_callback=event_callback, cancel_event=cancel_event,
         )
     else:
         if backend.startswith("vlm-"):
@@ -343,7 +553,8 @@ def do_parse(
             output_dir, pdf_file_names, pdf_bytes_list, backend,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
             f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-            server_url, **kwargs,
+            server_url, result_cache=result_cache, cache_keys=cache_keys,
+            event_callback=event_callback, cancel_event=cancel_event, **kwargs,
         )
 
 
@@ -367,35 +578,101 @@ async def aio_do_parse(
         f_make_md_mode=MakeMode.MM_MD,
         start_page_id=0,
         end_page_id=None,
+        use_cache=True,
+        event_callback=None,
+        cancel_event=None,
         **kwargs,
 ):
-    # 预处理PDF字节数据
-    pdf_bytes_list = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
-
     if backend == "pipeline":
-        # pipeline模式暂不支持异步，使用同步处理方式
-        _process_pipeline(
-            output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
-            parse_method, formula_enable, table_enable,
+        # pipeline后端的推理是同步的，整个解析过程在专用推理线程中执行，事件循环保持响应
+        return await get_inference_executor().run(
+            do_parse, output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
+            backend=backend, parse_method=parse_method, formula_enable=formula_enable,
+            table_enable=table_enable, server_url=server_url,
+            f_draw_layout_bbox=f_draw_layout_bbox, f_draw_span_bbox=f_draw_span_bbox,
+            f_dump_md=f_dump_md, f_dump_middle_json=f_dump_middle_json,
+            f_dump_model_output=f_dump_model_output, f_dump_orig_pdf=f_dump_orig_pdf,
+            f_dump_content_list=f_dump_content_list, f_make_md_mode=f_make_md_mode,
+            start_page_id=start_page_id, end_page_id=end_page_id, use_cache=use_cache,
+            event_callback=event_callback, cancel_event=cancel_event, **kwargs,
+        )
+
+    # 每个PDF只解析一次，页码范围由DocumentHandle按下标偏移实现，无需裁剪并重新保存PDF
+    docs = _open_documents(pdf_bytes_list, start_page_id, end_page_id)
+    try:
+        await _aio_do_parse_documents(
+            output_dir, pdf_file_names, docs, p_lang_list, backend, parse_method,
+            formula_enable, table_enable, server_url,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            use_cache, event_callback, cancel_event=cancel_event, **kwargs,
         )
-    else:
-        if backend.startswith("vlm-"):
-            backend = backend[4:]
+    finally:
+        _close_documents(docs)
 
-        if backend == "vllm-engine":
-            raise Exception("vlm-vllm-engine backend is not supported in async mode, please use vlm-vllm-async-engine backend")
 
-        os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(formula_enable)
-        os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
+async def _aio_do_parse_documents(
+        output_dir,
+        pdf_file_names,
+        pdf_bytes_list,
+        p_lang_list,
+        backend,
+        parse_method,
+        formula_enable,
+        table_enable,
+        server_url,
+        f_draw_layout_bbox,
+        f_draw_span_bbox,
+        f_dump_md,
+        f_dump_middle_json,
+        f_dump_model_output,
+        f_dump_orig_pdf,
+        f_dump_content_list,
+        f_make_md_mode,
+        use_cache,
+        event_callback=None,
+        cancel_event=None,
+        **kwargs,
+):
+    # 结果缓存按原始PDF内容和页码范围计算key
+    result_cache = get_result_cache() if use_cache else None
+    cache_keys = _get_cache_keys(
+        result_cache, pdf_bytes_list, p_lang_list, backend, parse_method,
+        formula_enable, table_enable, server_url
+    )
 
-        await _async_process_vlm(
-            output_dir, pdf_file_names, pdf_bytes_list, backend,
+    if cache_keys is not None:
+        miss_indices = _process_cached_results(
+            output_dir, pdf_file_names, pdf_bytes_list, result_cache, cache_keys,
+            parse_method if backend == "pipeline" else "vlm", backend == "pipeline",
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
             f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-            server_url, **kwargs,
+            event_callback=event_callback, cancel_event=cancel_event,
         )
+        if not miss_indices:
+            return
+        pdf_file_names = _select(pdf_file_names, miss_indices)
+        pdf_bytes_list = _select(pdf_bytes_list, miss_indices)
+        p_lang_list = _select(p_lang_list, miss_indices)
+        cache_keys = _select(cache_keys, miss_indices)
+
+    # pipeline后端在aio_do_parse中交给推理线程执行，这里只处理vlm后端
+    if backend.startswith("vlm-"):
+        backend = backend[4:]
+
+    if backend == "vllm-engine":
+        raise Exception("vlm-vllm-engine backend is not supported in async mode, please use vlm-vllm-async-engine backend")
+
+    os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(formula_enable)
+    os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
+
+    await _async_process_vlm(
+        output_dir, pdf_file_names, pdf_bytes_list, backend,
+        f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+        f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+        server_url, result_cache=result_cache, cache_keys=cache_keys,
+        event_callback=event_callback, cancel_event=cancel_event, **kwargs,
+    )
 
 
 
@@ -1,16 +1,20 @@
 import uuid
 import os
+import json
 import re
 import tempfile
 import asyncio
+import threading
+import time
 import uvicorn
 import click
 import zipfile
+from contextlib import asynccontextmanager
 from pathlib import Path
 import glob
 from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from starlette.background import BackgroundTask
 from typing import List, Optional
 from loguru import logger
@@ -18,24 +22,143 @@ from base64 import b64encode
 
 from mineru.cli.common import aio_do_parse, read_fn, pdf_suffixes, image_suffixes
 from mineru.utils.cli_parser import arg_parse
+from mineru.utils.config_reader import get_image_native_input_enable
 from mineru.utils.guess_suffix_or_lang import guess_suffix_by_path
+from mineru.utils.inference_executor import ParseCancelledError, get_inference_executor_stats
+from mineru.backend.pipeline.model_warmup import (
+    get_model_preload_enable, get_models_info, get_warmup_status, is_models_ready, start_background_warmup,
+)
+from mineru.backend.pipeline.multi_device import get_multi_device_stats
+from mineru.backend.pipeline.page_batcher import get_page_batch_stats
+from mineru.backend.pipeline.page_cache import get_page_inference_cache_stats
+from mineru.utils.result_cache import get_result_cache_stats
 from mineru.version import __version__
 
-# 并发控制器
-_request_semaphore: Optional[asyncio.Semaphore] = None
+class RequestQueueFull(Exception):
+    pass
 
-# 并发控制依赖函数
+
+class RequestQueue:
+    """
+    请求准入队列：最多max_concurrent个请求同时处理，其余请求按到达顺序排队等待，
+    排队数达到max_queue_size时新请求直接返回503。max_concurrent为0时不限制并发，只做统计。
+    """
+
+    def __init__(self, max_concurrent=0, max_queue_size=0):
+        self.max_concurrent = max_concurrent
+        self.max_queue_size = max_queue_size
+        self._semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    async def acquire(self):
+        if self._semaphore is not None and self._semaphore.locked() and self.waiting >= self.max_queue_size:
+            self.rejected += 1
+            raise RequestQueueFull()
+        start_time = time.perf_counter()
+        self.waiting += 1
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        wait_time = time.perf_counter() - start_time
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self.completed += 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def stats(self):
+        admitted = self.running + self.completed
+        return {
+            "max_concurrent_requests": self.max_concurrent,
+            "max_queue_size": self.max_queue_size,
+            "running": self.running,
+            "queued": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_time": round(self.total_wait_time / admitted, 3) if admitted else 0.0,
+            "max_wait_time": round(self.max_wait_time, 3),
+        }
+
+
+class RequestSlot:
+    """
+    一个请求占用的并发槽位。默认由limit_concurrency在请求结束时释放；流式返回时endpoint调用detach()
+    将槽位交给响应体，由stream_parse_events在流结束后释放，不依赖FastAPI执行依赖清理的时机。release只生效一次。
+    """
+
+    def __init__(self, request_queue=None):
+        self._request_queue = request_queue
+        self._released = request_queue is None
+        self.detached = False
+
+    def detach(self):
+        self.detached = True
+        return self
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._request_queue.release()
+
+
+def get_max_concurrent_requests():
+    try:
+        max_concurrent_requests = int(os.getenv("MINERU_API_MAX_CONCURRENT_REQUESTS", "0"))
+    except ValueError:
+        max_concurrent_requests = 0
+    return max(0, max_concurrent_requests)
+
+
+def get_max_queue_size():
+    try:
+        max_queue_size = int(os.getenv("MINERU_API_MAX_QUEUE_SIZE", "100"))
+    except ValueError:
+        max_queue_size = 100
+    return max(0, max_queue_size)
+
+
+# 请求准入队列
+_request_queue: Optional[RequestQueue] = None
+
+# 并发控制依赖函数：超过最大并发数的请求排队等待，队列已满时返回503
 async def limit_concurrency():
-    if _request_semaphore is not None:
-        if _request_semaphore.locked():
-            raise HTTPException(
-                status_code=503,
-                detail=f"Server is at maximum capacity: {os.getenv('MINERU_API_MAX_CONCURRENT_REQUESTS', 'unset')}. Please try again later."
-            )
-        async with _request_semaphore:
-            yield
-    else:
-        yield
+    if _request_queue is None:
+        yield RequestSlot()
+        return
+    try:
+        await _request_queue.acquire()
+    except RequestQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server is at maximum capacity: {_request_queue.max_concurrent} running, "
+                   f"{_request_queue.waiting} queued. Please try again later."
+        )
+    request_slot = RequestSlot(_request_queue)
+    try:
+        yield request_slot
+    finally:
+        if not request_slot.detached:
+            request_slot.release()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # MINERU_MODEL_PRELOAD=1 时在后台预加载pipeline模型，/ready 在预热完成后才返回200
+    if get_model_preload_enable():
+        start_background_warmup()
+    yield
+
 
 def create_app():
     # By default, the OpenAPI documentation endpoints (openapi_url, docs_url, redoc_url) are enabled.
@@ -45,18 +168,18 @@ def create_app():
         openapi_url="/openapi.json" if enable_docs else None,
         docs_url="/docs" if enable_docs else None,
         redoc_url="/redoc" if enable_docs else None,
+        lifespan=lifespan,
     )
 
-    # 初始化并发控制器：从环境变量MINERU_API_MAX_CONCURRENT_REQUESTS读取
-    global _request_semaphore
-    try:
-        max_concurrent_requests = int(os.getenv("MINERU_API_MAX_CONCURRENT_REQUESTS", "0"))
-    except ValueError:
-        max_concurrent_requests = 0
-
+    # 初始化请求队列：并发数从环境变量MINERU_API_MAX_CONCURRENT_REQUESTS读取，排队数从MINERU_API_MAX_QUEUE_SIZE读取
+    global _request_queue
+    max_concurrent_requests = get_max_concurrent_requests()
+    _request_queue = RequestQueue(max_concurrent_requests, get_max_queue_size())
     if max_concurrent_requests > 0:
-        _request_semaphore = asyncio.Semaphore(max_concurrent_requests)
-        logger.info(f"Request concurrency limited to {max_concurrent_requests}")
+        logger.info(
+            f"Request concurrency limited to {max_concurrent_requests}, "
+            f"up to {_request_queue.max_queue_size} requests queued"
+        )
 
     app.add_middleware(GZipMiddleware, minimum_size=1000)
     return app
@@ -90,6 +213,86 @@ def encode_image(image_path: str) -> str:
         return b64encode(f.read()).decode()
 
 
+def get_parse_dir(unique_dir: str, pdf_name: str, backend: str, parse_method: str) -> str:
+    """结果文件所在目录，pipeline后端按解析方法分目录，vlm后端统一为vlm"""
+    if backend.startswith("pipeline"):
+        return os.path.join(unique_dir, pdf_name, parse_method)
+    return os.path.join(unique_dir, pdf_name, "vlm")
+
+
+def get_images(parse_dir: str) -> dict:
+    """读取解析目录下的图片，返回 文件名 -> base64 data url"""
+    images_dir = os.path.join(parse_dir, "images")
+    image_paths = glob.glob(os.path.join(glob.escape(images_dir), "*.jpg"))
+    return {
+        os.path.basename(image_path): f"data:image/jpeg;base64,{encode_image(image_path)}"
+        for image_path in image_paths
+    }
+
+
+# 流式返回支持的格式及对应的Content-Type
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def format_stream_event(event: dict, stream_format: str) -> str:
+    """将事件编码为一行NDJSON，或一条以事件类型命名的SSE消息"""
+    data = json.dumps(event, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return f"{data}\n"
+
+
+async def stream_parse_events(parse_kwargs: dict, stream_format: str, unique_dir: str, return_images: bool,
+                              request_slot: Optional[RequestSlot] = None):
+    """
+    在后台任务中执行aio_do_parse，并把解析过程中的事件按到达顺序编码后逐条产出：
+    progress（推理/后处理进度）、page（单页middle_json和markdown片段）、document（分段和跨页表格合并后的完整结果），
+    最后是done或error。客户端断开连接时设置cancel_event，推理线程中的解析在下一个页面窗口或文档前结束，
+    同时取消尚未开始执行的后台任务。request_slot为请求占用的并发槽位，在流结束（或客户端断开）后释放。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel_event = threading.Event()
+
+    def event_callback(event):
+        # 推理线程和事件循环都会调用，统一通过call_soon_threadsafe入队以保持事件顺序；取消后不再入队
+        if cancel_event.is_set():
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def run_parse():
+        try:
+            await aio_do_parse(event_callback=event_callback, cancel_event=cancel_event, **parse_kwargs)
+            event_callback({"event": "done", "backend": parse_kwargs["backend"], "version": __version__})
+        except ParseCancelledError:
+            logger.info("Streaming client disconnected, parse cancelled")
+        except Exception as e:
+            logger.exception(e)
+            event_callback({"event": "error", "error": f"Failed to process file: {str(e)}"})
+        finally:
+            event_callback(None)
+
+    task = asyncio.create_task(run_parse())
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            if event["event"] == "document" and return_images:
+                parse_dir = get_parse_dir(unique_dir, event["file"], parse_kwargs["backend"], parse_kwargs["parse_method"])
+                event["images"] = get_images(parse_dir)
+            yield format_stream_event(event, stream_format)
+    finally:
+        cancel_event.set()
+        if not task.done():
+            task.cancel()
+        if request_slot is not None:
+            request_slot.release()
+
+
 def get_infer_result(file_suffix_identifier: str, pdf_name: str, parse_dir: str) -> Optional[str]:
     """从结果文件中读取推理结果"""
     result_file_path = os.path.join(parse_dir, f"{pdf_name}{file_suffix_identifier}")
@@ -99,8 +302,9 @@ def get_infer_result(file_suffix_identifier: str, pdf_name: str, parse_dir: str)
     return None
 
 
-@app.post(path="/file_parse", dependencies=[Depends(limit_concurrency)])
+@app.post(path="/file_parse")
 async def parse_pdf(
+        request_slot: RequestSlot = Depends(limit_concurrency),
         files: List[UploadFile] = File(..., description="Upload pdf or image files for parsing"),
         output_dir: str = Form("./output", description="Output local directory"),
         lang_list: List[str] = Form(
@@ -141,11 +345,31 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
         response_format_zip: bool = Form(False, description="Return results as a ZIP file instead of JSON"),
         start_page_id: int = Form(0, description="The starting page for PDF parsing, beginning from 0"),
         end_page_id: int = Form(99999, description="The ending page for PDF parsing, beginning from 0"),
+        use_cache: bool = Form(True, description="Use the result cache (enabled by MINERU_RESULT_CACHE_DIR) and the page inference cache. Set to false to force a fresh parse"),
+        stream_format: Optional[str] = Form(
+            None,
+            description="""Stream results while parsing instead of returning them at the end:
+- ndjson: one JSON event per line (application/x-ndjson)
+- sse: Server-Sent Events (text/event-stream)
+Events: progress, page (per-page middle JSON and markdown), document (final results), done / error"""
+        ),
 ):
 
     # 获取命令行配置参数
     config = getattr(app.state, "config", {})
 
+    if stream_format:
+        if stream_format not in STREAM_MEDIA_TYPES:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"Unsupported stream format: {stream_format}, options: {', '.join(STREAM_MEDIA_TYPES)}"}
+            )
+        if response_format_zip:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "stream_format cannot be combined with response_format_zip"}
+            )
+
     try:
         # 创建唯一的输出目录
         unique_dir = os.path.join(output_dir, str(uuid.uuid4()))
@@ -168,7 +392,7 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
             file_suffix = guess_suffix_by_path(temp_path)
             if file_suffix in pdf_suffixes + image_suffixes:
                 try:
-                    pdf_bytes = read_fn(temp_path)
+                    pdf_bytes = read_fn(temp_path, image_native=get_image_native_input_enable())
                     pdf_bytes_list.append(pdf_bytes)
                     pdf_file_names.append(file_path.stem)
                     os.remove(temp_path)  # 删除临时文件
@@ -190,8 +414,7 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
             # 如果语言列表长度不匹配，使用第一个语言或默认"ch"
             actual_lang_list = [actual_lang_list[0] if actual_lang_list else "ch"] * len(pdf_file_names)
 
-        # 调用异步处理函数
-        await aio_do_parse(
+        parse_kwargs = dict(
             output_dir=unique_dir,
             pdf_file_names=pdf_file_names,
             pdf_bytes_list=pdf_bytes_list,
@@ -210,9 +433,24 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
             f_dump_content_list=return_content_list,
             start_page_id=start_page_id,
             end_page_id=end_page_id,
+            use_cache=use_cache,
             **config
         )
 
+        # 流式返回：每页完成后处理即发送，并发槽位交给响应体，在流结束后释放
+        # （响应体未开始迭代客户端就断开时由background释放，release只生效一次）
+        if stream_format:
+            request_slot.detach()
+            return StreamingResponse(
+                stream_parse_events(parse_kwargs, stream_format, unique_dir, return_images, request_slot=request_slot),
+                media_type=STREAM_MEDIA_TYPES[stream_format],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                background=BackgroundTask(request_slot.release),
+            )
+
+        # 调用异步处理函数
+        await aio_do_parse(**parse_kwargs)
+
         # 根据 response_format_zip 决定返回类型
         if response_format_zip:
             zip_fd, zip_path = tempfile.mkstemp(suffix=".zip", prefix="mineru_results_")
@@ -220,10 +458,7 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
             with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
                 for pdf_name in pdf_file_names:
                     safe_pdf_name = sanitize_filename(pdf_name)
-                    if backend.startswith("pipeline"):
-                        parse_dir = os.path.join(unique_dir, pdf_name, parse_method)
-                    else:
-                        parse_dir = os.path.join(unique_dir, pdf_name, "vlm")
+                    parse_dir = get_parse_dir(unique_dir, pdf_name, backend, parse_method)
 
                     if not os.path.exists(parse_dir):
                         continue
@@ -268,11 +503,7 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
             for pdf_name in pdf_file_names:
                 result_dict[pdf_name] = {}
                 data = result_dict[pdf_name]
-
-                if backend.startswith("pipeline"):
-                    parse_dir = os.path.join(unique_dir, pdf_name, parse_method)
-                else:
-                    parse_dir = os.path.join(unique_dir, pdf_name, "vlm")
+                parse_dir = get_parse_dir(unique_dir, pdf_name, backend, parse_method)
 
                 if os.path.exists(parse_dir):
                     if return_md:
@@ -284,15 +515,7 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
                     if return_content_list:
                         data["content_list"] = get_infer_result("_content_list.json", pdf_name, parse_dir)
                     if return_images:
-                        images_dir = os.path.join(parse_dir, "images")
-                        safe_pattern = os.path.join(glob.escape(images_dir), "*.jpg")
-                        image_paths = glob.glob(safe_pattern)
-                        data["images"] = {
-                            os.path.basename(
-                                image_path
-                            ): f"data:image/jpeg;base64,{encode_image(image_path)}"
-                            for image_path in image_paths
-                        }
+                        data["images"] = get_images(parse_dir)
 
             return JSONResponse(
                 status_code=200,
@@ -310,6 +533,44 @@ Options: ch, ch_server, ch_lite, en, korean, japan, chinese_cht, ta, te, ka, th,
         )
 
 
+@app.get(path="/cache/stats")
+async def cache_stats():
+    """返回结果缓存和页面推理缓存的命中/未命中次数和占用空间"""
+    content = get_result_cache_stats()
+    content["page_cache"] = get_page_inference_cache_stats()
+    return JSONResponse(status_code=200, content=content)
+
+
+@app.get(path="/queue/stats")
+async def queue_stats():
+    """
+    返回请求队列和推理线程的排队深度、执行中的任务数和平均等待时间，跨请求页面微批的批次大小和延迟直方图，
+    以及多设备推理时各设备处理的分片数、页数和忙碌时间
+    """
+    return JSONResponse(status_code=200, content={
+        "requests": _request_queue.stats() if _request_queue is not None else None,
+        "inference": get_inference_executor_stats(),
+        "page_batches": get_page_batch_stats(),
+        "devices": get_multi_device_stats(),
+    })
+
+
+@app.get(path="/ready")
+async def ready():
+    """就绪探针：开启预加载时模型预热完成前返回503，预热失败时返回500"""
+    status = get_warmup_status()
+    if is_models_ready():
+        return JSONResponse(status_code=200, content={"ready": True, "warmup": status})
+    status_code = 500 if status["state"] == "failed" else 503
+    return JSONResponse(status_code=status_code, content={"ready": False, "warmup": status})
+
+
+@app.get(path="/models")
+async def models():
+    """返回预热状态和已加载的模型，包括每个模型的设备、加载耗时和显存占用"""
+    return JSONResponse(status_code=200, content=get_models_info())
+
+
 @click.command(context_settings=dict(ignore_unknown_options=True, allow_extra_args=True))
 @click.pass_context
 @click.option('--host', default='127.0.0.1', help='Server host (default: 127.0.0.1)')
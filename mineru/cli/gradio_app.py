@@ -15,6 +15,7 @@ from loguru import logger
 from mineru.cli.common import prepare_env, read_fn, aio_do_parse, pdf_suffixes, image_suffixes
 from mineru.utils.check_sys_env import is_mac_os_version_supported
 from mineru.utils.cli_parser import arg_parse
+from mineru.utils.config_reader import get_image_native_input_enable
 from mineru.utils.hash_utils import str_sha256
 
 
@@ -23,7 +24,7 @@ async def parse_pdf(doc_path, output_dir, end_page_id, is_ocr, formula_enable, t
 
     try:
         file_name = f'{safe_stem(Path(doc_path).stem)}_{time.strftime("%y%m%d_%H%M%S")}'
-        pdf_data = read_fn(doc_path)
+        pdf_data = read_fn(doc_path, image_native=get_image_native_input_enable())
         if is_ocr:
             parse_method = 'ocr'
         else:
@@ -0,0 +1,236 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from mineru.utils.hash_utils import bytes_md5
+
+# 计算hash前将裁剪后的公式图片缩放到的高度
+FORMULA_HASH_HEIGHT = 64
+# 裁剪后高度超过该值的公式（多行公式、矩阵等）几乎不会重复，且缩放后容易丢失细节，不参与缓存
+FORMULA_HASH_MAX_HEIGHT = 192
+# 前景与背景的灰度差小于该值时认为是空白图片，不参与缓存
+FORMULA_HASH_MIN_CONTRAST = 32
+FORMULA_CACHE_DB_FILE = "formula_cache.sqlite3"
+
+
+def get_formula_cache_size():
+    """进程内缓存的最大公式数，设置为0且未设置磁盘缓存目录时关闭公式识别缓存"""
+    try:
+        return max(0, int(os.getenv('MINERU_FORMULA_CACHE_SIZE', 65536)))
+    except ValueError:
+        return 65536
+
+
+def get_formula_cache_dir():
+    return os.getenv('MINERU_FORMULA_CACHE_DIR', None)
+
+
+def get_formula_crop_hash(crop):
+    """
+    公式裁剪图的归一化hash：灰度化、二值化后裁掉四周空白，缩放到固定高度再计算hash，
+    同一公式在不同页面、不同位置、不同字号下的渲染结果得到相同的hash。
+    空白、低对比度以及过高的图片返回None，这些图片不参与缓存和去重。
+    """
+    if crop is None or crop.size == 0:
+        return None
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+    min_value, max_value = int(gray.min()), int(gray.max())
+    if max_value - min_value < FORMULA_HASH_MIN_CONTRAST:
+        return None
+    foreground = gray < (min_value + max_value) / 2
+    ys = np.flatnonzero(foreground.any(axis=1))
+    xs = np.flatnonzero(foreground.any(axis=0))
+    foreground = foreground[ys[0]:ys[-1] + 1, xs[0]:xs[-1] + 1]
+    h, w = foreground.shape
+    if h > FORMULA_HASH_MAX_HEIGHT:
+        return None
+    new_w = max(1, round(w * FORMULA_HASH_HEIGHT / h))
+    normalized = cv2.resize(
+        foreground.astype(np.uint8) * 255, (new_w, FORMULA_HASH_HEIGHT), interpolation=cv2.INTER_AREA
+    )
+    normalized = np.packbits(normalized >= 128, axis=1)
+    return bytes_md5(np.int32(new_w).tobytes() + normalized.tobytes())
+
+
+class FormulaResultCache:
+    """按公式裁剪图的归一化hash缓存公式识别结果（LaTeX），进程内LRU，可选的sqlite磁盘缓存。
+
+    key由模型命名空间和图片hash组成，切换公式识别模型后不会命中其他模型的结果；
+    设置MINERU_FORMULA_CACHE_DIR后结果同时写入磁盘，跨进程、跨任务共享。
+    """
+
+    def __init__(self, max_entries, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                self._conn = sqlite3.connect(
+                    os.path.join(cache_dir, FORMULA_CACHE_DB_FILE), timeout=30, check_same_thread=False
+                )
+                self._conn.execute('CREATE TABLE IF NOT EXISTS formula (key TEXT PRIMARY KEY, latex TEXT NOT NULL)')
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to open formula cache in {cache_dir}: {e}")
+                self._conn = None
+
+    @staticmethod
+    def make_key(namespace, crop_hash):
+        return f"{namespace}:{crop_hash}"
+
+    def _put_memory(self, key, latex):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = latex
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """批量查询，返回与keys对齐的列表，未命中的位置为None"""
+        results = [None] * len(keys)
+        with self._lock:
+            disk_keys = []
+            for idx, key in enumerate(keys):
+                latex = self._entries.get(key)
+                if latex is None:
+                    disk_keys.append(idx)
+                    continue
+                self._entries.move_to_end(key)
+                results[idx] = latex
+            if disk_keys and self._conn is not None:
+                try:
+                    for idx in disk_keys:
+                        row = self._conn.execute('SELECT latex FROM formula WHERE key = ?', (keys[idx],)).fetchone()
+                        if row is not None:
+                            results[idx] = row[0]
+                            self._put_memory(keys[idx], row[0])
+                            self.disk_hits += 1
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to read formula cache: {e}")
+            hit_count = sum(1 for latex in results if latex is not None)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return results
+
+    def put_many(self, items, deduplicated=0):
+        with self._lock:
+            self.deduplicated += deduplicated
+            for key, latex in items:
+                self._put_memory(key, latex)
+            if items and self._conn is not None:
+                try:
+                    self._conn.executemany('INSERT OR REPLACE INTO formula (key, latex) VALUES (?, ?)', items)
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to write formula cache: {e}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': True,
+                'cache_dir': self.cache_dir,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'deduplicated': self.deduplicated,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+
+_formula_cache = None
+_formula_cache_lock = threading.Lock()
+
+
+def get_formula_cache():
+    """返回进程内共享的公式识别缓存，MINERU_FORMULA_CACHE_SIZE为0且未设置MINERU_FORMULA_CACHE_DIR时返回None"""
+    global _formula_cache
+    max_entries = get_formula_cache_size()
+    cache_dir = get_formula_cache_dir()
+    if max_entries <= 0 and not cache_dir:
+        return None
+    with _formula_cache_lock:
+        if (
+            _formula_cache is None
+            or _formula_cache.max_entries != max_entries
+            or _formula_cache.cache_dir != cache_dir
+        ):
+            _formula_cache = FormulaResultCache(max_entries, cache_dir)
+        return _formula_cache
+
+
+def get_formula_cache_stats():
+    formula_cache = get_formula_cache()
+    if formula_cache is None:
+        return {'enabled': False}
+    return formula_cache.stats()
+
+
+def recognize_formulas_with_cache(crops, recognize_fn, namespace):
+    """
+    带缓存的公式识别，返回与crops对齐的LaTeX列表。
+    先查缓存，未命中的图片按hash去重后只把每个不同的公式交给recognize_fn识别一次，
+    识别结果写回缓存并分发给所有相同的图片。recognize_fn接收图片列表，返回等长的LaTeX列表。
+    """
+    formula_cache = get_formula_cache()
+    if formula_cache is None or not crops:
+        return recognize_fn(crops) if crops else []
+
+    crop_hashes = [get_formula_crop_hash(crop) for crop in crops]
+    hashed_indices = [idx for idx, crop_hash in enumerate(crop_hashes) if crop_hash is not None]
+    keys = [formula_cache.make_key(namespace, crop_hashes[idx]) for idx in hashed_indices]
+    cached_results = formula_cache.get_many(keys)
+
+    results = [None] * len(crops)
+    # key -> 需要识别的图片在unique_crops中的位置
+    pending = {}
+    unique_crops = []
+    unique_keys = []
+    crop_to_unique = {}
+    for idx, key, latex in zip(hashed_indices, keys, cached_results):
+        if latex is not None:
+            results[idx] = latex
+        elif key in pending:
+            crop_to_unique[idx] = pending[key]
+        else:
+            pending[key] = len(unique_crops)
+            crop_to_unique[idx] = len(unique_crops)
+            unique_crops.append(crops[idx])
+            unique_keys.append(key)
+    for idx, crop_hash in enumerate(crop_hashes):
+        if crop_hash is None:
+            crop_to_unique[idx] = len(unique_crops)
+            unique_crops.append(crops[idx])
+            unique_keys.append(None)
+
+    unique_results = recognize_fn(unique_crops) if unique_crops else []
+    for idx, unique_idx in crop_to_unique.items():
+        results[idx] = unique_results[unique_idx]
+
+    hit_count = sum(1 for latex in cached_results if latex is not None)
+    deduplicated = len(hashed_indices) - hit_count - len(pending)
+    formula_cache.put_many(
+        [(key, latex) for key, latex in zip(unique_keys, unique_results) if key is not None],
+        deduplicated=deduplicated,
+    )
+    logger.info(
+        f"MFR cache: {hit_count}/{len(crops)} formulas served from cache, "
+        f"{deduplicated} duplicates merged, {len(unique_crops)} formulas recognized"
+    )
+    return results
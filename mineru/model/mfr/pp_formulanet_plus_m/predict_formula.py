@@ -5,6 +5,7 @@ from pathlib import Path
 
 from loguru import logger
 from tqdm import tqdm
+from mineru.model.mfr.formula_cache import recognize_formulas_with_cache
 from mineru.model.utils.tools.infer import pytorchocr_utility
 from mineru.model.utils.pytorchocr.base_ocr_v20 import BaseOCRV20
 from .processors import (
@@ -48,6 +49,7 @@ class FormulaRecognizer(BaseOCRV20):
 
         self.load_state_dict(weights)
         self.device = torch.device(device) if isinstance(device, str) else device
+        self.cache_namespace = f"pp_formulanet_plus_m:{os.path.basename(os.path.normpath(weight_dir))}"
         self.net.to(self.device)
         self.net.eval()
 
@@ -94,9 +96,7 @@ class FormulaRecognizer(BaseOCRV20):
         images_formula_list = []
         mf_image_list = []
         backfill_list = []
-        image_info = []  # Store (area, original_index, image) tuples
 
-        # Collect images with their original indices
         for image_index in range(len(images_mfd_res)):
             mfd_res = images_mfd_res[image_index]
             image = images[image_index]
@@ -114,15 +114,29 @@ class FormulaRecognizer(BaseOCRV20):
                 }
                 formula_list.append(new_item)
                 bbox_img = image[ymin:ymax, xmin:xmax]
-                area = (xmax - xmin) * (ymax - ymin)
-
-                curr_idx = len(mf_image_list)
-                image_info.append((area, curr_idx, bbox_img))
                 mf_image_list.append(bbox_img)
 
             images_formula_list.append(formula_list)
             backfill_list += formula_list
 
+        # 重复出现的公式只识别一次，识别结果在页面和文档之间共享
+        rec_formula = recognize_formulas_with_cache(
+            mf_image_list,
+            lambda crops: self.recognize_crops(crops, batch_size),
+            namespace=self.cache_namespace,
+        )
+
+        for res, latex in zip(backfill_list, rec_formula):
+            res["latex"] = latex
+
+        return images_formula_list
+
+    def recognize_crops(self, mf_image_list: list, batch_size: int = 64) -> list:
+        image_info = []  # Store (area, original_index, image) tuples
+        for curr_idx, bbox_img in enumerate(mf_image_list):
+            area = bbox_img.shape[0] * bbox_img.shape[1]
+            image_info.append((area, curr_idx, bbox_img))
+
         # Stable sort by area
         image_info.sort(key=lambda x: x[0])  # sort by area
         sorted_indices = [x[1] for x in image_info]
@@ -146,7 +160,4 @@ class FormulaRecognizer(BaseOCRV20):
             original_idx = index_mapping[new_idx]
             unsorted_results[original_idx] = latex
 
-        for res, latex in zip(backfill_list, unsorted_results):
-            res["latex"] = latex
-
-        return images_formula_list
+        return unsorted_results
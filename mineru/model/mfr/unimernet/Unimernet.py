@@ -1,7 +1,48 @@
+import os
 import torch
 from torch.utils.data import DataLoader, Dataset
 from tqdm import tqdm
 
+from mineru.model.mfr.formula_cache import recognize_formulas_with_cache
+
+
+# 估计公式行数时使用的单行高度（像素）
+MFR_LINE_HEIGHT = 40
+# 单行公式每单位宽高比对应的token数
+MFR_TOKENS_PER_WH_RATIO = 4
+# 按预测长度分桶时，每个batch内 公式数 × 最大预测长度 的上限为 batch_size × 该值
+MFR_TOKENS_PER_SLOT = 64
+
+
+def predict_formula_token_length(image) -> float:
+    """
+    根据公式截图的尺寸估计解码的token数：单行公式与宽高比成正比，
+    高度超过单行高度时按 (宽/行高) × (高/行高) 估计多行公式的长度
+    """
+    h, w = image.shape[:2]
+    h, w = max(h, 1), max(w, 1)
+    line_height = min(h, MFR_LINE_HEIGHT)
+    return MFR_TOKENS_PER_WH_RATIO * w * h / (line_height * line_height)
+
+
+def split_length_buckets(predicted_lengths: list, batch_size: int) -> list:
+    """
+    predicted_lengths已按升序排列，返回每个batch包含的下标列表。
+    batch内的公式数不超过batch_size，且 公式数 × 最大预测长度 不超过token预算，
+    长公式单独组成较小的batch，不会拖慢大量短公式的解码。
+    """
+    token_budget = batch_size * MFR_TOKENS_PER_SLOT
+    batches = []
+    current = []
+    for idx, length in enumerate(predicted_lengths):
+        if current and (len(current) >= batch_size or (len(current) + 1) * length > token_budget):
+            batches.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        batches.append(current)
+    return batches
+
 
 class MathDataset(Dataset):
     def __init__(self, image_paths, transform=None):
@@ -26,6 +67,9 @@ class UnimernetModel(object):
         else:
             self.model = UnimernetModel.from_pretrained(weight_dir)
         self.device = _device_
+        self.cache_namespace = f"unimernet:{os.path.basename(os.path.normpath(weight_dir))}"
+        # 按预测的token长度分桶组batch，关闭时退回按面积排序的固定batch
+        self.length_aware_batching = True
         self.model.to(_device_)
         if not _device_.startswith("cpu"):
             self.model = self.model.to(dtype=torch.float16)
@@ -65,9 +109,7 @@ class UnimernetModel(object):
         images_formula_list = []
         mf_image_list = []
         backfill_list = []
-        image_info = []  # Store (area, original_index, image) tuples
 
-        # Collect images with their original indices
         for image_index in range(len(images_mfd_res)):
             mfd_res = images_mfd_res[image_index]
             image = images[image_index]
@@ -85,17 +127,35 @@ class UnimernetModel(object):
                 }
                 formula_list.append(new_item)
                 bbox_img = image[ymin:ymax, xmin:xmax]
-                area = (xmax - xmin) * (ymax - ymin)
-
-                curr_idx = len(mf_image_list)
-                image_info.append((area, curr_idx, bbox_img))
                 mf_image_list.append(bbox_img)
 
             images_formula_list.append(formula_list)
             backfill_list += formula_list
 
-        # Stable sort by area
-        image_info.sort(key=lambda x: x[0])  # sort by area
+        # 重复出现的公式只识别一次，识别结果在页面和文档之间共享
+        mfr_res = recognize_formulas_with_cache(
+            mf_image_list,
+            lambda crops: self.recognize_crops(crops, batch_size),
+            namespace=self.cache_namespace,
+        )
+
+        # Fill results back
+        for res, latex in zip(backfill_list, mfr_res):
+            res["latex"] = latex
+
+        return images_formula_list
+
+    def recognize_crops(self, mf_image_list: list, batch_size: int = 64) -> list:
+        image_info = []  # Store (sort_key, original_index, image) tuples
+        for curr_idx, bbox_img in enumerate(mf_image_list):
+            if self.length_aware_batching:
+                sort_key = predict_formula_token_length(bbox_img)
+            else:
+                sort_key = bbox_img.shape[0] * bbox_img.shape[1]
+            image_info.append((sort_key, curr_idx, bbox_img))
+
+        # Stable sort by predicted token length (or area)
+        image_info.sort(key=lambda x: x[0])
         sorted_indices = [x[1] for x in image_info]
         sorted_images = [x[2] for x in image_info]
 
@@ -108,23 +168,24 @@ class UnimernetModel(object):
         # 如果batch_size > len(sorted_images)，则设置为不超过len(sorted_images)的2的幂
         batch_size = min(batch_size, max(1, 2 ** (len(sorted_images).bit_length() - 1))) if sorted_images else 1
 
-        dataloader = DataLoader(dataset, batch_size=batch_size, num_workers=0)
+        if self.length_aware_batching:
+            # 预测长度相近的公式放在同一个batch，长公式的batch按token预算缩小
+            batch_sampler = split_length_buckets([x[0] for x in image_info], batch_size)
+            dataloader = DataLoader(dataset, batch_sampler=batch_sampler, num_workers=0)
+        else:
+            dataloader = DataLoader(dataset, batch_size=batch_size, num_workers=0)
 
         # Process batches and store results
         mfr_res = []
-        # for mf_img in dataloader:
 
         with tqdm(total=len(sorted_images), desc="MFR Predict") as pbar:
-            for index, mf_img in enumerate(dataloader):
+            for mf_img in dataloader:
                 mf_img = mf_img.to(dtype=self.model.dtype)
                 mf_img = mf_img.to(self.device)
                 with torch.no_grad():
                     output = self.model.generate({"image": mf_img}, batch_size=batch_size)
                 mfr_res.extend(output["fixed_str"])
-
-                # 更新进度条，每次增加batch_size，但要注意最后一个batch可能不足batch_size
-                current_batch_size = min(batch_size, len(sorted_images) - index * batch_size)
-                pbar.update(current_batch_size)
+                pbar.update(mf_img.shape[0])
 
         # Restore original order
         unsorted_results = [""] * len(mfr_res)
@@ -132,8 +193,4 @@ class UnimernetModel(object):
             original_idx = index_mapping[new_idx]
             unsorted_results[original_idx] = latex
 
-        # Fill results back
-        for res, latex in zip(backfill_list, unsorted_results):
-            res["latex"] = latex
-
-        return images_formula_list
+        return unsorted_results
@@ -160,13 +160,19 @@ class UnimernetModel(VisionEncoderDecoderModel):
             else:
                 self.tokenizer.tokenizer.model_max_length = 1344  # 8g
 
-        outputs = super().generate(
-            pixel_values=pixel_values,
-            max_new_tokens=self.tokenizer.tokenizer.model_max_length, # required
-            decoder_start_token_id=self.tokenizer.tokenizer.bos_token_id,
-            do_sample=do_sample,
-            **kwargs,
-        )
+        if not do_sample and self._greedy_retire_supported():
+            outputs = self.greedy_generate_with_retirement(
+                pixel_values,
+                max_new_tokens=self.tokenizer.tokenizer.model_max_length,
+            )
+        else:
+            outputs = super().generate(
+                pixel_values=pixel_values,
+                max_new_tokens=self.tokenizer.tokenizer.model_max_length, # required
+                decoder_start_token_id=self.tokenizer.tokenizer.bos_token_id,
+                do_sample=do_sample,
+                **kwargs,
+            )
 
         outputs = outputs[:, 1:].cpu().numpy()
         pred_tokens = self.tokenizer.detokenize(outputs)
@@ -174,3 +180,105 @@ class UnimernetModel(VisionEncoderDecoderModel):
         fixed_str = [latex_rm_whitespace(s) for s in pred_str]
         return {"pred_ids": outputs, "pred_tokens": pred_tokens, "pred_str": pred_str, "fixed_str": fixed_str}
 
+
+    def _greedy_retire_supported(self):
+        """generation_config中只有贪心解码可以直接复现的设置时，才使用自定义的解码循环"""
+        gen_config = self.generation_config
+        return (
+            (gen_config.num_beams or 1) == 1
+            and (gen_config.repetition_penalty or 1.0) == 1.0
+            and not gen_config.no_repeat_ngram_size
+            and not gen_config.bad_words_ids
+            and not gen_config.suppress_tokens
+            and not gen_config.begin_suppress_tokens
+            and gen_config.forced_bos_token_id is None
+            and not gen_config.min_length
+            and not gen_config.min_new_tokens
+        )
+
+    @torch.no_grad()
+    def greedy_generate_with_retirement(self, pixel_values, max_new_tokens, retire_ratio=0.25):
+        """
+        贪心解码，已经输出eos的序列会从batch中移除（同时裁剪kv cache和encoder输出），
+        剩余的长序列不再为已结束的短序列做无效计算。输出与transformers的greedy generate一致：
+        [bos, tokens..., eos, pad...]，按最长序列右侧补pad。
+        为了减少kv cache的拷贝次数，已结束的序列数达到活动序列数的retire_ratio后才压缩batch。
+        """
+        bos_token_id = self.tokenizer.tokenizer.bos_token_id
+        eos_token_id = self.generation_config.eos_token_id
+        if eos_token_id is None:
+            eos_token_id = self.tokenizer.eos_token_id
+        if isinstance(eos_token_id, (list, tuple)):
+            eos_token_id = eos_token_id[0]
+        pad_token_id = self.generation_config.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.pad_token_id
+        forced_eos_token_id = self.generation_config.forced_eos_token_id
+        if isinstance(forced_eos_token_id, (list, tuple)):
+            forced_eos_token_id = forced_eos_token_id[0]
+
+        encoder_hidden_states = self.encoder(pixel_values=pixel_values)[0]
+        if (
+            self.encoder.config.hidden_size != self.decoder.config.hidden_size
+            and self.decoder.config.cross_attention_hidden_size is None
+        ):
+            encoder_hidden_states = self.enc_to_dec_proj(encoder_hidden_states)
+
+        batch_size = pixel_values.shape[0]
+        device = pixel_values.device
+        # 活动序列在原batch中的下标
+        active_indices = torch.arange(batch_size, device=device)
+        generated = [[] for _ in range(batch_size)]
+        finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
+        input_ids = torch.full((batch_size, 1), bos_token_id, dtype=torch.long, device=device)
+        past_key_values = None
+
+        for step in range(max_new_tokens):
+            cur_len = step + 1
+            decoder_outputs = self.decoder(
+                input_ids=input_ids,
+                attention_mask=torch.ones((input_ids.shape[0], cur_len), dtype=torch.long, device=device),
+                encoder_hidden_states=encoder_hidden_states,
+                past_key_values=past_key_values,
+                use_cache=True,
+                return_dict=True,
+            )
+            past_key_values = decoder_outputs.past_key_values
+            next_token_logits = decoder_outputs.logits[:, -1, :]
+            if forced_eos_token_id is not None and step == max_new_tokens - 1:
+                next_tokens = torch.full_like(active_indices, forced_eos_token_id)
+            else:
+                next_tokens = torch.argmax(next_token_logits, dim=-1)
+            next_tokens = torch.where(finished, torch.full_like(next_tokens, pad_token_id), next_tokens)
+
+            for row, token in zip(active_indices.tolist(), next_tokens.tolist()):
+                generated[row].append(token)
+            finished = finished | (next_tokens == eos_token_id)
+            if bool(finished.all()):
+                break
+
+            finished_count = int(finished.sum())
+            if finished_count and finished_count >= retire_ratio * finished.shape[0]:
+                keep = torch.nonzero(~finished, as_tuple=False).squeeze(1)
+                active_indices = active_indices[keep]
+                next_tokens = next_tokens[keep]
+                finished = finished[keep]
+                encoder_hidden_states = encoder_hidden_states.index_select(0, keep)
+                past_key_values = tuple(
+                    tuple(past_state.index_select(0, keep) for past_state in layer_past)
+                    for layer_past in past_key_values
+                )
+            input_ids = next_tokens.unsqueeze(1)
+
+        # 已结束的序列在移除前可能多记录了pad，与批量解码的输出一样统一截断到eos
+        max_len = 0
+        for tokens in generated:
+            if eos_token_id in tokens:
+                del tokens[tokens.index(eos_token_id) + 1:]
+            max_len = max(max_len, len(tokens))
+        outputs = torch.full((batch_size, max_len + 1), pad_token_id, dtype=torch.long)
+        outputs[:, 0] = bos_token_id
+        for row, tokens in enumerate(generated):
+            if tokens:
+                outputs[row, 1:len(tokens) + 1] = torch.tensor(tokens, dtype=torch.long)
+        return outputs
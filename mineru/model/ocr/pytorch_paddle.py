@@ -11,6 +11,7 @@ from loguru import logger
 
 from mineru.utils.config_reader import get_device
 from mineru.utils.enum_class import ModelPath
+from mineru.utils.model_utils import get_vram
 from mineru.utils.models_download_utils import auto_download_and_get_model_root_path
 from mineru.utils.ocr_utils import check_img, preprocess_image, sorted_boxes, merge_det_boxes, update_det_boxes, get_rotate_crop_image
 from mineru.model.utils.tools.infer.predict_system import TextSystem
@@ -136,6 +137,16 @@ def get_model_params(lang, config):
 
 root_dir = os.path.join(Path(__file__).resolve().parent.parent, 'utils')
 
+# 每GB显存对应的文本识别batch宽度预算(以宽高比计，即batch内 crop数 × 填充后宽高比)
+REC_BATCH_WH_BUDGET_PER_GB = 48
+
+
+def get_rec_batch_budget(device) -> int:
+    """根据显存大小(可通过MINERU_VIRTUAL_VRAM_SIZE指定)计算文本识别的batch宽度预算，cpu上返回0，使用固定batch大小"""
+    if str(device).startswith('cpu'):
+        return 0
+    return get_vram(device) * REC_BATCH_WH_BUDGET_PER_GB
+
 
 class PytorchPaddleOCR(TextSystem):
     def __init__(self, *args, **kwargs):
@@ -177,6 +188,7 @@ class PytorchPaddleOCR(TextSystem):
         kwargs['rec_model_path'] = rec_model_path
         kwargs['rec_char_dict_path'] = os.path.join(root_dir, 'pytorchocr', 'utils', 'resources', 'dict', dict_file)
         kwargs['rec_batch_num'] = 6
+        kwargs['rec_batch_budget'] = get_rec_batch_budget(device)
 
         kwargs['device'] = device
 
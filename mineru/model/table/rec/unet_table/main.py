@@ -3,14 +3,16 @@ import logging
 import os
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict
 
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Optional, Union, Dict, Any, Tuple
 import numpy as np
 import cv2
 from PIL import Image
 from loguru import logger
 from bs4 import BeautifulSoup
+from tqdm import tqdm
 
 from mineru.utils.span_pre_proc import calculate_contrast
 from .table_structure_unet import TSRUnet
@@ -27,6 +29,8 @@ from .utils_table_recover import (
     gather_ocr_list_by_row,
 )
 
+WIRED_TABLE_POSTPROCESS_WORKERS = min(8, os.cpu_count() or 1)
+
 
 @dataclass
 class WiredTableInput:
@@ -70,13 +74,8 @@ class WiredTableRecognition:
             return WiredTableOutput("", None, None, 0.0)
 
         try:
-            table_res, logi_points = self.table_recover(
-                rotated_polygons, row_threshold, col_threshold
-            )
-            # 将坐标由逆时针转为顺时针方向，后续处理与无线表格对齐
-            polygons[:, 1, :], polygons[:, 3, :] = (
-                polygons[:, 3, :].copy(),
-                polygons[:, 1, :].copy(),
+            polygons, logi_points = self.recover_logic_points(
+                polygons, rotated_polygons, row_threshold, col_threshold
             )
             if not need_ocr:
                 sorted_polygons, idx_list = sorted_ocr_boxes(
@@ -91,24 +90,40 @@ class WiredTableRecognition:
             cell_box_det_map, not_match_orc_boxes = match_ocr_cell(ocr_result, polygons)
             # 如果有识别框没有ocr结果，直接进行rec补充
             cell_box_det_map = self.fill_blank_rec(img, polygons, cell_box_det_map)
-            # 转换为中间格式，修正识别框坐标,将物理识别框，逻辑识别框，ocr识别框整合为dict，方便后续处理
-            t_rec_ocr_list = self.transform_res(cell_box_det_map, polygons, logi_points)
-            # 将每个单元格中的ocr识别结果排序和同行合并，输出的html能完整保留文字的换行格式
-            t_rec_ocr_list = self.sort_and_gather_ocr_res(t_rec_ocr_list)
-
-            logi_points = [t_box_ocr["t_logic_box"] for t_box_ocr in t_rec_ocr_list]
-            cell_box_det_map = {
-                i: [ocr_box_and_text[1] for ocr_box_and_text in t_box_ocr["t_ocr_res"]]
-                for i, t_box_ocr in enumerate(t_rec_ocr_list)
-            }
-            pred_html = plot_html_table(logi_points, cell_box_det_map)
-            polygons = np.array(polygons).reshape(-1, 8)
-            logi_points = np.array(logi_points)
-            elapse = time.perf_counter() - s
+            return self.build_output(polygons, logi_points, cell_box_det_map, s)
 
         except Exception:
             logging.warning(traceback.format_exc())
             return WiredTableOutput("", None, None, 0.0)
+
+    def recover_logic_points(self, polygons, rotated_polygons, row_threshold=10, col_threshold=15):
+        """由单元格多边形恢复逻辑坐标，并将多边形坐标由逆时针转为顺时针方向"""
+        table_res, logi_points = self.table_recover(
+            rotated_polygons, row_threshold, col_threshold
+        )
+        # 将坐标由逆时针转为顺时针方向，后续处理与无线表格对齐
+        polygons[:, 1, :], polygons[:, 3, :] = (
+            polygons[:, 3, :].copy(),
+            polygons[:, 1, :].copy(),
+        )
+        return polygons, logi_points
+
+    def build_output(self, polygons, logi_points, cell_box_det_map, start_time) -> WiredTableOutput:
+        """由单元格和已填充的ocr结果生成html"""
+        # 转换为中间格式，修正识别框坐标,将物理识别框，逻辑识别框，ocr识别框整合为dict，方便后续处理
+        t_rec_ocr_list = self.transform_res(cell_box_det_map, polygons, logi_points)
+        # 将每个单元格中的ocr识别结果排序和同行合并，输出的html能完整保留文字的换行格式
+        t_rec_ocr_list = self.sort_and_gather_ocr_res(t_rec_ocr_list)
+
+        logi_points = [t_box_ocr["t_logic_box"] for t_box_ocr in t_rec_ocr_list]
+        cell_box_det_map = {
+            i: [ocr_box_and_text[1] for ocr_box_and_text in t_box_ocr["t_ocr_res"]]
+            for i, t_box_ocr in enumerate(t_rec_ocr_list)
+        }
+        pred_html = plot_html_table(logi_points, cell_box_det_map)
+        polygons = np.array(polygons).reshape(-1, 8)
+        logi_points = np.array(logi_points)
+        elapse = time.perf_counter() - start_time
         return WiredTableOutput(pred_html, polygons, logi_points, elapse)
 
     def transform_res(
@@ -172,6 +187,33 @@ class WiredTableRecognition:
         cell_box_map: Dict[int, List[str]],
     ) -> Dict[int, List[Any]]:
         """找到poly对应为空的框，尝试将直接将poly框直接送到识别中"""
+        img_crop_list, img_crop_info_list = self.get_blank_cell_crops(img, sorted_polygons, cell_box_map)
+
+        if len(img_crop_list) > 0:
+            # 进行ocr识别
+            ocr_result = self.ocr_engine.ocr(img_crop_list, det=False)
+            # ocr_result = [[]]
+            # for crop_img in img_crop_list:
+            #     tmp_ocr_result = self.ocr_engine.ocr(crop_img)
+            #     if tmp_ocr_result[0] and len(tmp_ocr_result[0]) > 0 and isinstance(tmp_ocr_result[0], list) and len(tmp_ocr_result[0][0]) == 2:
+            #         ocr_result[0].append(tmp_ocr_result[0][0][1])
+            #     else:
+            #         ocr_result[0].append(("", 0.0))
+
+            ocr_res_list = check_blank_rec_result(ocr_result, len(img_crop_list))
+            if ocr_res_list is None:
+                return cell_box_map
+            self.fill_blank_rec_result(sorted_polygons, cell_box_map, img_crop_info_list, ocr_res_list)
+
+        return cell_box_map
+
+    def get_blank_cell_crops(
+        self,
+        img: np.ndarray,
+        sorted_polygons: np.ndarray,
+        cell_box_map: Dict[int, List[str]],
+    ) -> Tuple[List[np.ndarray], List[list]]:
+        """截取没有ocr结果的单元格图片，返回 (截图列表, [单元格索引, 单元格框] 列表)，对比度过低的单元格直接填充为空"""
         bgr_img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
         img_crop_info_list = []
         img_crop_list = []
@@ -201,40 +243,34 @@ class WiredTableRecognition:
 
             img_crop_list.append(img_crop)
             img_crop_info_list.append([i, box])
+        return img_crop_list, img_crop_info_list
+
+    @staticmethod
+    def fill_blank_rec_result(sorted_polygons, cell_box_map, img_crop_info_list, ocr_res_list):
+        """将空白单元格的识别结果填回cell_box_map"""
+        for (i, box), ocr_res in zip(img_crop_info_list, ocr_res_list):
+            # 处理ocr结果
+            ocr_text, ocr_score = ocr_res
+            # logger.debug(f"OCR result for box {i}: {ocr_text} with score {ocr_score}")
+            if ocr_score < 0.6 or ocr_text in ['1','口','■','（204号', '（20', '（2', '（2号', '（20号', '号', '（204']:
+                # logger.warning(f"Low confidence OCR result for box {i}: {ocr_text} with score {ocr_score}")
+                box = sorted_polygons[i]
+                cell_box_map[i] = [[box, "", 0.1]]
+                continue
+            cell_box_map[i] = [[box, ocr_text, ocr_score]]
+        return cell_box_map
 
-        if len(img_crop_list) > 0:
-            # 进行ocr识别
-            ocr_result = self.ocr_engine.ocr(img_crop_list, det=False)
-            # ocr_result = [[]]
-            # for crop_img in img_crop_list:
-            #     tmp_ocr_result = self.ocr_engine.ocr(crop_img)
-            #     if tmp_ocr_result[0] and len(tmp_ocr_result[0]) > 0 and isinstance(tmp_ocr_result[0], list) and len(tmp_ocr_result[0][0]) == 2:
-            #         ocr_result[0].append(tmp_ocr_result[0][0][1])
-            #     else:
-            #         ocr_result[0].append(("", 0.0))
-
-            if not ocr_result or not isinstance(ocr_result, list) or len(ocr_result) == 0:
-                logger.warning("OCR engine returned no results or invalid result for image crops.")
-                return cell_box_map
-            ocr_res_list = ocr_result[0]
-            if not isinstance(ocr_res_list, list) or len(ocr_res_list) != len(img_crop_list):
-                logger.warning("OCR result list length does not match image crop list length.")
-                return cell_box_map
-            for j, ocr_res in enumerate(ocr_res_list):
-                img_crop_info_list[j].append(ocr_res)
-
-            for i, box, ocr_res in img_crop_info_list:
-                # 处理ocr结果
-                ocr_text, ocr_score = ocr_res
-                # logger.debug(f"OCR result for box {i}: {ocr_text} with score {ocr_score}")
-                if ocr_score < 0.6 or ocr_text in ['1','口','■','（204号', '（20', '（2', '（2号', '（20号', '号', '（204']:
-                    # logger.warning(f"Low confidence OCR result for box {i}: {ocr_text} with score {ocr_score}")
-                    box = sorted_polygons[i]
-                    cell_box_map[i] = [[box, "", 0.1]]
-                    continue
-                cell_box_map[i] = [[box, ocr_text, ocr_score]]
 
-        return cell_box_map
+def check_blank_rec_result(ocr_result, crop_count):
+    """校验空白单元格的识别结果，结果无效时返回None"""
+    if not ocr_result or not isinstance(ocr_result, list) or len(ocr_result) == 0:
+        logger.warning("OCR engine returned no results or invalid result for image crops.")
+        return None
+    ocr_res_list = ocr_result[0]
+    if not isinstance(ocr_res_list, list) or len(ocr_res_list) != crop_count:
+        logger.warning("OCR result list length does not match image crop list length.")
+        return None
+    return ocr_res_list
 
 
 def escape_html(input_string):
@@ -292,58 +328,177 @@ class UnetTableModel:
             # )
 
             wired_html_code = wired_table_results.pred_html
-            wired_len = count_table_cells_physical(wired_html_code)
-            wireless_len = count_table_cells_physical(wireless_html_code)
-            # 计算两种模型检测的单元格数量差异
-            gap_of_len = wireless_len - wired_len
-            # logger.debug(f"wired table cell bboxes: {wired_len}, wireless table cell bboxes: {wireless_len}")
-
-            # 使用OCR结果计算两种模型填入的文字数量
-            wireless_text_count = 0
-            wired_text_count = 0
-            for ocr_res in ocr_result:
-                if ocr_res[1] in wireless_html_code:
-                    wireless_text_count += 1
-                if ocr_res[1] in wired_html_code:
-                    wired_text_count += 1
-            # logger.debug(f"wireless table ocr text count: {wireless_text_count}, wired table ocr text count: {wired_text_count}")
-
-            # 使用HTML解析器计算空单元格数量
-            wireless_soup = BeautifulSoup(wireless_html_code, 'html.parser') if wireless_html_code else BeautifulSoup("", 'html.parser')
-            wired_soup = BeautifulSoup(wired_html_code, 'html.parser') if wired_html_code else BeautifulSoup("", 'html.parser')
-            # 计算空单元格数量(没有文本内容或只有空白字符)
-            wireless_blank_count = sum(1 for cell in wireless_soup.find_all(['td', 'th']) if not cell.text.strip())
-            wired_blank_count = sum(1 for cell in wired_soup.find_all(['td', 'th']) if not cell.text.strip())
-            # logger.debug(f"wireless table blank cell count: {wireless_blank_count}, wired table blank cell count: {wired_blank_count}")
-
-            # 计算非空单元格数量
-            wireless_non_blank_count = wireless_len - wireless_blank_count
-            wired_non_blank_count = wired_len - wired_blank_count
-            # 无线表非空格数量大于有线表非空格数量时，才考虑切换
-            switch_flag = False
-            if wireless_non_blank_count > wired_non_blank_count:
-                # 假设非空表格是接近正方表，使用非空单元格数量开平方作为表格规模的估计
-                wired_table_scale = round(wired_non_blank_count ** 0.5)
-                # logger.debug(f"wireless non-blank cell count: {wireless_non_blank_count}, wired non-blank cell count: {wired_non_blank_count}, wired table scale: {wired_table_scale}")
-                # 如果无线表非空格的数量比有线表多一列或以上，需要切换到无线表
-                wired_scale_plus_2_cols = wired_non_blank_count + (wired_table_scale * 2)
-                wired_scale_squared_plus_2_rows = wired_table_scale * (wired_table_scale + 2)
-                if (wireless_non_blank_count + 3) >= max(wired_scale_plus_2_cols, wired_scale_squared_plus_2_rows):
-                    switch_flag = True
-
-            # 判断是否使用无线表格模型的结果
-            if (
-                switch_flag
-                or (0 <= gap_of_len <= 5 and wired_len <= round(wireless_len * 0.75))  # 两者相差不大但有线模型结果较少
-                or (gap_of_len == 0 and wired_len <= 4)  # 单元格数量完全相等且总量小于等于4
-                or (wired_text_count <= wireless_text_count * 0.6 and  wireless_text_count >=10) # 有线模型填入的文字明显少于无线模型
-            ):
-                # logger.debug("fall back to wireless table model")
-                html_code = wireless_html_code
-            else:
-                html_code = wired_html_code
-
-            return html_code
+            return self.select_html(wired_html_code, wireless_html_code, ocr_result)
         except Exception as e:
             logger.warning(e)
             return wireless_html_code
+
+    def batch_predict(self, table_res_list: List[Dict], batch_size: int = 4) -> None:
+        """
+        批量预测有线表格，结果写入table_res['html']，无返回值。
+        预处理后尺寸相同的表格按batch堆叠执行TSRUnet推理（尺寸不同的表格逐个推理，结果与predict一致），线段/单元格后处理在线程池中并行执行，
+        所有表格的空白单元格截图合并为一次OCR识别后再分发回各表格。
+        与predict相同，单个表格失败时使用无线表格的结果，不影响其他表格。
+        """
+        table_res_list = [table_res for table_res in table_res_list if table_res.get("ocr_result")]
+        if not table_res_list:
+            return
+
+        wired_model = self.wired_table_model
+        with tqdm(total=len(table_res_list), desc="Table-wired Predict") as pbar:
+            imgs = [wired_model.load_img(np.asarray(table_res["wired_table_img"])) for table_res in table_res_list]
+            preds = wired_model.table_structure.batch_infer(imgs, batch_size=batch_size)
+
+            def recover_table(index):
+                """
+                返回None时与predict中结构识别抛出异常的情况一致，直接使用无线表格的结果；
+                返回{"wired_html": ""}时与有线表格识别结果为空的情况一致。
+                """
+                if preds[index] is None:
+                    return None
+                try:
+                    polygons, rotated_polygons = wired_model.table_structure.get_polygons(imgs[index], preds[index])
+                except Exception as e:
+                    logger.warning(e)
+                    return None
+                if polygons is None:
+                    return {"wired_html": ""}
+                try:
+                    polygons, logi_points = wired_model.recover_logic_points(polygons, rotated_polygons)
+                    cell_box_det_map, _ = match_ocr_cell(table_res_list[index]["ocr_result"], polygons)
+                    img_crop_list, img_crop_info_list = wired_model.get_blank_cell_crops(
+                        imgs[index], polygons, cell_box_det_map
+                    )
+                except Exception:
+                    logging.warning(traceback.format_exc())
+                    return {"wired_html": ""}
+                return {
+                    "polygons": polygons,
+                    "logi_points": logi_points,
+                    "cell_box_det_map": cell_box_det_map,
+                    "img_crop_list": img_crop_list,
+                    "img_crop_info_list": img_crop_info_list,
+                }
+
+            max_workers = max(1, min(WIRED_TABLE_POSTPROCESS_WORKERS, len(table_res_list)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                recovered_tables = list(executor.map(recover_table, range(len(table_res_list))))
+
+            # 所有表格的空白单元格截图合并为一次识别，失败时回退为逐个表格识别
+            all_crop_list = []
+            for recovered in recovered_tables:
+                if recovered is not None and "wired_html" not in recovered:
+                    all_crop_list.extend(recovered["img_crop_list"])
+            all_ocr_res_list = None
+            pooled_rec_failed = False
+            if all_crop_list:
+                try:
+                    all_ocr_res_list = check_blank_rec_result(
+                        self.ocr_engine.ocr(all_crop_list, det=False), len(all_crop_list)
+                    )
+                except Exception:
+                    logging.warning(traceback.format_exc())
+                    pooled_rec_failed = True
+
+            crop_offset = 0
+            for table_res, recovered in zip(table_res_list, recovered_tables):
+                wireless_html_code = table_res["table_res"].get("html", None)
+                html_code = wireless_html_code
+                try:
+                    if recovered is not None:
+                        wired_html_code = recovered.get("wired_html")
+                        if wired_html_code is None:
+                            wired_html_code = self._build_wired_html(
+                                recovered, all_ocr_res_list, crop_offset, pooled_rec_failed
+                            )
+                            crop_offset += len(recovered["img_crop_list"])
+                        html_code = self.select_html(wired_html_code, wireless_html_code, table_res["ocr_result"])
+                except Exception as e:
+                    logger.warning(e)
+                    html_code = wireless_html_code
+                table_res["table_res"]["html"] = html_code
+                pbar.update(1)
+
+    def _build_wired_html(self, recovered, all_ocr_res_list, crop_offset, pooled_rec_failed):
+        """用合并识别的结果填充单个表格的空白单元格并生成html，失败时返回空html"""
+        wired_model = self.wired_table_model
+        polygons = recovered["polygons"]
+        cell_box_det_map = recovered["cell_box_det_map"]
+        img_crop_list = recovered["img_crop_list"]
+        try:
+            if img_crop_list:
+                if pooled_rec_failed:
+                    ocr_res_list = check_blank_rec_result(
+                        self.ocr_engine.ocr(img_crop_list, det=False), len(img_crop_list)
+                    )
+                elif all_ocr_res_list is not None:
+                    ocr_res_list = all_ocr_res_list[crop_offset:crop_offset + len(img_crop_list)]
+                else:
+                    ocr_res_list = None
+                if ocr_res_list is not None:
+                    wired_model.fill_blank_rec_result(
+                        polygons, cell_box_det_map, recovered["img_crop_info_list"], ocr_res_list
+                    )
+            return wired_model.build_output(
+                polygons, recovered["logi_points"], cell_box_det_map, time.perf_counter()
+            ).pred_html
+        except Exception:
+            logging.warning(traceback.format_exc())
+            return ""
+
+    @staticmethod
+    def select_html(wired_html_code, wireless_html_code, ocr_result):
+        """比较有线表格和无线表格的结果，选择更合理的html"""
+        wired_len = count_table_cells_physical(wired_html_code)
+        wireless_len = count_table_cells_physical(wireless_html_code)
+        # 计算两种模型检测的单元格数量差异
+        gap_of_len = wireless_len - wired_len
+        # logger.debug(f"wired table cell bboxes: {wired_len}, wireless table cell bboxes: {wireless_len}")
+
+        # 使用OCR结果计算两种模型填入的文字数量
+        wireless_text_count = 0
+        wired_text_count = 0
+        for ocr_res in ocr_result:
+            if ocr_res[1] in wireless_html_code:
+                wireless_text_count += 1
+            if ocr_res[1] in wired_html_code:
+                wired_text_count += 1
+        # logger.debug(f"wireless table ocr text count: {wireless_text_count}, wired table ocr text count: {wired_text_count}")
+
+        # 使用HTML解析器计算空单元格数量
+        wireless_soup = BeautifulSoup(wireless_html_code, 'html.parser') if wireless_html_code else BeautifulSoup("", 'html.parser')
+        wired_soup = BeautifulSoup(wired_html_code, 'html.parser') if wired_html_code else BeautifulSoup("", 'html.parser')
+        # 计算空单元格数量(没有文本内容或只有空白字符)
+        wireless_blank_count = sum(1 for cell in wireless_soup.find_all(['td', 'th']) if not cell.text.strip())
+        wired_blank_count = sum(1 for cell in wired_soup.find_all(['td', 'th']) if not cell.text.strip())
+        # logger.debug(f"wireless table blank cell count: {wireless_blank_count}, wired table blank cell count: {wired_blank_count}")
+
+        # 计算非空单元格数量
+        wireless_non_blank_count = wireless_len - wireless_blank_count
+        wired_non_blank_count = wired_len - wired_blank_count
+        # 无线表非空格数量大于有线表非空格数量时，才考虑切换
+        switch_flag = False
+        if wireless_non_blank_count > wired_non_blank_count:
+            # 假设非空表格是接近正方表，使用非空单元格数量开平方作为表格规模的估计
+            wired_table_scale = round(wired_non_blank_count ** 0.5)
+            # logger.debug(f"wireless non-blank cell count: {wireless_non_blank_count}, wired non-blank cell count: {wired_non_blank_count}, wired table scale: {wired_table_scale}")
+            # 如果无线表非空格的数量比有线表多一列或以上，需要切换到无线表
+            wired_scale_plus_2_cols = wired_non_blank_count + (wired_table_scale * 2)
+            wired_scale_squared_plus_2_rows = wired_table_scale * (wired_table_scale + 2)
+            if (wireless_non_blank_count + 3) >= max(wired_scale_plus_2_cols, wired_scale_squared_plus_2_rows):
+                switch_flag = True
+
+        # 判断是否使用无线表格模型的结果
+        if (
+            switch_flag
+            or (0 <= gap_of_len <= 5 and wired_len <= round(wireless_len * 0.75))  # 两者相差不大但有线模型结果较少
+            or (gap_of_len == 0 and wired_len <= 4)  # 单元格数量完全相等且总量小于等于4
+            or (wired_text_count <= wireless_text_count * 0.6 and  wireless_text_count >=10) # 有线模型填入的文字明显少于无线模型
+        ):
+            # logger.debug("fall back to wireless table model")
+            html_code = wireless_html_code
+        else:
+            html_code = wired_html_code
+
+        return html_code
+
@@ -1,9 +1,10 @@
 import copy
 import math
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, List
 
 import cv2
 import numpy as np
+from loguru import logger
 from skimage import measure
 
 from mineru.utils.os_env_config import get_op_num_threads
@@ -34,12 +35,55 @@ class TSRUnet:
         config["inter_op_num_threads"] = get_op_num_threads("MINERU_INTER_OP_NUM_THREADS")
 
         self.session = OrtInferSession(config)
+        self.batch_infer_enable = True
 
     def __call__(
         self, img: np.ndarray, **kwargs
     ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
         img_info = self.preprocess(img)
         pred = self.infer(img_info)
+        return self.get_polygons(img, pred, **kwargs)
+
+    def batch_infer(self, imgs: List[np.ndarray], batch_size: int = 4) -> List[Optional[np.ndarray]]:
+        """
+        批量推理多张表格图片，返回与imgs一一对应的pred，推理失败的图片对应None。
+        只有预处理后尺寸完全相同的图片才组成一个batch：padding后的边缘与单张推理时卷积的零填充不同，
+        贴着裁剪边缘的右侧/下方表格线可能得到不同的分割结果。尺寸不同的图片和模型不支持batch推理时逐张推理。
+        """
+        img_infos = [self.preprocess(img)["img"] for img in imgs]
+        preds = [None] * len(imgs)
+        shape_groups = {}
+        for index, img_info in enumerate(img_infos):
+            shape_groups.setdefault(img_info.shape, []).append(index)
+        for group_indexes in shape_groups.values():
+            for start in range(0, len(group_indexes), batch_size):
+                batch_indexes = group_indexes[start:start + batch_size]
+                if self.batch_infer_enable and len(batch_indexes) > 1:
+                    try:
+                        batch_preds = self._infer_batch([img_infos[i] for i in batch_indexes])
+                        for index, pred in zip(batch_indexes, batch_preds):
+                            preds[index] = pred
+                        continue
+                    except Exception as e:
+                        logger.warning(f"Batched table structure inference failed, fall back to single image inference: {e}")
+                        self.batch_infer_enable = False
+                for index in batch_indexes:
+                    try:
+                        preds[index] = self.infer({"img": img_infos[index]})
+                    except Exception as e:
+                        logger.warning(f"Table structure inference failed: {e}")
+        return preds
+
+    def _infer_batch(self, batch_imgs: List[np.ndarray]) -> List[np.ndarray]:
+        """batch_imgs的尺寸完全相同，直接堆叠推理，不需要padding"""
+        batch = np.concatenate(batch_imgs, axis=0)
+        result = self.session([batch])[0]
+        return [result[i][0].astype(np.uint8) for i in range(len(batch_imgs))]
+
+    def get_polygons(
+        self, img: np.ndarray, pred: np.ndarray, **kwargs
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """由分割结果得到单元格多边形和旋转修正后的多边形，均按阅读顺序排序"""
         polygons, rotated_polygons = self.postprocess(img, pred, **kwargs)
         if polygons.size == 0:
             return None, None
@@ -3,6 +3,7 @@ import cv2
 import numpy as np
 import math
 import time
+from concurrent.futures import ThreadPoolExecutor
 import torch
 from tqdm import tqdm
 
@@ -18,6 +19,7 @@ class TextRecognizer(BaseOCRV20):
         self.rec_image_shape = [int(v) for v in args.rec_image_shape.split(",")]
         self.character_type = args.rec_char_type
         self.rec_batch_num = args.rec_batch_num
+        self.rec_batch_budget = getattr(args, 'rec_batch_budget', 0)
         self.rec_algorithm = args.rec_algorithm
         self.max_text_length = args.max_text_length
         postprocess_params = {
@@ -287,6 +289,113 @@ class TextRecognizer(BaseOCRV20):
 
         return img
 
+    def get_padded_wh_ratio(self, max_wh_ratio):
+        """resize_norm_img中batch填充后的宽高比"""
+        _, imgH, imgW = self.rec_image_shape
+        max_wh_ratio = max(max_wh_ratio, imgW / imgH)
+        imgW = int(imgH * max_wh_ratio)
+        imgW = max(min(imgW, self.limited_max_width), self.limited_min_width)
+        return imgW / imgH
+
+    def split_batches(self, width_list, indices):
+        """
+        按宽高比升序划分batch，返回[(beg, end), ...]
+        rec_batch_budget > 0时按宽度预算组batch：batch内crop数 × 填充后宽高比 不超过预算，
+        否则使用固定的rec_batch_num
+        """
+        img_num = len(indices)
+        if self.rec_batch_budget <= 0 or self.rec_algorithm not in ['CRNN', 'SVTR_LCNet']:
+            return [(beg, min(img_num, beg + self.rec_batch_num)) for beg in range(0, img_num, self.rec_batch_num)]
+
+        batches = []
+        beg = 0
+        for end in range(1, img_num + 1):
+            # 已按宽高比升序排列，新加入的crop决定batch的填充宽度
+            padded_wh_ratio = self.get_padded_wh_ratio(width_list[indices[end - 1]])
+            if end - beg > 1 and (end - beg) * padded_wh_ratio > self.rec_batch_budget:
+                batches.append((beg, end - 1))
+                beg = end - 1
+        if beg < img_num:
+            batches.append((beg, img_num))
+        return batches
+
+    def preprocess_batch(self, img_list, indices, width_list, beg_img_no, end_img_no):
+        """对一个batch做resize/normalize，返回模型输入需要的numpy数组"""
+        norm_img_batch = []
+        extra_inputs = {}
+        max_wh_ratio = width_list[indices[end_img_no - 1]]
+        for ino in range(beg_img_no, end_img_no):
+            if self.rec_algorithm == "SAR":
+                norm_img, _, _, valid_ratio = self.resize_norm_img_sar(
+                    img_list[indices[ino]], self.rec_image_shape)
+                norm_img = norm_img[np.newaxis, :]
+                norm_img_batch.append(norm_img)
+            elif self.rec_algorithm == "SVTR":
+                norm_img = self.resize_norm_img_svtr(img_list[indices[ino]],
+                                                     self.rec_image_shape)
+                norm_img = norm_img[np.newaxis, :]
+                norm_img_batch.append(norm_img)
+            elif self.rec_algorithm == "SRN":
+                norm_img = self.process_image_srn(img_list[indices[ino]],
+                                                  self.rec_image_shape, 8,
+                                                  self.max_text_length)
+                extra_inputs.setdefault('encoder_word_pos', []).append(norm_img[1])
+                extra_inputs.setdefault('gsrm_word_pos', []).append(norm_img[2])
+                extra_inputs.setdefault('gsrm_slf_attn_bias1', []).append(norm_img[3])
+                extra_inputs.setdefault('gsrm_slf_attn_bias2', []).append(norm_img[4])
+                norm_img_batch.append(norm_img[0])
+            elif self.rec_algorithm == "CAN":
+                norm_img = self.norm_img_can(img_list[indices[ino]],
+                                             max_wh_ratio)
+                norm_img = norm_img[np.newaxis, :]
+                norm_img_batch.append(norm_img)
+                extra_inputs.setdefault('norm_img_mask', []).append(np.ones(norm_img.shape, dtype='float32'))
+                extra_inputs.setdefault('word_label', []).append(np.ones([1, 36], dtype='int64'))
+            else:
+                norm_img = self.resize_norm_img(img_list[indices[ino]],
+                                                max_wh_ratio)
+                norm_img = norm_img[np.newaxis, :]
+                norm_img_batch.append(norm_img)
+        norm_img_batch = np.concatenate(norm_img_batch)
+        norm_img_batch = norm_img_batch.copy()
+        extra_inputs = {k: np.concatenate(v) for k, v in extra_inputs.items()}
+        return norm_img_batch, extra_inputs
+
+    def infer_batch(self, norm_img_batch, extra_inputs):
+        if self.rec_algorithm == "SRN":
+            with torch.no_grad():
+                inp = torch.from_numpy(norm_img_batch).to(self.device)
+                encoder_word_pos_inp = torch.from_numpy(extra_inputs['encoder_word_pos']).to(self.device)
+                gsrm_word_pos_inp = torch.from_numpy(extra_inputs['gsrm_word_pos']).to(self.device)
+                gsrm_slf_attn_bias1_inp = torch.from_numpy(extra_inputs['gsrm_slf_attn_bias1']).to(self.device)
+                gsrm_slf_attn_bias2_inp = torch.from_numpy(extra_inputs['gsrm_slf_attn_bias2']).to(self.device)
+
+                backbone_out = self.net.backbone(inp) # backbone_feat
+                prob_out = self.net.head(backbone_out, [encoder_word_pos_inp, gsrm_word_pos_inp, gsrm_slf_attn_bias1_inp, gsrm_slf_attn_bias2_inp])
+            # preds = {"predict": prob_out[2]}
+            preds = {"predict": prob_out["predict"]}
+
+        elif self.rec_algorithm == "CAN":
+            inputs = [norm_img_batch, extra_inputs['norm_img_mask'], extra_inputs['word_label']]
+
+            inp = [torch.from_numpy(e_i) for e_i in inputs]
+            inp = [e_i.to(self.device) for e_i in inp]
+            with torch.no_grad():
+                outputs = self.net(inp)
+                outputs = [v.cpu().numpy() for k, v in enumerate(outputs)]
+
+            preds = outputs
+
+        else:
+            with torch.no_grad():
+                inp = torch.from_numpy(norm_img_batch)
+                inp = inp.to(self.device)
+                preds = self.net(inp)
+
+        with torch.no_grad():
+            rec_result = self.postprocess_op(preds)
+        return rec_result
+
     def __call__(self, img_list, tqdm_enable=False, tqdm_desc="OCR-rec Predict"):
         img_num = len(img_list)
         # Calculate the aspect ratio of all text bars
@@ -298,135 +407,30 @@ class TextRecognizer(BaseOCRV20):
 
         # rec_res = []
         rec_res = [['', 0.0]] * img_num
-        batch_num = self.rec_batch_num
+        batches = self.split_batches(width_list, indices)
         elapse = 0
-        # for beg_img_no in range(0, img_num, batch_num):
-        with tqdm(total=img_num, desc=tqdm_desc, disable=not tqdm_enable) as pbar:
-            index = 0
-            for beg_img_no in range(0, img_num, batch_num):
-                end_img_no = min(img_num, beg_img_no + batch_num)
-                norm_img_batch = []
-                max_wh_ratio = width_list[indices[end_img_no - 1]]
-                for ino in range(beg_img_no, end_img_no):
-                    if self.rec_algorithm == "SAR":
-                        norm_img, _, _, valid_ratio = self.resize_norm_img_sar(
-                            img_list[indices[ino]], self.rec_image_shape)
-                        norm_img = norm_img[np.newaxis, :]
-                        valid_ratio = np.expand_dims(valid_ratio, axis=0)
-                        valid_ratios = []
-                        valid_ratios.append(valid_ratio)
-                        norm_img_batch.append(norm_img)
-
-                    elif self.rec_algorithm == "SVTR":
-                        norm_img = self.resize_norm_img_svtr(img_list[indices[ino]],
-                                                             self.rec_image_shape)
-                        norm_img = norm_img[np.newaxis, :]
-                        norm_img_batch.append(norm_img)
-                    elif self.rec_algorithm == "SRN":
-                        norm_img = self.process_image_srn(img_list[indices[ino]],
-                                                          self.rec_image_shape, 8,
-                                                          self.max_text_length)
-                        encoder_word_pos_list = []
-                        gsrm_word_pos_list = []
-                        gsrm_slf_attn_bias1_list = []
-                        gsrm_slf_attn_bias2_list = []
-                        encoder_word_pos_list.append(norm_img[1])
-                        gsrm_word_pos_list.append(norm_img[2])
-                        gsrm_slf_attn_bias1_list.append(norm_img[3])
-                        gsrm_slf_attn_bias2_list.append(norm_img[4])
-                        norm_img_batch.append(norm_img[0])
-                    elif self.rec_algorithm == "CAN":
-                        norm_img = self.norm_img_can(img_list[indices[ino]],
-                                                     max_wh_ratio)
-                        norm_img = norm_img[np.newaxis, :]
-                        norm_img_batch.append(norm_img)
-                        norm_image_mask = np.ones(norm_img.shape, dtype='float32')
-                        word_label = np.ones([1, 36], dtype='int64')
-                        norm_img_mask_batch = []
-                        word_label_list = []
-                        norm_img_mask_batch.append(norm_image_mask)
-                        word_label_list.append(word_label)
-                    else:
-                        norm_img = self.resize_norm_img(img_list[indices[ino]],
-                                                        max_wh_ratio)
-                        norm_img = norm_img[np.newaxis, :]
-                        norm_img_batch.append(norm_img)
-                norm_img_batch = np.concatenate(norm_img_batch)
-                norm_img_batch = norm_img_batch.copy()
-
-                if self.rec_algorithm == "SRN":
-                    starttime = time.time()
-                    encoder_word_pos_list = np.concatenate(encoder_word_pos_list)
-                    gsrm_word_pos_list = np.concatenate(gsrm_word_pos_list)
-                    gsrm_slf_attn_bias1_list = np.concatenate(
-                        gsrm_slf_attn_bias1_list)
-                    gsrm_slf_attn_bias2_list = np.concatenate(
-                        gsrm_slf_attn_bias2_list)
-
-                    with torch.no_grad():
-                        inp = torch.from_numpy(norm_img_batch)
-                        encoder_word_pos_inp = torch.from_numpy(encoder_word_pos_list)
-                        gsrm_word_pos_inp = torch.from_numpy(gsrm_word_pos_list)
-                        gsrm_slf_attn_bias1_inp = torch.from_numpy(gsrm_slf_attn_bias1_list)
-                        gsrm_slf_attn_bias2_inp = torch.from_numpy(gsrm_slf_attn_bias2_list)
-
-                        inp = inp.to(self.device)
-                        encoder_word_pos_inp = encoder_word_pos_inp.to(self.device)
-                        gsrm_word_pos_inp = gsrm_word_pos_inp.to(self.device)
-                        gsrm_slf_attn_bias1_inp = gsrm_slf_attn_bias1_inp.to(self.device)
-                        gsrm_slf_attn_bias2_inp = gsrm_slf_attn_bias2_inp.to(self.device)
-
-                        backbone_out = self.net.backbone(inp) # backbone_feat
-                        prob_out = self.net.head(backbone_out, [encoder_word_pos_inp, gsrm_word_pos_inp, gsrm_slf_attn_bias1_inp, gsrm_slf_attn_bias2_inp])
-                    # preds = {"predict": prob_out[2]}
-                    preds = {"predict": prob_out["predict"]}
-
-                elif self.rec_algorithm == "SAR":
-                    starttime = time.time()
-                    # valid_ratios = np.concatenate(valid_ratios)
-                    # inputs = [
-                    #     norm_img_batch,
-                    #     valid_ratios,
-                    # ]
-
-                    with torch.no_grad():
-                        inp = torch.from_numpy(norm_img_batch)
-                        inp = inp.to(self.device)
-                        preds = self.net(inp)
-
-                elif self.rec_algorithm == "CAN":
-                    starttime = time.time()
-                    norm_img_mask_batch = np.concatenate(norm_img_mask_batch)
-                    word_label_list = np.concatenate(word_label_list)
-                    inputs = [norm_img_batch, norm_img_mask_batch, word_label_list]
-
-                    inp = [torch.from_numpy(e_i) for e_i in inputs]
-                    inp = [e_i.to(self.device) for e_i in inp]
-                    with torch.no_grad():
-                        outputs = self.net(inp)
-                        outputs = [v.cpu().numpy() for k, v in enumerate(outputs)]
-
-                    preds = outputs
-
+        with tqdm(total=img_num, desc=tqdm_desc, disable=not tqdm_enable) as pbar, \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            # 在后台线程预处理下一个batch，与当前batch的模型推理重叠
+            next_future = None
+            for batch_idx, (beg_img_no, end_img_no) in enumerate(batches):
+                if next_future is None:
+                    norm_img_batch, extra_inputs = self.preprocess_batch(
+                        img_list, indices, width_list, beg_img_no, end_img_no)
                 else:
-                    starttime = time.time()
-
-                    with torch.no_grad():
-                        inp = torch.from_numpy(norm_img_batch)
-                        inp = inp.to(self.device)
-                        preds = self.net(inp)
+                    norm_img_batch, extra_inputs = next_future.result()
+                if batch_idx + 1 < len(batches):
+                    next_future = executor.submit(
+                        self.preprocess_batch, img_list, indices, width_list, *batches[batch_idx + 1])
 
-                with torch.no_grad():
-                    rec_result = self.postprocess_op(preds)
+                starttime = time.time()
+                rec_result = self.infer_batch(norm_img_batch, extra_inputs)
 
                 for rno in range(len(rec_result)):
                     rec_res[indices[beg_img_no + rno]] = rec_result[rno]
                 elapse += time.time() - starttime
 
-                # 更新进度条，每次增加batch_size，但要注意最后一个batch可能不足batch_size
-                current_batch_size = min(batch_num, img_num - index * batch_num)
-                index += 1
-                pbar.update(current_batch_size)
+                pbar.update(end_img_no - beg_img_no)
 
         # Fix NaN values in recognition results
         for i in range(len(rec_res)):
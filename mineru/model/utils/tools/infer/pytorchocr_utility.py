@@ -72,6 +72,7 @@ def init_args():
     parser.add_argument("--rec_image_shape", type=str, default="3, 48, 320")
     parser.add_argument("--rec_char_type", type=str, default='ch')
     parser.add_argument("--rec_batch_num", type=int, default=6)
+    parser.add_argument("--rec_batch_budget", type=int, default=0)
     parser.add_argument("--max_text_length", type=int, default=25)
 
     parser.add_argument("--use_space_char", type=str2bool, default=True)
@@ -2,6 +2,7 @@
 import copy
 import os
 import statistics
+import threading
 import warnings
 from typing import List
 import torch
@@ -10,31 +11,52 @@ from loguru import logger
 from mineru.utils.config_reader import get_device
 from mineru.utils.enum_class import BlockType, ModelPath
 from mineru.utils.models_download_utils import auto_download_and_get_model_root_path
+from mineru.utils.model_registry import track_model_load
+
+# layoutreader单次前向推理的最大页数，每页最多200行，按行数排序后分批以减少padding
+LAYOUTREADER_BATCH_SIZE = 32
 
 
 def sort_blocks_by_bbox(blocks, page_w, page_h, footnote_blocks):
+    return batch_sort_blocks_by_bbox([(blocks, page_w, page_h, footnote_blocks)])[0]
+
 
-    """获取所有line并计算正文line的高度"""
-    line_height = get_line_height(blocks)
+def batch_sort_blocks_by_bbox(page_list):
+    """
+    对多页的block同时排序，page_list中每一项为(blocks, page_w, page_h, footnote_blocks)，
+    所有页面的line汇总后由layoutreader按批次推理，返回每页排序后的blocks。
+    """
+    page_lines_list = []
+    for blocks, page_w, page_h, footnote_blocks in page_list:
+        """获取所有line并计算正文line的高度"""
+        line_height = get_line_height(blocks)
 
-    """获取所有line并对line排序"""
-    sorted_bboxes = sort_lines_by_model(blocks, page_w, page_h, line_height, footnote_blocks)
+        """获取所有line"""
+        page_line_list = collect_page_lines(blocks, page_w, page_h, line_height, footnote_blocks)
+        page_lines_list.append((page_line_list, page_w, page_h))
 
-    """根据line的中位数算block的序列关系"""
-    blocks = cal_block_index(blocks, sorted_bboxes)
+    """对所有页面的line批量排序"""
+    sorted_bboxes_list = batch_sort_lines_by_model(page_lines_list)
 
-    """将image和table的block还原回group形式参与后续流程"""
-    blocks = revert_group_blocks(blocks)
+    sorted_blocks_list = []
+    for (blocks, _, _, _), sorted_bboxes in zip(page_list, sorted_bboxes_list):
+        """根据line的中位数算block的序列关系"""
+        blocks = cal_block_index(blocks, sorted_bboxes)
 
-    """重排block"""
-    sorted_blocks = sorted(blocks, key=lambda b: b['index'])
+        """将image和table的block还原回group形式参与后续流程"""
+        blocks = revert_group_blocks(blocks)
 
-    """block内重排(img和table的block内多个caption或footnote的排序)"""
-    for block in sorted_blocks:
-        if block['type'] in [BlockType.IMAGE, BlockType.TABLE]:
-            block['blocks'] = sorted(block['blocks'], key=lambda b: b['index'])
+        """重排block"""
+        sorted_blocks = sorted(blocks, key=lambda b: b['index'])
+
+        """block内重排(img和table的block内多个caption或footnote的排序)"""
+        for block in sorted_blocks:
+            if block['type'] in [BlockType.IMAGE, BlockType.TABLE]:
+                block['blocks'] = sorted(block['blocks'], key=lambda b: b['index'])
 
-    return sorted_blocks
+        sorted_blocks_list.append(sorted_blocks)
+
+    return sorted_blocks_list
 
 
 def get_line_height(blocks):
@@ -55,6 +77,12 @@ def get_line_height(blocks):
 
 
 def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, footnote_blocks):
+    page_line_list = collect_page_lines(fix_blocks, page_w, page_h, line_height, footnote_blocks)
+    return batch_sort_lines_by_model([(page_line_list, page_w, page_h)])[0]
+
+
+def collect_page_lines(fix_blocks, page_w, page_h, line_height, footnote_blocks):
+    """收集页面中所有参与排序的line，没有line的block按行高切分出虚拟line"""
     page_line_list = []
 
     def add_lines_to_block(b):
@@ -87,10 +115,43 @@ def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, footnote_blocks
         footnote_block = {'bbox': block[:4]}
         add_lines_to_block(footnote_block)
 
-    if len(page_line_list) > 200:  # layoutreader最高支持512line
-        return None
+    return page_line_list
+
+
+def batch_sort_lines_by_model(page_lines_list):
+    """
+    page_lines_list中每一项为(page_line_list, page_w, page_h)，返回每页排序后的line bbox列表，
+    line数量超过200的页面返回None，由cal_block_index回退到xycut排序。
+    """
+    sorted_bboxes_list = [None] * len(page_lines_list)
+    predict_indexes = []
+    boxes_list = []
+    for index, (page_line_list, page_w, page_h) in enumerate(page_lines_list):
+        if len(page_line_list) > 200:  # layoutreader最高支持512line
+            continue
+        if len(page_line_list) == 0:
+            sorted_bboxes_list[index] = []
+            continue
+        predict_indexes.append(index)
+        boxes_list.append(scale_page_lines(page_line_list, page_w, page_h))
+
+    if len(boxes_list) == 0:
+        return sorted_bboxes_list
 
     # 使用layoutreader排序
+    model_manager = ModelSingleton()
+    model = model_manager.get_model('layoutreader')
+    with torch.no_grad():
+        orders_list = do_predict_batch(boxes_list, model)
+    for index, orders in zip(predict_indexes, orders_list):
+        page_line_list = page_lines_list[index][0]
+        sorted_bboxes_list[index] = [page_line_list[i] for i in orders]
+
+    return sorted_bboxes_list
+
+
+def scale_page_lines(page_line_list, page_w, page_h):
+    """将line bbox裁剪到页面范围内并缩放到layoutreader使用的0-1000坐标系"""
     x_scale = 1000.0 / page_w
     y_scale = 1000.0 / page_h
     boxes = []
@@ -125,13 +186,8 @@ def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, footnote_blocks
             1000 >= right >= left >= 0 and 1000 >= bottom >= top >= 0
         ), f'Invalid box. right: {right}, left: {left}, bottom: {bottom}, top: {top}'  # noqa: E126, E121
         boxes.append([left, top, right, bottom])
-    model_manager = ModelSingleton()
-    model = model_manager.get_model('layoutreader')
-    with torch.no_grad():
-        orders = do_predict(boxes, model)
-    sorted_bboxes = [page_line_list[i] for i in orders]
 
-    return sorted_bboxes
+    return boxes
 
 
 def insert_lines_into_block(block_bbox, line_height, page_w, page_h):
@@ -214,6 +270,7 @@ def model_init(model_name: str):
 class ModelSingleton:
     _instance = None
     _models = {}
+    _lock = threading.RLock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -221,8 +278,10 @@ class ModelSingleton:
         return cls._instance
 
     def get_model(self, model_name: str):
-        if model_name not in self._models:
-            self._models[model_name] = model_init(model_name=model_name)
+        with self._lock:
+            if model_name not in self._models:
+                with track_model_load(model_name, get_device()):
+                    self._models[model_name] = model_init(model_name=model_name)
         return self._models[model_name]
 
 
@@ -239,17 +298,45 @@ def do_predict(boxes: List[List[int]], model) -> List[int]:
     return parse_logits(logits, len(boxes))
 
 
+def do_predict_batch(boxes_list: List[List[List[int]]], model, batch_size=LAYOUTREADER_BATCH_SIZE) -> List[List[int]]:
+    """多页line一起推理，使用DataCollator将同一批次的页面padding到相同长度，每批只做一次前向推理"""
+    from mineru.model.reading_order.layout_reader import (
+        DataCollator, parse_logits, prepare_inputs)
+
+    data_collator = DataCollator()
+    orders_list = [None] * len(boxes_list)
+    # 行数相近的页面放在同一批次，减少padding带来的无效计算
+    sorted_indexes = sorted(range(len(boxes_list)), key=lambda i: len(boxes_list[i]))
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=FutureWarning, module="transformers")
+
+        for start in range(0, len(sorted_indexes), batch_size):
+            batch_indexes = sorted_indexes[start:start + batch_size]
+            features = [
+                {'source_boxes': boxes_list[i], 'target_index': [0] * len(boxes_list[i])}
+                for i in batch_indexes
+            ]
+            inputs = data_collator(features)
+            inputs.pop('labels')
+            inputs = prepare_inputs(inputs, model)
+            logits = model(**inputs).logits.cpu()
+            for row, index in enumerate(batch_indexes):
+                orders_list[index] = parse_logits(logits[row], len(boxes_list[index]))
+    return orders_list
+
+
 def cal_block_index(fix_blocks, sorted_bboxes):
 
     if sorted_bboxes is not None:
         # 使用layoutreader排序
+        bbox_index_map = build_bbox_index_map(sorted_bboxes)
         for block in fix_blocks:
             line_index_list = []
             if len(block['lines']) == 0:
-                block['index'] = sorted_bboxes.index(block['bbox'])
+                block['index'] = bbox_index_map[tuple(block['bbox'])]
             else:
                 for line in block['lines']:
-                    line['index'] = sorted_bboxes.index(line['bbox'])
+                    line['index'] = bbox_index_map[tuple(line['bbox'])]
                     line_index_list.append(line['index'])
                 median_value = statistics.median(line_index_list)
                 block['index'] = median_value
@@ -285,8 +372,9 @@ def cal_block_index(fix_blocks, sorted_bboxes):
         assert len(res) == len(block_bboxes)
         sorted_boxes = random_boxes[np.array(res)].tolist()
 
+        bbox_index_map = build_bbox_index_map(sorted_boxes)
         for i, block in enumerate(fix_blocks):
-            block['index'] = sorted_boxes.index(block['bbox'])
+            block['index'] = bbox_index_map[tuple(block['bbox'])]
 
         # 生成line index
         sorted_blocks = sorted(fix_blocks, key=lambda b: b['index'])
@@ -299,6 +387,14 @@ def cal_block_index(fix_blocks, sorted_bboxes):
     return fix_blocks
 
 
+def build_bbox_index_map(sorted_bboxes):
+    """bbox到其在排序结果中位置的映射，重复的bbox取第一次出现的位置，与list.index的结果一致"""
+    bbox_index_map = {}
+    for index, bbox in enumerate(sorted_bboxes):
+        bbox_index_map.setdefault(tuple(bbox), index)
+    return bbox_index_map
+
+
 def revert_group_blocks(blocks):
     image_groups = {}
     table_groups = {}
@@ -1,4 +1,7 @@
 import math
+import statistics
+
+import numpy as np
 
 
 def is_in(box1, box2) -> bool:
@@ -200,4 +203,136 @@ def calculate_vertical_projection_overlap_ratio(block1, block2):
 
     # Proportion of the x-axis covered by the intersection
     # logger.info(f"intersection_length: {intersection_length}, block1_length: {block1_length}")
-    return intersection_length / block1_length
\ No newline at end of file
+    return intersection_length / block1_length
+
+
+
+def bboxes_to_array(bboxes):
+    """将bbox列表转换为Nx4数组，整数坐标转换为float64(在2**53以内与python整数运算结果一致)"""
+    array = np.asarray(bboxes)
+    if array.size == 0:
+        return np.zeros((0, 4), dtype=np.float64)
+    array = array.reshape(-1, array.shape[-1])[:, 0:4]
+    if not np.issubdtype(array.dtype, np.floating):
+        array = array.astype(np.float64)
+    return array
+
+
+def batch_calculate_intersection(bboxes1, bboxes2):
+    """
+    计算两组bbox两两之间的交集，返回(intersection_area, is_valid)两个NxM矩阵。
+    is_valid 与标量函数中的 not (x_right < x_left or y_bottom < y_top) 一致，边界相接时有效但面积为0。
+    """
+    bboxes1 = bboxes_to_array(bboxes1)
+    bboxes2 = bboxes_to_array(bboxes2)
+    x_left = np.maximum(bboxes1[:, None, 0], bboxes2[None, :, 0])
+    y_top = np.maximum(bboxes1[:, None, 1], bboxes2[None, :, 1])
+    x_right = np.minimum(bboxes1[:, None, 2], bboxes2[None, :, 2])
+    y_bottom = np.minimum(bboxes1[:, None, 3], bboxes2[None, :, 3])
+    is_valid = ~((x_right < x_left) | (y_bottom < y_top))
+    intersection_area = np.where(is_valid, (x_right - x_left) * (y_bottom - y_top), 0)
+    return intersection_area, is_valid
+
+
+def batch_calculate_area(bboxes):
+    bboxes = bboxes_to_array(bboxes)
+    return (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+
+
+def _safe_divide(numerator, denominator):
+    result = np.zeros(np.broadcast(numerator, denominator).shape, dtype=np.float64)
+    np.divide(numerator, denominator, out=result, where=np.broadcast_to(denominator != 0, result.shape))
+    return result
+
+
+def batch_calculate_iou(bboxes1, bboxes2):
+    """calculate_iou的批量版本，输入Nx4和Mx4的bbox，返回NxM的IOU矩阵，结果与逐对计算逐位一致"""
+    intersection_area, is_valid = batch_calculate_intersection(bboxes1, bboxes2)
+    bbox1_area = batch_calculate_area(bboxes1)[:, None]
+    bbox2_area = batch_calculate_area(bboxes2)[None, :]
+    union_area = bbox1_area + bbox2_area - intersection_area
+    iou = _safe_divide(intersection_area, union_area)
+    iou[~is_valid | (bbox1_area == 0) | (bbox2_area == 0)] = 0
+    return iou
+
+
+def batch_calculate_overlap_area_in_bbox1_area_ratio(bboxes1, bboxes2):
+    """calculate_overlap_area_in_bbox1_area_ratio的批量版本，返回NxM矩阵，[i, j]为重叠面积占bboxes1[i]面积的比例"""
+    intersection_area, is_valid = batch_calculate_intersection(bboxes1, bboxes2)
+    bbox1_area = batch_calculate_area(bboxes1)[:, None]
+    ratio = _safe_divide(intersection_area, bbox1_area)
+    ratio[~is_valid] = 0
+    return ratio
+
+
+def batch_calculate_overlap_area_2_minbox_area_ratio(bboxes1, bboxes2):
+    """calculate_overlap_area_2_minbox_area_ratio的批量版本，返回NxM矩阵，[i, j]为重叠面积占两者中较小bbox面积的比例"""
+    intersection_area, is_valid = batch_calculate_intersection(bboxes1, bboxes2)
+    min_box_area = np.minimum(batch_calculate_area(bboxes1)[:, None], batch_calculate_area(bboxes2)[None, :])
+    ratio = _safe_divide(intersection_area, min_box_area)
+    ratio[~is_valid] = 0
+    return ratio
+
+
+class BboxSpatialIndex:
+    """基于均匀网格的bbox空间索引，用于快速查找可能与给定bbox相交的候选bbox，替代两两遍历。
+
+    query返回所有与查询框有交集（包括边界相接）的bbox下标，按下标升序排列。
+    任何与查询框重叠面积大于0的bbox都一定在候选集合中，因此iou、重叠面积比例等基于重叠面积
+    且阈值不小于0的判断，在候选集合上计算与在全部bbox上计算的结果完全一致。
+    """
+
+    # 单个bbox覆盖的网格数超过该值时不再放入网格，每次查询都直接作为候选返回
+    MAX_CELLS_PER_BBOX = 256
+
+    def __init__(self, bboxes, cell_size=None):
+        self.bboxes = [bbox[0:4] for bbox in bboxes]
+        if cell_size is None:
+            cell_w, cell_h = self._default_cell_size(self.bboxes)
+        else:
+            cell_w, cell_h = cell_size
+        self.cell_w = cell_w
+        self.cell_h = cell_h
+        self._grid = {}
+        self._large_indexes = []
+        for index, bbox in enumerate(self.bboxes):
+            cell_range = self._cell_range(bbox)
+            if cell_range is None:
+                self._large_indexes.append(index)
+                continue
+            x_start, y_start, x_end, y_end = cell_range
+            for cell_x in range(x_start, x_end + 1):
+                for cell_y in range(y_start, y_end + 1):
+                    self._grid.setdefault((cell_x, cell_y), []).append(index)
+
+    @staticmethod
+    def _default_cell_size(bboxes):
+        # 网格尺寸取bbox宽高的中位数，span和block通常都是扁长的，宽高分开统计
+        if len(bboxes) == 0:
+            return 1.0, 1.0
+        cell_w = statistics.median([abs(bbox[2] - bbox[0]) for bbox in bboxes])
+        cell_h = statistics.median([abs(bbox[3] - bbox[1]) for bbox in bboxes])
+        return (cell_w if cell_w > 0 else 1.0), (cell_h if cell_h > 0 else 1.0)
+
+    def _cell_range(self, bbox):
+        x0, y0, x1, y1 = bbox
+        x_start, x_end = math.floor(min(x0, x1) / self.cell_w), math.floor(max(x0, x1) / self.cell_w)
+        y_start, y_end = math.floor(min(y0, y1) / self.cell_h), math.floor(max(y0, y1) / self.cell_h)
+        if (x_end - x_start + 1) * (y_end - y_start + 1) > self.MAX_CELLS_PER_BBOX:
+            return None
+        return x_start, y_start, x_end, y_end
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    def query(self, bbox):
+        """返回可能与bbox相交的候选下标（升序），是真实相交集合的超集"""
+        cell_range = self._cell_range(bbox[0:4])
+        if cell_range is None:
+            return list(range(len(self.bboxes)))
+        x_start, y_start, x_end, y_end = cell_range
+        candidates = set(self._large_indexes)
+        for cell_x in range(x_start, x_end + 1):
+            for cell_y in range(y_start, y_end + 1):
+                candidates.update(self._grid.get((cell_x, cell_y), ()))
+        return sorted(candidates)
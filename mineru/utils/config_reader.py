@@ -1,6 +1,8 @@
 # Copyright (c) Opendatalab. All rights reserved.
+import contextvars
 import json
 import os
+from contextlib import contextmanager
 from loguru import logger
 
 try:
@@ -72,7 +74,32 @@ def parse_bucket_key(s3_full_path: str):
     return bucket, key
 
 
+# 多设备并行推理时，每个设备的推理线程通过device_context指定自己的设备和模型副本
+_device_override = contextvars.ContextVar('mineru_device_override', default=None)
+
+
+@contextmanager
+def device_context(device, replica=None):
+    """
+    在当前线程中将get_device()的返回值替换为device，模型单例按(device, replica)区分副本，
+    replica用于在同一设备上创建多个副本（例如在CPU上用多个虚拟设备测试多设备推理）
+    """
+    token = _device_override.set((device, replica))
+    try:
+        yield
+    finally:
+        _device_override.reset(token)
+
+
+def get_model_replica_key():
+    """当前线程的模型副本标识，不在device_context中时为None（使用默认设备的模型）"""
+    return _device_override.get()
+
+
 def get_device():
+    override = _device_override.get()
+    if override is not None:
+        return override[0]
     device_mode = os.getenv('MINERU_DEVICE_MODE', None)
     if device_mode is not None:
         return device_mode
@@ -102,6 +129,14 @@ def get_table_enable(table_enable):
     return table_enable
 
 
+def get_text_layer_spans_enable():
+    return str(os.getenv('MINERU_TEXT_LAYER_SPANS', '0')).lower() in ('1', 'true', 'yes')
+
+
+def get_image_native_input_enable():
+    return str(os.getenv('MINERU_IMAGE_NATIVE_INPUT', '1')).lower() in ('1', 'true', 'yes')
+
+
 def get_latex_delimiter_config():
     config = read_config()
     if config is None:
@@ -0,0 +1,376 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import io
+import math
+import threading
+from contextlib import ExitStack
+
+import pypdfium2 as pdfium
+from loguru import logger
+from PIL import Image
+
+from mineru.utils.enum_class import ImageType
+from mineru.utils.page_buffer import PageBuffer
+from mineru.utils.pdf_image_tools import images_to_pdf_bytes, load_images_from_pdf, share_pdf_bytes
+from mineru.utils.pdf_page_id import get_end_page_id
+from mineru.utils.pdf_reader import image_to_b64str
+from mineru.utils.pdfium_lock import pdfium_lock
+
+# PDF文件头前只允许出现空白字符，最多跳过1024个字节
+PDF_HEADER_SEARCH_SIZE = 1024
+
+
+def is_pdf_bytes(file_bytes):
+    """按文件开头的%PDF文件头判断，图片元数据中出现的%PDF字符串不会被误判为PDF"""
+    return bytes(file_bytes[:PDF_HEADER_SEARCH_SIZE]).lstrip().startswith(b"%PDF")
+
+
+def open_document(file_bytes, start_page_id=0, end_page_id=None):
+    """按文件头打开PDF或图片（PNG/JPG/多帧TIFF等），返回对应的DocumentHandle"""
+    if is_pdf_bytes(file_bytes):
+        return DocumentHandle(file_bytes, start_page_id, end_page_id)
+    return ImageDocument(file_bytes, start_page_id, end_page_id)
+
+
+class DocumentHandle:
+    """
+    持有一次解析得到的pdfium文档，在 do_parse → doc_analyze → result_to_middle_json → _process_output
+    整个流程中共享，避免同一份PDF字节被反复打开和重新保存。
+
+    页码范围[start_page_id, end_page_id]内的页面按0开始的相对下标访问，因此可以直接替代原先裁剪后
+    PDF的pdf_doc使用（len(handle)、handle[index]）。页面尺寸、文本页、渲染图片、裁剪后的PDF字节
+    和pypdf的页面均在首次使用时创建并缓存，请求的是完整页码范围时不会产生任何拷贝。
+
+    所有pdfium调用都持有全局的pdfium_lock，同时需要self._lock时总是先取pdfium_lock，
+    返回的PdfPage/PdfTextPage在调用方使用时同样需要持有pdfium_lock。
+    """
+
+    # 是否有可直接提取的文本层，没有时分类结果固定为ocr
+    has_text_layer = True
+
+    def __init__(self, pdf_bytes, start_page_id=0, end_page_id=None):
+        self.src_pdf_bytes = pdf_bytes
+        self.total_page_count = self._open()
+        self.start_page_id = start_page_id
+        self.end_page_id = get_end_page_id(end_page_id, self.total_page_count)
+        self._lock = threading.RLock()
+        self._pages = {}
+        self._textpages = {}
+        self._pdf_bytes = None
+        self._pypdf_pages = None
+        self._src_pypdf_reader = None
+        self._shared_stack = None
+        self._shared_pdf_path = None
+        self._closed = False
+
+    def _open(self):
+        with pdfium_lock:
+            self.pdf_doc = pdfium.PdfDocument(self.src_pdf_bytes)
+            return len(self.pdf_doc)
+
+    @staticmethod
+    def wrap(pdf, start_page_id=0, end_page_id=None):
+        """pdf为字节数据时新建一个handle并返回(handle, True)，调用方负责关闭；已是handle时原样返回(pdf, False)"""
+        if isinstance(pdf, DocumentHandle):
+            return pdf, False
+        return open_document(pdf, start_page_id, end_page_id), True
+
+    @property
+    def page_count(self):
+        return max(0, self.end_page_id - self.start_page_id + 1)
+
+    @property
+    def is_full_range(self):
+        return self.start_page_id == 0 and self.end_page_id == self.total_page_count - 1
+
+    def __len__(self):
+        return self.page_count
+
+    def __getitem__(self, index):
+        return self.get_page(index)
+
+    def __iter__(self):
+        for index in range(self.page_count):
+            yield self.get_page(index)
+
+    def _to_doc_index(self, index):
+        if index < 0:
+            index += self.page_count
+        if not 0 <= index < self.page_count:
+            raise IndexError(f"page index {index} out of range [0, {self.page_count})")
+        return self.start_page_id + index
+
+    def get_page(self, index):
+        """页码范围内第index页的PdfPage；已提取过文本页的页面直接复用，其余页面不缓存，避免长文档常驻全部页面"""
+        doc_index = self._to_doc_index(index)
+        with self._lock:
+            page = self._pages.get(doc_index)
+        if page is None:
+            with pdfium_lock:
+                page = self.pdf_doc[doc_index]
+        return page
+
+    def get_page_size(self, index):
+        """页码范围内第index页的(宽, 高)，无需加载页面"""
+        with pdfium_lock:
+            return self.pdf_doc.get_page_size(self._to_doc_index(index))
+
+    def get_page_sizes(self):
+        return [self.get_page_size(index) for index in range(self.page_count)]
+
+    def get_textpage(self, index):
+        """页码范围内第index页的PdfTextPage，同一页只提取一次（例如classify抽样时提取的文本页可被后续流程复用）"""
+        doc_index = self._to_doc_index(index)
+        with pdfium_lock, self._lock:
+            textpage = self._textpages.get(doc_index)
+            if textpage is None:
+                page = self.get_page(index)
+                textpage = page.get_textpage()
+                self._pages[doc_index] = page
+                self._textpages[doc_index] = textpage
+            return textpage
+
+    @property
+    def pdf_bytes(self):
+        """
+        页码范围对应的PDF字节：完整范围且pypdf能读取原始字节时直接返回原始字节，
+        否则由pdfium裁剪、重新保存一次（同时修复pypdf无法读取的损坏文件）
+        """
+        if self.is_full_range and self._get_src_pypdf_reader() is not None:
+            return self.src_pdf_bytes
+        with pdfium_lock, self._lock:
+            if self._pdf_bytes is None:
+                self._pdf_bytes = self._export_page_range()
+            return self._pdf_bytes
+
+    def _export_page_range(self):
+        # 调用方需持有pdfium_lock
+        output_pdf = pdfium.PdfDocument.new()
+        try:
+            # 逐页导入,失败则跳过
+            output_index = 0
+            for page_index in range(self.start_page_id, self.end_page_id + 1):
+                try:
+                    output_pdf.import_pages(self.pdf_doc, pages=[page_index])
+                    output_index += 1
+                except Exception as page_error:
+                    output_pdf.del_page(output_index)
+                    logger.warning(f"Failed to import page {page_index}: {page_error}, skipping this page.")
+                    continue
+            output_buffer = io.BytesIO()
+            output_pdf.save(output_buffer)
+            return output_buffer.getvalue()
+        except Exception as e:
+            logger.warning(f"Error in converting PDF bytes: {e}, Using original PDF bytes.")
+            return self.src_pdf_bytes
+        finally:
+            output_pdf.close()
+
+    def _get_src_pypdf_reader(self):
+        """原始字节的PdfReader，pypdf无法读取或读到的页数与pdfium不一致时返回None，只尝试一次"""
+        with self._lock:
+            if self._src_pypdf_reader is None:
+                from pypdf import PdfReader
+                try:
+                    reader = PdfReader(io.BytesIO(self.src_pdf_bytes))
+                    page_count = len(reader.pages)
+                except Exception as e:
+                    logger.warning(f"pypdf failed to read the original PDF bytes: {e}, using the pdfium re-saved PDF.")
+                    reader = False
+                else:
+                    if page_count != self.total_page_count:
+                        logger.warning(f"pypdf read {page_count} pages but pdfium read {self.total_page_count}, "
+                                       f"using the pdfium re-saved PDF.")
+                        reader = False
+                self._src_pypdf_reader = reader
+            return self._src_pypdf_reader or None
+
+    def get_pypdf_pages(self):
+        """页码范围内的pypdf页面，供draw_bbox叠加绘制，多次绘制共享同一个PdfReader"""
+        with self._lock:
+            if self._pypdf_pages is not None:
+                return self._pypdf_pages
+        reader = self._get_src_pypdf_reader()
+        if reader is not None:
+            pages = list(reader.pages[self.start_page_id:self.end_page_id + 1])
+        else:
+            # pdf_bytes需要先取pdfium_lock，因此不能在持有self._lock时访问
+            from pypdf import PdfReader
+            pages = list(PdfReader(io.BytesIO(self.pdf_bytes)).pages)
+        with self._lock:
+            if self._pypdf_pages is None:
+                self._pypdf_pages = pages
+            return self._pypdf_pages
+
+    def _get_shared_pdf_path(self):
+        # 渲染进程通过共享文件读取原始PDF，同一handle的多次渲染共用一个文件，渲染进程内的已解析文档也可复用
+        with self._lock:
+            if self._shared_pdf_path is None:
+                self._shared_stack = ExitStack()
+                self._shared_pdf_path = self._shared_stack.enter_context(share_pdf_bytes(self.src_pdf_bytes))
+            return self._shared_pdf_path
+
+    def load_images(self, start_index=0, end_index=None, image_type=ImageType.PIL, **kwargs):
+        """渲染页码范围内第start_index到end_index页(含)，参数与load_images_from_pdf相同，返回images_list"""
+        if end_index is None:
+            end_index = self.page_count - 1
+        if end_index < start_index:
+            return []
+        pdf_path = kwargs.pop("pdf_path", None)
+        if pdf_path is None and self.page_count > 0:
+            pdf_path = self._get_shared_pdf_path()
+        images_list, _ = load_images_from_pdf(
+            self.src_pdf_bytes,
+            start_page_id=self.start_page_id + start_index,
+            end_page_id=self.start_page_id + end_index,
+            image_type=image_type,
+            pdf_path=pdf_path,
+            pdf_doc=self.pdf_doc,
+            **kwargs,
+        )
+        return images_list
+
+    def release_render_file(self):
+        """删除渲染用的共享文件（例如文档的全部页面已渲染完成），之后再次渲染时会重新创建"""
+        with self._lock:
+            if self._shared_stack is not None:
+                self._shared_stack.close()
+                self._shared_stack = self._shared_pdf_path = None
+
+    def close(self):
+        """释放页面、文本页、共享文件和pdfium文档，可重复调用"""
+        with pdfium_lock, self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for textpage in self._textpages.values():
+                textpage.close()
+            for page in self._pages.values():
+                page.close()
+            self._textpages.clear()
+            self._pages.clear()
+            self._pypdf_pages = None
+            self._src_pypdf_reader = None
+            self.release_render_file()
+            self.pdf_doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ImagePage:
+    """图片页面的合成几何（72dpi，1像素对应1pt），提供middle_json组装所需的get_size()"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def get_size(self):
+        return self.width, self.height
+
+    def close(self):
+        pass
+
+
+class ImageDocument(DocumentHandle):
+    """
+    图片输入的DocumentHandle，多帧图片（TIFF等）的每一帧作为一页，渲染时按页码逐帧解码。
+
+    不再经过 图片→PDF→pdfium渲染 的往返：每帧只解码一次，再按与page_to_image相同的dpi和最长边规则缩放，
+    页面尺寸与images_bytes_to_pdf_bytes生成的PDF一致，下游模型看到的图片尺寸和坐标系与PDF路径相同。
+    只有需要输出原始PDF或绘制bbox时才在pdf_bytes中生成PDF。
+    """
+
+    has_text_layer = False
+
+    def _open(self):
+        self.pdf_doc = None
+        self.image = Image.open(io.BytesIO(self.src_pdf_bytes))
+        self._page_sizes = {}
+        return getattr(self.image, "n_frames", 1)
+
+    def _load_frame(self, doc_index):
+        # 调用方需持有self._lock，PIL的多帧图片通过seek切换当前帧
+        self.image.seek(doc_index)
+        self._page_sizes[doc_index] = self.image.size
+        return self.image.convert("RGB")
+
+    def get_page(self, index):
+        return ImagePage(*self.get_page_size(index))
+
+    def get_page_size(self, index):
+        doc_index = self._to_doc_index(index)
+        with self._lock:
+            if doc_index not in self._page_sizes:
+                self.image.seek(doc_index)
+                self._page_sizes[doc_index] = self.image.size
+            return tuple(float(size) for size in self._page_sizes[doc_index])
+
+    def get_textpage(self, index):
+        """图片没有文本层，返回None，调用方应先检查has_text_layer"""
+        self._to_doc_index(index)
+        return None
+
+    def _export_page_range(self):
+        with self._lock:
+            frames = [self._load_frame(doc_index) for doc_index in range(self.start_page_id, self.end_page_id + 1)]
+        return images_to_pdf_bytes(frames)
+
+    @property
+    def pdf_bytes(self):
+        """页码范围内的帧转换为PDF，只在首次访问时生成"""
+        with self._lock:
+            if self._pdf_bytes is None:
+                self._pdf_bytes = self._export_page_range()
+            return self._pdf_bytes
+
+    def get_pypdf_pages(self):
+        with self._lock:
+            if self._pypdf_pages is None:
+                from pypdf import PdfReader
+                self._pypdf_pages = list(PdfReader(io.BytesIO(self.pdf_bytes)).pages)
+            return self._pypdf_pages
+
+    def load_images(self, start_index=0, end_index=None, image_type=ImageType.PIL, dpi=200,
+                    max_width_or_height=3500, **kwargs):
+        """逐帧解码并缩放到与pdfium渲染相同的尺寸，with_text_lines等渲染参数对图片无意义，忽略"""
+        if end_index is None:
+            end_index = self.page_count - 1
+        images_list = []
+        for index in range(start_index, end_index + 1):
+            doc_index = self._to_doc_index(index)
+            with self._lock:
+                frame = self._load_frame(doc_index)
+            images_list.append(image_to_image_dict(frame, image_type, dpi, max_width_or_height))
+        return images_list
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pypdf_pages = None
+            self.image.close()
+
+
+def image_to_image_dict(image, image_type=ImageType.PIL, dpi=200, max_width_or_height=3500):
+    """按render_page_bitmap的规则缩放图片（1像素=1pt），返回与pdf_page_to_image相同结构的image_dict"""
+    scale = dpi / 72
+    long_side_length = max(image.size)
+    if long_side_length * scale > max_width_or_height:
+        scale = max_width_or_height / long_side_length
+    # 与pdfium渲染的位图尺寸一致（向上取整），消除浮点误差
+    target_size = tuple(math.ceil(round(size * scale, 6)) for size in image.size)
+    if target_size != image.size:
+        image = image.resize(target_size, Image.Resampling.BICUBIC)
+
+    if image_type == ImageType.BUFFER:
+        return {"scale": scale, "page_buffer": PageBuffer.from_pil(image)}
+    image_dict = {"scale": scale}
+    if image_type == ImageType.BASE64:
+        image_dict["img_base64"] = image_to_b64str(image)
+    else:
+        image_dict["img_pil"] = image
+    return image_dict
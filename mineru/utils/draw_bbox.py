@@ -5,9 +5,17 @@ from loguru import logger
 from pypdf import PdfReader, PdfWriter, PageObject
 from reportlab.pdfgen import canvas
 
+from .document_handle import DocumentHandle
 from .enum_class import BlockType, ContentType, SplitFlag
 
 
+def get_pdf_pages(pdf_bytes):
+    """pdf_bytes为DocumentHandle时复用其缓存的pypdf页面（多次绘制只解析一次），否则新建PdfReader"""
+    if isinstance(pdf_bytes, DocumentHandle):
+        return pdf_bytes.get_pypdf_pages()
+    return PdfReader(BytesIO(pdf_bytes)).pages
+
+
 def cal_canvas_rect(page, bbox):
     """
     Calculate the rectangle coordinates on the canvas based on the original PDF page and bounding box.
@@ -237,11 +245,9 @@ def draw_layout_bbox(pdf_info, pdf_bytes, out_path, filename):
 
         layout_bbox_list.append(page_block_list)
 
-    pdf_bytes_io = BytesIO(pdf_bytes)
-    pdf_docs = PdfReader(pdf_bytes_io)
     output_pdf = PdfWriter()
 
-    for i, page in enumerate(pdf_docs.pages):
+    for i, page in enumerate(get_pdf_pages(pdf_bytes)):
         # 获取原始页面尺寸
         page_width, page_height = float(page.cropbox[2]), float(page.cropbox[3])
         custom_page_size = (page_width, page_height)
@@ -349,11 +355,9 @@ def draw_span_bbox(pdf_info, pdf_bytes, out_path, filename):
         image_list.append(page_image_list)
         table_list.append(page_table_list)
 
-    pdf_bytes_io = BytesIO(pdf_bytes)
-    pdf_docs = PdfReader(pdf_bytes_io)
     output_pdf = PdfWriter()
 
-    for i, page in enumerate(pdf_docs.pages):
+    for i, page in enumerate(get_pdf_pages(pdf_bytes)):
         # 获取原始页面尺寸
         page_width, page_height = float(page.cropbox[2]), float(page.cropbox[3])
         custom_page_size = (page_width, page_height)
@@ -435,11 +439,9 @@ def draw_line_sort_bbox(pdf_info, pdf_bytes, out_path, filename):
                             page_line_list.append({'index': index, 'bbox': bbox})
         sorted_bboxes = sorted(page_line_list, key=lambda x: x['index'])
         layout_bbox_list.append(sorted_bbox['bbox'] for sorted_bbox in sorted_bboxes)
-    pdf_bytes_io = BytesIO(pdf_bytes)
-    pdf_docs = PdfReader(pdf_bytes_io)
     output_pdf = PdfWriter()
 
-    for i, page in enumerate(pdf_docs.pages):
+    for i, page in enumerate(get_pdf_pages(pdf_bytes)):
         # 获取原始页面尺寸
         page_width, page_height = float(page.cropbox[2]), float(page.cropbox[3])
         custom_page_size = (page_width, page_height)
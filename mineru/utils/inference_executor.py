@@ -0,0 +1,134 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+# 开启跨请求页面微批（MINERU_PAGE_BATCH_WAIT_MS）时默认的推理线程数，多个请求需要同时处理才能合并页面。
+# 并发请求中的pdfium调用由pdfium_lock串行，请求线程中的模型调用与合并批次共用模型调用锁（page_batcher.run_model_call）
+BATCHED_INFERENCE_THREADS = 4
+
+
+class ParseCancelledError(Exception):
+    """调用方通过cancel_event取消了正在执行的解析任务（例如流式请求的客户端断开连接）"""
+
+
+def raise_if_cancelled(cancel_event):
+    """cancel_event（threading.Event）已被设置时抛出ParseCancelledError，在页面窗口和文档之间调用"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise ParseCancelledError('parse cancelled by caller')
+
+
+def get_inference_threads():
+    default_threads = 1
+    try:
+        if int(os.getenv('MINERU_PAGE_BATCH_WAIT_MS', 0)) > 0:
+            default_threads = BATCHED_INFERENCE_THREADS
+    except ValueError:
+        pass
+    try:
+        inference_threads = int(os.getenv('MINERU_INFERENCE_THREADS', default_threads))
+    except ValueError:
+        inference_threads = default_threads
+    return max(1, inference_threads)
+
+
+class InferenceExecutor:
+    """
+    在专用的推理线程中执行同步的推理任务（例如pipeline后端的do_parse），模型仍由进程内的ModelSingleton持有。
+    asyncio调用方通过 await run() 等待结果，事件循环在推理期间保持响应；尚未开始执行的任务在调用方被取消时
+    （例如客户端断开连接）直接从队列中移除，已经开始执行的任务需要调用方另外设置传给任务的cancel_event。
+    stats()返回排队和执行中的任务数及等待/执行耗时。
+    """
+
+    def __init__(self, max_workers=None, name='mineru-inference'):
+        self.max_workers = max_workers or get_inference_threads()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._total_wait_time = 0.0
+        self._total_run_time = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        """提交任务，返回concurrent.futures.Future"""
+        submit_time = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+        future = self._executor.submit(self._run_job, fn, args, kwargs, submit_time)
+        future.add_done_callback(self._on_done)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """在推理线程中执行 fn(*args, **kwargs) 并等待结果，不阻塞事件循环"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _run_job(self, fn, args, kwargs, submit_time):
+        start_time = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait_time += start_time - submit_time
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._total_run_time += time.perf_counter() - start_time
+
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled():
+                # 任务未开始执行就被取消，不会经过_run_job
+                self._queued -= 1
+                self._cancelled += 1
+            elif future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    def stats(self):
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+                "avg_wait_time": round(self._total_wait_time / finished, 3) if finished else 0.0,
+                "avg_run_time": round(self._total_run_time / finished, 3) if finished else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_inference_executor = None
+_inference_executor_lock = threading.Lock()
+
+
+def get_inference_executor():
+    """获取进程内共享的推理执行器，首次调用时创建，线程数由环境变量MINERU_INFERENCE_THREADS控制，默认为1"""
+    global _inference_executor
+    with _inference_executor_lock:
+        if _inference_executor is None:
+            _inference_executor = InferenceExecutor()
+            logger.info(f"Inference executor started with {_inference_executor.max_workers} thread(s)")
+        return _inference_executor
+
+
+def get_inference_executor_stats():
+    with _inference_executor_lock:
+        executor = _inference_executor
+    if executor is None:
+        return {"workers": get_inference_threads(), "queued": 0, "running": 0}
+    return executor.stats()
@@ -0,0 +1,57 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import torch
+    import torch_npu
+except ImportError:
+    pass
+
+
+_loaded_models = {}
+_loaded_models_lock = threading.Lock()
+
+
+def get_device_memory_allocated(device):
+    """设备上当前由torch分配的显存字节数，CPU等无法统计的设备返回None"""
+    device = str(device)
+    try:
+        if device.startswith('cuda') and torch.cuda.is_available():
+            return torch.cuda.memory_allocated(device)
+        if device.startswith('npu') and torch_npu.npu.is_available():
+            return torch_npu.npu.memory_allocated(device)
+    except Exception:
+        pass
+    return None
+
+
+@contextmanager
+def track_model_load(name, device=None):
+    """
+    记录模型的加载耗时和显存增量，供/models接口展示。模型单例在首次创建模型时使用，
+    同一模型重复加载（例如多设备副本）时以最后一次为准。
+    """
+    memory_before = get_device_memory_allocated(device) if device is not None else None
+    start_time = time.perf_counter()
+    yield
+    load_time = time.perf_counter() - start_time
+    memory_after = get_device_memory_allocated(device) if device is not None else None
+    memory_mb = None
+    if memory_before is not None and memory_after is not None:
+        memory_mb = round((memory_after - memory_before) / (1024 ** 2), 1)
+    with _loaded_models_lock:
+        _loaded_models[name] = {
+            'name': name,
+            'device': str(device) if device is not None else None,
+            'load_time': round(load_time, 3),
+            'memory_mb': memory_mb,
+            'loaded_at': time.time(),
+        }
+
+
+def get_loaded_models():
+    """已加载的模型列表，按加载顺序排列"""
+    with _loaded_models_lock:
+        return sorted(_loaded_models.values(), key=lambda record: record['loaded_at'])
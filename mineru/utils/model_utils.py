@@ -5,7 +5,7 @@ from PIL import Image
 from loguru import logger
 import numpy as np
 
-from mineru.utils.boxbase import get_minbox_if_overlap_by_ratio
+from mineru.utils.boxbase import get_minbox_if_overlap_by_ratio, batch_calculate_intersection, batch_calculate_iou
 
 try:
     import torch
@@ -104,6 +104,20 @@ def do_overlap(box1, box2):
     return calculate_intersection(box1[:4], box2[:4]) is not None
 
 
+def batch_is_inside(small_boxes, big_boxes, overlap_threshold=0.8):
+    """Batch version of is_inside, returns an NxM bool matrix where [i, j] is is_inside(small_boxes[i], big_boxes[j])."""
+    intersection_area, _ = batch_calculate_intersection(small_boxes, big_boxes)
+    small_area = np.asarray([box[4] for box in small_boxes], dtype=np.float64).reshape(-1, 1)
+    # calculate_intersection requires a strictly positive overlap in both axes
+    return (intersection_area > 0) & (intersection_area >= overlap_threshold * small_area)
+
+
+def batch_do_overlap(boxes1, boxes2):
+    """Batch version of do_overlap, returns an NxM bool matrix."""
+    intersection_area, _ = batch_calculate_intersection(boxes1, boxes2)
+    return intersection_area > 0
+
+
 def merge_high_iou_tables(table_res_list, layout_res, table_indices, iou_threshold=0.7):
     """Merge tables with IoU > threshold."""
     if len(table_res_list) < 2:
@@ -114,58 +128,51 @@ def merge_high_iou_tables(table_res_list, layout_res, table_indices, iou_thresho
 
     while merged:
         merged = False
-        i = 0
-        while i < len(table_res_list) - 1:
-            j = i + 1
-            while j < len(table_res_list):
-                iou = calculate_iou(table_info[i], table_info[j])
-
-                if iou > iou_threshold:
-                    # Merge tables by taking their union
-                    x1_min, y1_min, x1_max, y1_max, _ = table_info[i]
-                    x2_min, y2_min, x2_max, y2_max, _ = table_info[j]
-
-                    union_xmin = min(x1_min, x2_min)
-                    union_ymin = min(y1_min, y2_min)
-                    union_xmax = max(x1_max, x2_max)
-                    union_ymax = max(y1_max, y2_max)
-
-                    # Create merged table
-                    merged_table = table_res_list[i].copy()
-                    merged_table['poly'] = [
-                        union_xmin, union_ymin, union_xmax, union_ymin,
-                        union_xmax, union_ymax, union_xmin, union_ymax
-                    ]
-                    # Update layout_res
-                    to_remove = [table_indices[j], table_indices[i]]
-                    for idx in sorted(to_remove, reverse=True):
-                        del layout_res[idx]
-                    layout_res.append(merged_table)
-
-                    # Update tracking lists
-                    table_indices = [k if k < min(to_remove) else
-                                     k - 1 if k < max(to_remove) else
-                                     k - 2 if k > max(to_remove) else
-                                     len(layout_res) - 1
-                                     for k in table_indices
-                                     if k not in to_remove]
-                    table_indices.append(len(layout_res) - 1)
-
-                    # Update table lists
-                    table_res_list.pop(j)
-                    table_res_list.pop(i)
-                    table_res_list.append(merged_table)
-
-                    # Update table_info
-                    table_info = [get_coords_and_area(table) for table in table_res_list]
-
-                    merged = True
-                    break
-                j += 1
-
-            if merged:
-                break
-            i += 1
+        # The first pair in row-major order of the upper triangle is the pair the nested i/j scan would merge first
+        iou_matrix = batch_calculate_iou(table_info, table_info)
+        high_iou_pairs = np.argwhere(np.triu(iou_matrix > iou_threshold, k=1))
+        if len(high_iou_pairs) > 0:
+            i, j = map(int, high_iou_pairs[0])
+
+            # Merge tables by taking their union
+            x1_min, y1_min, x1_max, y1_max, _ = table_info[i]
+            x2_min, y2_min, x2_max, y2_max, _ = table_info[j]
+
+            union_xmin = min(x1_min, x2_min)
+            union_ymin = min(y1_min, y2_min)
+            union_xmax = max(x1_max, x2_max)
+            union_ymax = max(y1_max, y2_max)
+
+            # Create merged table
+            merged_table = table_res_list[i].copy()
+            merged_table['poly'] = [
+                union_xmin, union_ymin, union_xmax, union_ymin,
+                union_xmax, union_ymax, union_xmin, union_ymax
+            ]
+            # Update layout_res
+            to_remove = [table_indices[j], table_indices[i]]
+            for idx in sorted(to_remove, reverse=True):
+                del layout_res[idx]
+            layout_res.append(merged_table)
+
+            # Update tracking lists
+            table_indices = [k if k < min(to_remove) else
+                             k - 1 if k < max(to_remove) else
+                             k - 2 if k > max(to_remove) else
+                             len(layout_res) - 1
+                             for k in table_indices
+                             if k not in to_remove]
+            table_indices.append(len(layout_res) - 1)
+
+            # Update table lists
+            table_res_list.pop(j)
+            table_res_list.pop(i)
+            table_res_list.append(merged_table)
+
+            # Update table_info
+            table_info = [get_coords_and_area(table) for table in table_res_list]
+
+            merged = True
 
     return table_res_list, table_indices
 
@@ -177,18 +184,18 @@ def filter_nested_tables(table_res_list, overlap_threshold=0.8, area_threshold=0
 
     table_info = [get_coords_and_area(table) for table in table_res_list]
     big_tables_idx = []
+    # inside_matrix[j, i]: table j is inside table i
+    inside_matrix = batch_is_inside(table_info, table_info, overlap_threshold)
+    overlap_matrix = batch_do_overlap(table_info, table_info)
 
     for i in range(len(table_res_list)):
         # Find tables inside this one
-        tables_inside = [j for j in range(len(table_res_list))
-                         if i != j and is_inside(table_info[j], table_info[i], overlap_threshold)]
+        tables_inside = [int(j) for j in np.flatnonzero(inside_matrix[:, i]) if j != i]
 
         # Continue if there are at least 3 tables inside
         if len(tables_inside) >= 3:
             # Check if inside tables overlap with each other
-            tables_overlap = any(do_overlap(table_info[tables_inside[idx1]], table_info[tables_inside[idx2]])
-                                 for idx1 in range(len(tables_inside))
-                                 for idx2 in range(idx1 + 1, len(tables_inside)))
+            tables_overlap = bool(np.triu(overlap_matrix[np.ix_(tables_inside, tables_inside)], k=1).any())
 
             # If no overlaps, check area condition
             if not tables_overlap:
@@ -293,6 +300,8 @@ def remove_overlaps_low_confidence_blocks(combined_res_list, overlap_threshold=0
 
     blocks_to_remove = []
     marked_indices = set()  # 跟踪已标记为删除的block索引
+    # inside_matrix[j, i]: block j 在 block i 内部
+    inside_matrix = batch_is_inside([info[:5] for info in block_info], [info[:5] for info in block_info], overlap_threshold)
 
     # 检查每个block内部是否有3个及以上的小block
     for i, (xmin, ymin, xmax, ymax, area, score, block) in enumerate(block_info):
@@ -301,10 +310,8 @@ def remove_overlaps_low_confidence_blocks(combined_res_list, overlap_threshold=0
             continue
 
         # 查找内部的小block (仅考虑尚未被标记为删除的block)
-        blocks_inside = [(j, j_score, j_block) for j, (xj_min, yj_min, xj_max, yj_max, j_area, j_score, j_block) in
-                         enumerate(block_info)
-                         if i != j and j not in marked_indices and is_inside(block_info[j], block_info[i],
-                                                                             overlap_threshold)]
+        blocks_inside = [(j, block_info[j][5], block_info[j][6]) for j in map(int, np.flatnonzero(inside_matrix[:, i]))
+                         if i != j and j not in marked_indices]
 
         # 如果内部有3个及以上的小block
         if len(blocks_inside) >= 2:
@@ -414,7 +421,7 @@ def get_res_list_from_layout_res(layout_res, iou_threshold=0.7, overlap_threshol
 
 
 def clean_memory(device='cuda'):
-    if device == 'cuda':
+    if str(device).startswith('cuda'):
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
             torch.cuda.ipc_collect()
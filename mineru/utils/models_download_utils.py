@@ -69,6 +69,26 @@ def auto_download_and_get_model_root_path(relative_path: str, repo_mode='pipelin
     return cache_dir
 
 
+def get_cached_model_root_path(repo_mode='pipeline'):
+    """
+    返回已经下载到本地的模型根目录（huggingface/modelscope的快照目录路径包含下载的revision），不会访问网络或触发下载。
+    模型尚未下载时返回None。
+    """
+    model_source = os.getenv('MINERU_MODEL_SOURCE', "huggingface")
+    if model_source == 'local':
+        return (get_local_models_dir() or {}).get(repo_mode, None)
+    if model_source == 'modelscope':
+        repo = ModelPath.pipeline_root_modelscope if repo_mode == 'pipeline' else ModelPath.vlm_root_modelscope
+        snapshot_download = ms_snapshot_download
+    else:
+        repo = ModelPath.pipeline_root_hf if repo_mode == 'pipeline' else ModelPath.vlm_root_hf
+        snapshot_download = hf_snapshot_download
+    try:
+        return snapshot_download(repo, local_files_only=True)
+    except Exception:
+        return None
+
+
 if __name__ == '__main__':
     path1 = "models/README.md"
     root = auto_download_and_get_model_root_path(path1)
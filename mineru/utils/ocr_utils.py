@@ -1,14 +1,20 @@
 # Copyright (c) Opendatalab. All rights reserved.
 import copy
+import unicodedata
+
 import cv2
 import numpy as np
 
+from mineru.utils.boxbase import batch_calculate_overlap_area_in_bbox1_area_ratio
+
 
 class OcrConfidence:
     min_confidence = 0.5
     min_width = 3
 
 LINE_WIDTH_TO_HEIGHT_RATIO_THRESHOLD = 4  # 一般情况下，行宽度超过高度4倍时才是一个正常的横向文本块
+TEXT_LAYER_MIN_COVERAGE = 0.3  # 文本层的行在区域内的投影覆盖率低于该值时，认为区域内有文本层之外的文字（如嵌入的图片文字）
+TEXT_LAYER_MAX_INVALID_CHAR_RATIO = 0.05  # 区域内文本层乱码字符占比超过该值时，认为文本层不可用
 
 
 def merge_spans_to_line(spans, threshold=0.6):
@@ -397,6 +403,92 @@ def get_ocr_result_list(ocr_res, useful_list, ocr_enable, bgr_image, lang):
     return ocr_result_list
 
 
+def is_text_layer_garbled(text):
+    """文本层为空，或无法映射的字符（U+FFFD、私有区、未分配码位）占比过高时认为不可用"""
+    chars = [char for char in text if not char.isspace()]
+    if len(chars) == 0:
+        return True
+    invalid_count = sum(
+        1 for char in chars if char == '\ufffd' or unicodedata.category(char) in ('Co', 'Cn')
+    )
+    return invalid_count / len(chars) > TEXT_LAYER_MAX_INVALID_CHAR_RATIO
+
+
+def _get_interval_coverage(intervals, start, end):
+    if end <= start:
+        return 0
+    merged = merge_intervals([list(interval) for interval in intervals])
+    return sum(interval_end - interval_start for interval_start, interval_end in merged) / (end - start)
+
+
+def get_text_layer_result_lists(ocr_res_list, text_lines, single_page_mfdetrec_res):
+    """
+    txt页面中用文本层的行代替OCR det构造span骨架，结果格式与ocr_enable为False时get_ocr_result_list的结果一致，
+    text为空，后续由txt_spans_extract用pdfium字符填充。
+    text_lines为渲染图片像素坐标下的文本行（见pdf_text_tool.get_page_text_lines）。
+    返回与ocr_res_list一一对应的列表，区域内文本层为空、覆盖不足、乱码或存在旋转的行时对应项为None，
+    这些区域仍需执行OCR det。
+    """
+    result_lists = [None] * len(ocr_res_list)
+    if len(ocr_res_list) == 0 or len(text_lines) == 0:
+        return result_lists
+
+    region_bboxes = [[res['poly'][0], res['poly'][1], res['poly'][4], res['poly'][5]] for res in ocr_res_list]
+    line_in_region = batch_calculate_overlap_area_in_bbox1_area_ratio(
+        [line['bbox'] for line in text_lines], region_bboxes
+    ) > 0.5
+
+    for region_index, (xmin, ymin, xmax, ymax) in enumerate(region_bboxes):
+        region_lines = [text_lines[i] for i in np.flatnonzero(line_in_region[:, region_index])]
+        if len(region_lines) == 0:
+            continue
+        # 旋转的行(rotation为弧度)在txt_spans_extract中会被跳过，交给OCR det处理
+        if any(line['rotation'] != 0 for line in region_lines):
+            continue
+        if is_text_layer_garbled(''.join(line['text'] for line in region_lines)):
+            continue
+
+        # 行裁剪到区域内，与OCR det只能看到区域内像素的行为一致
+        line_bboxes = [
+            [max(line['bbox'][0], xmin), max(line['bbox'][1], ymin),
+             min(line['bbox'][2], xmax), min(line['bbox'][3], ymax)]
+            for line in region_lines
+        ]
+        # 横排文字按行在纵向上的覆盖率计算，竖排文字按横向计算
+        vertical_count = sum(1 for bbox in line_bboxes if (bbox[3] - bbox[1]) > (bbox[2] - bbox[0]) * 2)
+        if vertical_count * 2 > len(line_bboxes):
+            coverage = _get_interval_coverage([(bbox[0], bbox[2]) for bbox in line_bboxes], xmin, xmax)
+        else:
+            coverage = _get_interval_coverage([(bbox[1], bbox[3]) for bbox in line_bboxes], ymin, ymax)
+        if coverage < TEXT_LAYER_MIN_COVERAGE:
+            continue
+
+        dt_boxes = [bbox_to_points(bbox) for bbox in line_bboxes]
+        # 与OCR det相同，按公式位置切分文本行
+        region_mfdetrec_res = [
+            mf_res for mf_res in single_page_mfdetrec_res
+            if mf_res['bbox'][0] < xmax and mf_res['bbox'][2] > xmin
+            and mf_res['bbox'][1] < ymax and mf_res['bbox'][3] > ymin
+        ]
+        if region_mfdetrec_res:
+            dt_boxes = update_det_boxes(dt_boxes, region_mfdetrec_res)
+
+        ocr_result_list = []
+        for box in dt_boxes:
+            p1, p2, p3, p4 = box.tolist()
+            if (p3[0] - p1[0]) < OcrConfidence.min_width:
+                continue
+            ocr_result_list.append({
+                'category_id': 15,
+                'poly': p1 + p2 + p3 + p4,
+                'score': 1.0,
+                'text': '',
+            })
+        result_lists[region_index] = ocr_result_list
+
+    return result_lists
+
+
 def calculate_is_angle(poly):
     p1, p2, p3, p4 = poly
     height = ((p4[1] - p1[1]) + (p3[1] - p2[1])) / 2
@@ -11,6 +11,11 @@ def get_load_images_timeout() -> int:
     return get_value_from_string(env_value, 300)
 
 
+def get_pdf_render_threads() -> int:
+    env_value = os.getenv('MINERU_PDF_RENDER_THREADS', None)
+    return get_value_from_string(env_value, min(os.cpu_count() or 1, 4))
+
+
 def get_value_from_string(env_value: str, default_value: int) -> int:
     if env_value is not None:
         try:
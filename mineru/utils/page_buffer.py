@@ -0,0 +1,134 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import weakref
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from PIL import Image
+
+from mineru.utils.hash_utils import bytes_md5
+
+
+class PageBuffer:
+    """页面图片的统一缓冲区。
+
+    每页对应一块连续的 HxWx3 uint8 RGB 数组，由渲染进程产出时存放在共享内存中。
+    numpy 视图零拷贝，PIL 视图首次访问时转换一次并缓存，裁剪直接在数组上完成，
+    content hash 在渲染进程中预先计算，与原先 bytes_md5(pil_img.tobytes()) 的结果一致。
+    """
+
+    def __init__(self, array: np.ndarray, md5: str = None, shm: SharedMemory = None):
+        if array.dtype != np.uint8 or array.ndim != 3 or array.shape[2] != 3:
+            raise ValueError(f"PageBuffer expects a HxWx3 uint8 array, got {array.dtype} {array.shape}")
+        self._array = np.ascontiguousarray(array)
+        self._array.flags.writeable = False
+        self._md5 = md5
+        self._pil_img = None
+        self._shm = shm
+        if shm is not None:
+            self._finalizer = weakref.finalize(self, _release_shared_memory, shm)
+
+    @classmethod
+    def from_pil(cls, pil_img: Image.Image, md5: str = None):
+        if pil_img.mode != "RGB":
+            pil_img = pil_img.convert("RGB")
+        page_buffer = cls(np.asarray(pil_img), md5=md5)
+        page_buffer._pil_img = pil_img
+        return page_buffer
+
+    @classmethod
+    def from_shared_memory(cls, name: str, shape: tuple, md5: str = None):
+        """附加到渲染进程创建的共享内存上，并接管其生命周期（对象回收时释放）"""
+        shm = SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        return cls(array, md5=md5, shm=shm)
+
+    @property
+    def np_img(self) -> np.ndarray:
+        return self._array
+
+    @property
+    def pil_img(self) -> Image.Image:
+        if self._pil_img is None:
+            self._pil_img = Image.fromarray(self._array)
+        return self._pil_img
+
+    def release_pil(self):
+        """释放缓存的 PIL 视图，只在后续阶段不再需要 PIL 时调用"""
+        self._pil_img = None
+
+    @property
+    def width(self) -> int:
+        return self._array.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self._array.shape[0]
+
+    @property
+    def size(self) -> tuple:
+        return self.width, self.height
+
+    @property
+    def md5(self) -> str:
+        if self._md5 is None:
+            self._md5 = bytes_md5(memoryview(self._array).cast("B"))
+        return self._md5
+
+    def crop(self, box: tuple) -> np.ndarray:
+        """按 PIL.Image.crop 的语义裁剪 (left, upper, right, lower)，越界部分以黑色填充"""
+        left, upper, right, lower = box
+        if right < left:
+            raise ValueError("Coordinate 'right' is less than 'left'")
+        if lower < upper:
+            raise ValueError("Coordinate 'lower' is less than 'upper'")
+        if left >= 0 and upper >= 0 and right <= self.width and lower <= self.height:
+            return self._array[upper:lower, left:right]
+
+        crop_array = np.zeros((lower - upper, right - left, 3), dtype=np.uint8)
+        src_left, src_upper = max(left, 0), max(upper, 0)
+        src_right, src_lower = min(right, self.width), min(lower, self.height)
+        if src_right > src_left and src_lower > src_upper:
+            crop_array[src_upper - upper:src_lower - upper, src_left - left:src_right - left] = \
+                self._array[src_upper:src_lower, src_left:src_right]
+        return crop_array
+
+    def crop_pil(self, box: tuple) -> Image.Image:
+        return Image.fromarray(np.ascontiguousarray(self.crop(box)))
+
+
+def create_shared_page_array(height: int, width: int):
+    """在渲染进程中创建页面共享内存，所有权交给读取方，因此不登记到本进程的 resource_tracker"""
+    shm = SharedMemory(create=True, size=max(1, height * width * 3))
+    resource_tracker.unregister(shm._name, "shared_memory")
+    array = np.ndarray((height, width, 3), dtype=np.uint8, buffer=shm.buf)
+    return shm, array
+
+
+def discard_shared_memory(name: str):
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    _release_shared_memory(shm)
+
+
+def _release_shared_memory(shm: SharedMemory):
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        shm.close()
+    except BufferError:
+        # 仍有外部视图引用该内存，映射会在视图释放后自动回收
+        pass
+
+
+def get_page_buffer(image_dict: dict) -> PageBuffer:
+    """从 load_images_from_pdf 的结果中获取 PageBuffer，兼容只包含 img_pil 的旧格式"""
+    page_buffer = image_dict.get("page_buffer")
+    if page_buffer is None:
+        page_buffer = PageBuffer.from_pil(image_dict["img_pil"])
+        image_dict["page_buffer"] = page_buffer
+    return page_buffer
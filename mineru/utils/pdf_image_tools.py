@@ -1,21 +1,31 @@
 # Copyright (c) Opendatalab. All rights reserved.
+import atexit
 import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
 from io import BytesIO
 
 import numpy as np
 import pypdfium2 as pdfium
 from loguru import logger
-from PIL import Image
+from PIL import Image, ImageSequence
 
 from mineru.data.data_reader_writer import FileBasedDataWriter
 from mineru.utils.check_sys_env import is_windows_environment
-from mineru.utils.os_env_config import get_load_images_timeout
-from mineru.utils.pdf_reader import image_to_b64str, image_to_bytes, page_to_image
+from mineru.utils.os_env_config import get_load_images_timeout, get_pdf_render_threads
+from mineru.utils.pdf_reader import image_to_b64str, image_to_bytes, page_to_image, render_page_bitmap
 from mineru.utils.enum_class import ImageType
-from mineru.utils.hash_utils import str_sha256
+from mineru.utils.hash_utils import bytes_md5, str_sha256
+from mineru.utils.page_buffer import PageBuffer, create_shared_page_array, discard_shared_memory
 from mineru.utils.pdf_page_id import get_end_page_id
+from mineru.utils.pdf_text_tool import get_page_text_lines
+from mineru.utils.pdfium_lock import pdfium_lock
 
 from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 
 
 def pdf_page_to_image(page: pdfium.PdfPage, dpi=200, image_type=ImageType.PIL) -> dict:
@@ -29,6 +39,14 @@ def pdf_page_to_image(page: pdfium.PdfPage, dpi=200, image_type=ImageType.PIL) -
     Returns:
         dict:  {'img_base64': str, 'img_pil': pil_img, 'scale': float }
     """
+    if image_type == ImageType.BUFFER:
+        bitmap, scale = render_page_bitmap(page, dpi=dpi, rev_byteorder=True)
+        try:
+            array = np.array(bitmap_to_np_view(bitmap))
+        finally:
+            bitmap.close()
+        return {"scale": scale, "page_buffer": PageBuffer(array)}
+
     pil_img, scale = page_to_image(page, dpi=dpi)
     image_dict = {
         "scale": scale,
@@ -41,9 +59,170 @@ def pdf_page_to_image(page: pdfium.PdfPage, dpi=200, image_type=ImageType.PIL) -
     return image_dict
 
 
-def _load_images_from_pdf_worker(pdf_bytes, dpi, start_page_id, end_page_id, image_type):
-    """用于进程池的包装函数"""
-    return load_images_from_pdf_core(pdf_bytes, dpi, start_page_id, end_page_id, image_type)
+def bitmap_to_np_view(bitmap: pdfium.PdfBitmap) -> np.ndarray:
+    """以 HxWx3 的 numpy 视图访问 RGB 位图（考虑行对齐），不产生拷贝"""
+    return np.ndarray(
+        (bitmap.height, bitmap.width, 3),
+        dtype=np.uint8,
+        buffer=bitmap.buffer,
+        strides=(bitmap.stride, 3, 1),
+    )
+
+
+def _get_shared_tmp_dir():
+    # 优先使用内存文件系统，避免 PDF 落盘
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+
+@contextmanager
+def share_pdf_bytes(pdf_bytes: bytes):
+    """将 pdf_bytes 写入共享的临时文件，渲染进程通过文件路径读取，避免每次提交任务时 pickle 整个 PDF。
+
+    同一个路径可以在多次 load_images_from_pdf 调用之间复用（例如按页面窗口分批渲染同一文档）。
+    """
+    fd, pdf_path = tempfile.mkstemp(suffix=".pdf", prefix="mineru_render_", dir=_get_shared_tmp_dir())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        yield pdf_path
+    finally:
+        try:
+            os.remove(pdf_path)
+        except OSError as e:
+            logger.warning(f"Failed to remove shared pdf file {pdf_path}: {e}")
+
+
+# 渲染进程内缓存已解析的 PdfDocument，同一文档的多次渲染任务无需重复解析
+# key 包含文件的 inode/mtime/size，临时文件被删除后路径被复用时不会命中旧文档
+_worker_pdf_docs = OrderedDict()
+_WORKER_PDF_DOC_CACHE_SIZE = 4
+
+
+def _get_pdf_file_key(pdf_path):
+    stat = os.stat(pdf_path)
+    return pdf_path, stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _evict_released_worker_pdf_docs():
+    """关闭共享文件已被删除（share_pdf_bytes 退出）或替换的缓存文档，释放仍占用已删除文件的句柄"""
+    for key in list(_worker_pdf_docs):
+        try:
+            current_key = _get_pdf_file_key(key[0])
+        except OSError:
+            current_key = None
+        if current_key != key:
+            _worker_pdf_docs.pop(key).close()
+
+
+def _get_worker_pdf_doc(pdf_path):
+    _evict_released_worker_pdf_docs()
+    key = _get_pdf_file_key(pdf_path)
+    pdf_doc = _worker_pdf_docs.get(key)
+    if pdf_doc is not None:
+        _worker_pdf_docs.move_to_end(key)
+        return pdf_doc
+    pdf_doc = pdfium.PdfDocument(pdf_path)
+    _worker_pdf_docs[key] = pdf_doc
+    while len(_worker_pdf_docs) > _WORKER_PDF_DOC_CACHE_SIZE:
+        _, expired_doc = _worker_pdf_docs.popitem(last=False)
+        expired_doc.close()
+    return pdf_doc
+
+
+def _load_images_from_pdf_worker(pdf_path, dpi, start_page_id, end_page_id, image_type, with_text_lines=False):
+    """渲染进程中执行的函数，PIL 图片以原始 RGB 缓冲区的形式返回，避免 pickle PIL 对象
+
+    with_text_lines 为 True 时同时在渲染进程中提取页面文本层的行（像素坐标），存放在 text_lines 中
+    """
+    pdf_doc = _get_worker_pdf_doc(pdf_path)
+    results = []
+    for index in range(start_page_id, end_page_id + 1):
+        page = pdf_doc[index]
+        if image_type == ImageType.BASE64:
+            results.append(pdf_page_to_image(page, dpi=dpi, image_type=image_type))
+        elif image_type == ImageType.BUFFER:
+            # 直接渲染进共享内存，并在渲染进程中预先计算页面hash
+            bitmap, scale = render_page_bitmap(page, dpi=dpi, rev_byteorder=True)
+            try:
+                shm, array = create_shared_page_array(bitmap.height, bitmap.width)
+                array[:] = bitmap_to_np_view(bitmap)
+                md5 = bytes_md5(shm.buf[:array.nbytes])
+                results.append({"scale": scale, "shm": (shm.name, array.shape, md5)})
+                del array
+                shm.close()
+            finally:
+                bitmap.close()
+        else:
+            bitmap, scale = render_page_bitmap(page, dpi=dpi, rev_byteorder=True)
+            try:
+                results.append({
+                    "scale": scale,
+                    "raw": (bytes(bitmap.buffer), bitmap.mode, bitmap.width, bitmap.height, bitmap.stride),
+                })
+            finally:
+                bitmap.close()
+        if with_text_lines:
+            results[-1]["text_lines"] = get_page_text_lines(page, results[-1]["scale"])
+        page.close()
+    return results
+
+
+def _raw_to_image_dict(image_dict):
+    raw = image_dict.pop("raw", None)
+    if raw is not None:
+        buffer, mode, width, height, stride = raw
+        image_dict["img_pil"] = Image.frombuffer("RGB", (width, height), buffer, "raw", mode, stride, 1)
+    shm_info = image_dict.pop("shm", None)
+    if shm_info is not None:
+        name, shape, md5 = shm_info
+        image_dict["page_buffer"] = PageBuffer.from_shared_memory(name, shape, md5=md5)
+    return image_dict
+
+
+def _discard_worker_results(futures):
+    """渲染失败时回收已完成任务创建的共享内存"""
+    for _, future in futures:
+        if future.done() and not future.cancelled() and future.exception() is None:
+            for image_dict in future.result():
+                if "shm" in image_dict:
+                    discard_shared_memory(image_dict["shm"][0])
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """获取常驻的渲染进程池，首次调用时创建，所有 load_images_from_pdf 调用共享"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=get_pdf_render_threads())
+        return _render_pool
+
+
+def shutdown_render_pool(kill=False, executor=None):
+    """关闭渲染进程池，kill 为 True 时强制结束仍在运行的渲染进程（例如渲染超时）
+
+    executor 为出错的调用所使用的进程池：只有它仍是当前进程池时才关闭并重置，
+    已被其他调用重建的新进程池不受影响
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if executor is None:
+            executor = _render_pool
+        if executor is None or _render_pool is not executor:
+            return
+        _render_pool = None
+    if kill:
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+    executor.shutdown(wait=not kill, cancel_futures=True)
+
+
+atexit.register(shutdown_render_pool)
 
 
 def load_images_from_pdf(
@@ -53,9 +232,12 @@ def load_images_from_pdf(
         end_page_id=None,
         image_type=ImageType.PIL,
         timeout=None,
-        threads=4,
+        threads=None,
+        pdf_path=None,
+        with_text_lines=False,
+        pdf_doc=None,
 ):
-    """带超时控制的 PDF 转图片函数,支持多进程加速
+    """带超时控制的 PDF 转图片函数,使用常驻的渲染进程池加速
 
     Args:
         pdf_bytes (bytes): PDF 文件的 bytes
@@ -64,59 +246,74 @@ def load_images_from_pdf(
         end_page_id (int | None, optional): 结束页码. Defaults to None.
         image_type (ImageType, optional): 图片类型. Defaults to ImageType.PIL.
         timeout (int | None, optional): 超时时间(秒)。如果为 None，则从环境变量 MINERU_PDF_LOAD_IMAGES_TIMEOUT 读取，若未设置则默认为 300 秒。
-        threads (int): 进程数,默认 4
+        threads (int | None): 页面拆分的任务数，默认为渲染进程池大小（环境变量 MINERU_PDF_RENDER_THREADS，默认 4）
+        pdf_path (str | None): 由 share_pdf_bytes 得到的共享文件路径，多次调用渲染同一文档时传入可避免重复写入
+        with_text_lines (bool): 是否同时提取每页文本层的行（渲染图片的像素坐标），结果存放在 image_dict['text_lines'] 中
+        pdf_doc (pdfium.PdfDocument | None): 调用方已解析的文档（例如 DocumentHandle.pdf_doc），传入时不再重复解析，也不会在出错时关闭
 
     Raises:
         TimeoutError: 当转换超时时抛出
     """
-    pdf_doc = pdfium.PdfDocument(pdf_bytes)
+    owns_pdf_doc = pdf_doc is None
+    with pdfium_lock:
+        if owns_pdf_doc:
+            pdf_doc = pdfium.PdfDocument(pdf_bytes)
+        page_count = len(pdf_doc)
     if is_windows_environment():
         # Windows 环境下不使用多进程
         return load_images_from_pdf_core(
             pdf_bytes,
             dpi,
             start_page_id,
-            get_end_page_id(end_page_id, len(pdf_doc)),
-            image_type
+            get_end_page_id(end_page_id, page_count),
+            image_type,
+            with_text_lines,
+            pdf_doc=pdf_doc,
         ), pdf_doc
     else:
         if timeout is None:
             timeout = get_load_images_timeout()
-        end_page_id = get_end_page_id(end_page_id, len(pdf_doc))
+        if threads is None:
+            threads = get_pdf_render_threads()
+        end_page_id = get_end_page_id(end_page_id, page_count)
 
         # 计算总页数
         total_pages = end_page_id - start_page_id + 1
 
-        # 实际使用的进程数不超过总页数
-        actual_threads = min(os.cpu_count() or 1, threads, total_pages)
+        # 实际拆分的任务数不超过总页数
+        actual_threads = max(1, min(threads, total_pages))
 
-        # 根据实际进程数分组页面范围
+        # 根据任务数分组页面范围
         pages_per_thread = max(1, total_pages // actual_threads)
         page_ranges = []
 
         for i in range(actual_threads):
             range_start = start_page_id + i * pages_per_thread
             if i == actual_threads - 1:
-                # 最后一个进程处理剩余所有页面
+                # 最后一个任务处理剩余所有页面
                 range_end = end_page_id
             else:
                 range_end = start_page_id + (i + 1) * pages_per_thread - 1
 
             page_ranges.append((range_start, range_end))
 
-        # logger.debug(f"PDF to images using {actual_threads} processes, page ranges: {page_ranges}")
+        # logger.debug(f"PDF to images using {actual_threads} tasks, page ranges: {page_ranges}")
 
-        with ProcessPoolExecutor(max_workers=actual_threads) as executor:
-            # 提交所有任务
+        with ExitStack() as stack:
+            if pdf_path is None:
+                pdf_path = stack.enter_context(share_pdf_bytes(pdf_bytes))
+
+            executor = get_render_pool()
             futures = []
             for range_start, range_end in page_ranges:
                 future = executor.submit(
                     _load_images_from_pdf_worker,
-                    pdf_bytes,
+                    pdf_path,
                     dpi,
                     range_start,
                     range_end,
-                    image_type
+                    image_type,
+                    with_text_lines,
                 )
                 futures.append((range_start, future))
 
@@ -126,18 +323,32 @@ def load_images_from_pdf(
                 for range_start, future in futures:
                     images_list = future.result(timeout=timeout)
                     all_results.append((range_start, images_list))
-
-                # 按起始页码排序并合并结果
-                all_results.sort(key=lambda x: x[0])
-                images_list = []
-                for _, imgs in all_results:
-                    images_list.extend(imgs)
-
-                return images_list, pdf_doc
             except FuturesTimeoutError:
-                pdf_doc.close()
-                executor.shutdown(wait=False, cancel_futures=True)
+                if owns_pdf_doc:
+                    with pdfium_lock:
+                        pdf_doc.close()
+                # 渲染进程可能已卡死，重建进程池
+                shutdown_render_pool(kill=True, executor=executor)
+                _discard_worker_results(futures)
                 raise TimeoutError(f"PDF to images conversion timeout after {timeout}s")
+            except BrokenProcessPool:
+                if owns_pdf_doc:
+                    with pdfium_lock:
+                        pdf_doc.close()
+                shutdown_render_pool(kill=True, executor=executor)
+                _discard_worker_results(futures)
+                raise
+            except Exception:
+                _discard_worker_results(futures)
+                raise
+
+        # 按起始页码排序并合并结果
+        all_results.sort(key=lambda x: x[0])
+        images_list = []
+        for _, imgs in all_results:
+            images_list.extend(_raw_to_image_dict(image_dict) for image_dict in imgs)
+
+        return images_list, pdf_doc
 
 
 def load_images_from_pdf_core(
@@ -146,19 +357,31 @@ def load_images_from_pdf_core(
     start_page_id=0,
     end_page_id=None,
     image_type=ImageType.PIL,  # PIL or BASE64
+    with_text_lines=False,
+    pdf_doc=None,
 ):
     images_list = []
-    pdf_doc = pdfium.PdfDocument(pdf_bytes)
-    pdf_page_num = len(pdf_doc)
+    owns_pdf_doc = pdf_doc is None
+    # 在当前进程中渲染，逐页持有pdfium_lock，页与页之间其他线程（例如middle_json组装）可以调用pdfium
+    with pdfium_lock:
+        if owns_pdf_doc:
+            pdf_doc = pdfium.PdfDocument(pdf_bytes)
+        pdf_page_num = len(pdf_doc)
     end_page_id = get_end_page_id(end_page_id, pdf_page_num)
 
     for index in range(start_page_id, end_page_id + 1):
         # logger.debug(f"Converting page {index}/{pdf_page_num} to image")
-        page = pdf_doc[index]
-        image_dict = pdf_page_to_image(page, dpi=dpi, image_type=image_type)
+        with pdfium_lock:
+            page = pdf_doc[index]
+            image_dict = pdf_page_to_image(page, dpi=dpi, image_type=image_type)
+            if with_text_lines:
+                image_dict["text_lines"] = get_page_text_lines(page, image_dict["scale"])
+            page.close()
         images_list.append(image_dict)
 
-    pdf_doc.close()
+    if owns_pdf_doc:
+        with pdfium_lock:
+            pdf_doc.close()
 
     return images_list
 
@@ -193,17 +416,21 @@ def get_crop_img(bbox: tuple, pil_img, scale=2):
         int(bbox[2] * scale),
         int(bbox[3] * scale),
     )
+    if isinstance(pil_img, PageBuffer):
+        return pil_img.crop_pil(scale_bbox)
     return pil_img.crop(scale_bbox)
 
 
 def get_crop_np_img(bbox: tuple, input_img, scale=2):
 
-    if isinstance(input_img, Image.Image):
+    if isinstance(input_img, PageBuffer):
+        np_img = input_img.np_img
+    elif isinstance(input_img, Image.Image):
         np_img = np.asarray(input_img)
     elif isinstance(input_img, np.ndarray):
         np_img = input_img
     else:
-        raise ValueError("Input must be a pillow object or a numpy array.")
+        raise ValueError("Input must be a pillow object, a numpy array or a PageBuffer.")
 
     scale_bbox = (
         int(bbox[0] * scale),
@@ -214,17 +441,28 @@ def get_crop_np_img(bbox: tuple, input_img, scale=2):
 
     return np_img[scale_bbox[1]:scale_bbox[3], scale_bbox[0]:scale_bbox[2]]
 
+
+_FIXED_PDF_DATE = time.gmtime(0)
+
+
 def images_bytes_to_pdf_bytes(image_bytes):
+    # 载入并转换所有图像为 RGB 模式，多帧图片（如TIFF）的每一帧作为一页
+    with Image.open(BytesIO(image_bytes)) as image:
+        frames = [frame.convert("RGB") for frame in ImageSequence.Iterator(image)]
+    return images_to_pdf_bytes(frames)
+
+
+def images_to_pdf_bytes(images):
     # 内存缓冲区
     pdf_buffer = BytesIO()
 
-    # 载入并转换所有图像为 RGB 模式
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-
-    # 第一张图保存为 PDF，其余追加
-    image.save(pdf_buffer, format="PDF", save_all=True)
+    # 第一张图保存为 PDF，其余追加；固定文档日期，保证相同图片生成相同的 PDF bytes
+    images[0].save(
+        pdf_buffer, format="PDF", save_all=True, append_images=images[1:],
+        creationDate=_FIXED_PDF_DATE, modDate=_FIXED_PDF_DATE,
+    )
 
-    # 获取 PDF bytes 并重置指针（可选）
+    # 获取 PDF bytes
     pdf_bytes = pdf_buffer.getvalue()
     pdf_buffer.close()
     return pdf_bytes
@@ -6,19 +6,31 @@ from loguru import logger
 from PIL import Image
 from pypdfium2 import PdfBitmap, PdfDocument, PdfPage
 
+from mineru.utils.pdfium_lock import pdfium_lock
 
-def page_to_image(
+
+def render_page_bitmap(
     page: PdfPage,
     dpi: int = 200,
-    max_width_or_height: int = 3500,  # changed from 4500 to 3500
-) -> (Image.Image, float):
+    max_width_or_height: int = 3500,
+    **render_kwargs,
+) -> (PdfBitmap, float):
     scale = dpi / 72
 
     long_side_length = max(*page.get_size())
     if (long_side_length*scale) > max_width_or_height:
         scale = max_width_or_height / long_side_length
 
-    bitmap: PdfBitmap = page.render(scale=scale)  # type: ignore
+    bitmap: PdfBitmap = page.render(scale=scale, **render_kwargs)  # type: ignore
+    return bitmap, scale
+
+
+def page_to_image(
+    page: PdfPage,
+    dpi: int = 200,
+    max_width_or_height: int = 3500,  # changed from 4500 to 3500
+) -> (Image.Image, float):
+    bitmap, scale = render_page_bitmap(page, dpi=dpi, max_width_or_height=max_width_or_height)
 
     image = bitmap.to_pil()
     try:
@@ -65,24 +77,25 @@ def pdf_to_images(
     start_page_id: int = 0,
     end_page_id: int | None = None,
 ) -> list[Image.Image]:
-    doc = pdf if isinstance(pdf, PdfDocument) else PdfDocument(pdf)
-    page_num = len(doc)
+    with pdfium_lock:
+        doc = pdf if isinstance(pdf, PdfDocument) else PdfDocument(pdf)
+        page_num = len(doc)
 
-    end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else page_num - 1
-    if end_page_id > page_num - 1:
-        logger.warning("end_page_id is out of range, use images length")
-        end_page_id = page_num - 1
+        end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else page_num - 1
+        if end_page_id > page_num - 1:
+            logger.warning("end_page_id is out of range, use images length")
+            end_page_id = page_num - 1
 
-    images = []
-    try:
-        for i in range(start_page_id, end_page_id + 1):
-            image, _ = page_to_image(doc[i], dpi, max_width_or_height)
-            images.append(image)
-    finally:
+        images = []
         try:
-            doc.close()
-        except Exception:
-            pass
+            for i in range(start_page_id, end_page_id + 1):
+                image, _ = page_to_image(doc[i], dpi, max_width_or_height)
+                images.append(image)
+        finally:
+            try:
+                doc.close()
+            except Exception:
+                pass
     return images
 
 
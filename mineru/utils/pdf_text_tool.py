@@ -37,4 +37,18 @@ def get_page(
             "rotation": page_rotation,
             "blocks": blocks
         }
-        return page
\ No newline at end of file
+        return page
+
+
+def get_page_text_lines(page: pdfium.PdfPage, scale: float = 1.0) -> List[dict]:
+    """页面文本层中的所有行，bbox按scale换算到渲染图片的像素坐标，只包含基础类型，可以跨进程传递"""
+    page_dict = get_page(page)
+    text_lines = []
+    for block in page_dict['blocks']:
+        for line in block['lines']:
+            text_lines.append({
+                'bbox': [v * scale for v in line['bbox'].bbox],
+                'text': ''.join(span['text'] for span in line['spans']),
+                'rotation': line['rotation'],
+            })
+    return text_lines
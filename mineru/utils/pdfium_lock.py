@@ -0,0 +1,8 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import threading
+
+# pdfium不是线程安全的：即使操作的是不同的文档，同一进程内也不能在多个线程中同时调用pdfium。
+# 进程内所有的pdfium调用（打开/关闭文档、取页面、页面尺寸、文本页、渲染、导出页面）都需要持有这把锁。
+# 锁可重入，持有锁时可以继续调用同样加锁的接口（例如DocumentHandle的方法）；渲染进程池中的子进程各自独立，不需要加锁。
+# 持有这把锁时不要再等待模型推理等其他锁，避免死锁。
+pdfium_lock = threading.RLock()
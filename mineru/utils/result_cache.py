@@ -0,0 +1,347 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from loguru import logger
+
+from mineru.utils.config_reader import get_formula_enable, get_llm_aided_config, get_table_enable, \
+    get_text_layer_spans_enable
+from mineru.utils.document_handle import DocumentHandle
+from mineru.utils.enum_class import ModelPath
+from mineru.utils.pdf_page_id import get_end_page_id
+from mineru.version import __version__
+
+CACHE_META_FILE = "meta.json"
+CACHE_MODEL_FILE = "model.json"
+CACHE_MIDDLE_FILE = "middle.json"
+CACHE_IMAGES_DIR = "images"
+
+
+def get_result_cache_dir():
+    return os.getenv("MINERU_RESULT_CACHE_DIR", None)
+
+
+def get_result_cache_max_bytes():
+    try:
+        max_mb = int(os.getenv("MINERU_RESULT_CACHE_MAX_MB", "10240"))
+    except ValueError:
+        max_mb = 10240
+    return max(0, max_mb) * 1024 * 1024
+
+
+PIPELINE_MODEL_PATHS = [
+    ModelPath.doclayout_yolo, ModelPath.yolo_v8_mfd, ModelPath.unimernet_small,
+    ModelPath.pp_formulanet_plus_m, ModelPath.pytorch_paddle, ModelPath.layout_reader,
+    ModelPath.slanet_plus, ModelPath.unet_structure, ModelPath.paddle_table_cls,
+    ModelPath.paddle_orientation_classification,
+]
+
+_model_weights_fingerprints = {}
+_model_weights_fingerprints_lock = threading.Lock()
+
+
+def _fingerprint_model_files(root_path, relative_paths):
+    """对模型文件的相对路径、大小和修改时间计算hash，同一路径下的权重被更新（重新下载）后hash随之变化"""
+    hasher = hashlib.sha256(str(root_path).encode("utf-8"))
+    for relative_path in relative_paths:
+        path = os.path.join(root_path, relative_path.strip("/"))
+        file_paths = [path] if os.path.isfile(path) else sorted(
+            os.path.join(dir_path, file_name)
+            for dir_path, _, file_names in os.walk(path)
+            for file_name in file_names
+        )
+        if not file_paths:
+            hasher.update(f"{relative_path}:missing".encode("utf-8"))
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            hasher.update(f"{os.path.relpath(file_path, root_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def get_model_weights_fingerprint(backend):
+    """
+    本地模型权重的指纹，不会触发下载：huggingface/modelscope的快照目录包含下载的revision，权重文件按大小和修改时间计算hash。
+    模型尚未下载时返回None（之后的请求在模型下载完成后得到新的key），计算结果在进程内缓存。
+    """
+    from mineru.utils.models_download_utils import get_cached_model_root_path
+
+    repo_mode = "pipeline" if backend == "pipeline" else "vlm"
+    root_path = get_cached_model_root_path(repo_mode)
+    if root_path is None:
+        return None
+    with _model_weights_fingerprints_lock:
+        fingerprint = _model_weights_fingerprints.get(root_path)
+        if fingerprint is None:
+            relative_paths = PIPELINE_MODEL_PATHS if repo_mode == "pipeline" else ["/"]
+            fingerprint = _fingerprint_model_files(root_path, relative_paths)
+            _model_weights_fingerprints[root_path] = fingerprint
+        return fingerprint
+
+
+def get_model_versions(backend):
+    """参与缓存key计算的模型版本信息，mineru版本或本地模型权重变化后旧缓存自动失效"""
+    versions = {"mineru": __version__}
+    if backend == "pipeline":
+        versions["formula_ch_support"] = os.getenv("MINERU_FORMULA_CH_SUPPORT", "False").lower()
+        versions["models"] = PIPELINE_MODEL_PATHS
+    else:
+        versions["models"] = [ModelPath.vlm_root_hf]
+    if not backend.endswith("client"):
+        # client后端在远端推理，本地没有模型权重
+        try:
+            versions["weights"] = get_model_weights_fingerprint(backend)
+        except Exception as e:
+            logger.warning(f"Failed to fingerprint model weights: {e}")
+            versions["weights"] = None
+    return versions
+
+
+def get_output_settings(backend):
+    """影响解析结果的环境变量开关，参与缓存key计算，切换其中任何一个开关后都不会命中切换前写入的缓存"""
+    llm_aided_config = get_llm_aided_config() or {}
+    title_aided_config = llm_aided_config.get("title_aided") or {}
+    settings = {
+        "table_merge": os.getenv("MINERU_TABLE_MERGE_ENABLE", "true").lower(),
+        "llm_aided_title": title_aided_config.get("model") if title_aided_config.get("enable", False) else None,
+    }
+    if backend == "pipeline":
+        from mineru.model.mfr.formula_cache import get_formula_cache_dir, get_formula_cache_size
+
+        settings["text_layer_spans"] = get_text_layer_spans_enable()
+        settings["formula_cache"] = get_formula_cache_size() > 0 or bool(get_formula_cache_dir())
+    return settings
+
+
+def make_cache_key(
+        pdf_bytes,
+        start_page_id,
+        end_page_id,
+        backend,
+        parse_method,
+        lang,
+        formula_enable,
+        table_enable,
+        server_url=None,
+        page_count=None,
+):
+    """根据PDF内容、页码范围和解析参数计算缓存key。
+
+    裁剪页码范围后重新保存的PDF字节并不稳定（pdfium会写入随机的文档ID），
+    因此对原始PDF字节和归一化后的页码范围计算hash，与对裁剪后的内容寻址等价。
+    pdf_bytes为DocumentHandle时直接使用其原始字节和已归一化的页码范围；传入字节数据时由调用方通过page_count
+    提供文档页数用于归一化end_page_id，不会为此再次解析PDF（未提供时按传入的页码范围计算）。
+    """
+    if isinstance(pdf_bytes, DocumentHandle):
+        start_page_id, end_page_id = pdf_bytes.start_page_id, pdf_bytes.end_page_id
+        pdf_bytes = pdf_bytes.src_pdf_bytes
+    elif page_count is not None:
+        end_page_id = get_end_page_id(end_page_id, page_count)
+
+    key_info = {
+        "pdf_sha256": hashlib.sha256(pdf_bytes).hexdigest(),
+        "page_range": [start_page_id, end_page_id],
+        "backend": backend,
+        "parse_method": parse_method if backend == "pipeline" else "vlm",
+        "lang": lang if backend == "pipeline" else None,
+        "formula_enable": bool(get_formula_enable(formula_enable)),
+        "table_enable": bool(get_table_enable(table_enable)),
+        "server_url": server_url if backend.endswith("client") else None,
+        "versions": get_model_versions(backend),
+        "settings": get_output_settings(backend),
+    }
+    key_str = json.dumps(key_info, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+
+
+def collect_image_paths(obj, image_paths=None):
+    """收集middle_json中引用的所有图片路径"""
+    if image_paths is None:
+        image_paths = set()
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key == "image_path" and isinstance(value, str) and value:
+                image_paths.add(value)
+            else:
+                collect_image_paths(value, image_paths)
+    elif isinstance(obj, list):
+        for item in obj:
+            collect_image_paths(item, image_paths)
+    return image_paths
+
+
+def _get_dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return total
+
+
+class ParseResultCache:
+    """基于内容寻址的解析结果磁盘缓存，按总大小做LRU淘汰。
+
+    每个缓存条目是 cache_dir 下以key命名的目录，包含 model.json、middle.json 以及
+    middle_json 引用的截图，命中时可以直接跳到 _process_output 生成输出文件。
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None  # key -> [size, last_access]
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        for key in os.listdir(self.cache_dir):
+            if key.startswith("."):
+                # 尚未提交的临时条目
+                continue
+            entry_dir = os.path.join(self.cache_dir, key)
+            meta_path = os.path.join(entry_dir, CACHE_META_FILE)
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    size = json.load(f)["size"]
+                last_access = os.path.getmtime(meta_path)
+            except (OSError, ValueError, KeyError):
+                continue
+            self._index[key] = [size, last_access]
+            self._total_bytes += size
+
+    def get(self, key):
+        """命中时返回 (model_json, middle_json, images_dir)，否则返回 None"""
+        entry_dir = os.path.join(self.cache_dir, key)
+        with self._lock:
+            self._load_index()
+            try:
+                with open(os.path.join(entry_dir, CACHE_MODEL_FILE), "r", encoding="utf-8") as f:
+                    model_json = json.load(f)
+                with open(os.path.join(entry_dir, CACHE_MIDDLE_FILE), "r", encoding="utf-8") as f:
+                    middle_json = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            now = time.time()
+            try:
+                os.utime(os.path.join(entry_dir, CACHE_META_FILE), (now, now))
+            except OSError:
+                pass
+            if key in self._index:
+                self._index[key][1] = now
+        return model_json, middle_json, os.path.join(entry_dir, CACHE_IMAGES_DIR)
+
+    def put(self, key, model_json, middle_json, local_image_dir):
+        tmp_dir = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(os.path.join(tmp_dir, CACHE_IMAGES_DIR))
+            with open(os.path.join(tmp_dir, CACHE_MODEL_FILE), "w", encoding="utf-8") as f:
+                json.dump(model_json, f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, CACHE_MIDDLE_FILE), "w", encoding="utf-8") as f:
+                json.dump(middle_json, f, ensure_ascii=False)
+            for image_path in collect_image_paths(middle_json):
+                src_path = os.path.join(local_image_dir, image_path)
+                if os.path.isfile(src_path):
+                    shutil.copyfile(src_path, os.path.join(tmp_dir, CACHE_IMAGES_DIR, os.path.basename(image_path)))
+            size = _get_dir_size(tmp_dir)
+            with open(os.path.join(tmp_dir, CACHE_META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"size": size, "created": time.time()}, f)
+        except Exception as e:
+            logger.warning(f"Failed to write result cache entry {key}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        if size > self.max_bytes:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        with self._lock:
+            self._load_index()
+            if os.path.exists(entry_dir):
+                # 其他请求已写入相同内容
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError as e:
+                logger.warning(f"Failed to commit result cache entry {key}: {e}")
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return
+            self._index[key] = [size, time.time()]
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            del self._index[key]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def restore_images(self, images_dir, image_writer):
+        if not os.path.isdir(images_dir):
+            return
+        for file_name in os.listdir(images_dir):
+            with open(os.path.join(images_dir, file_name), "rb") as f:
+                image_writer.write(file_name, f.read())
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            total = self.hits + self.misses
+            return {
+                "enabled": True,
+                "cache_dir": self.cache_dir,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """返回进程内共享的结果缓存，未设置 MINERU_RESULT_CACHE_DIR 时返回 None"""
+    global _result_cache
+    cache_dir = get_result_cache_dir()
+    if not cache_dir:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None or _result_cache.cache_dir != cache_dir:
+            _result_cache = ParseResultCache(cache_dir, get_result_cache_max_bytes())
+        return _result_cache
+
+
+def get_result_cache_stats():
+    result_cache = get_result_cache()
+    if result_cache is None:
+        return {"enabled": False}
+    return result_cache.stats()
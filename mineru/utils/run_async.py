@@ -1,6 +1,6 @@
 import asyncio
 import threading
-from queue import Queue
+from queue import Full, Queue
 from typing import Any, AsyncIterable, Coroutine, Iterable, TypeVar
 
 T = TypeVar("T")
@@ -50,3 +50,61 @@ def iter_async(iterable: AsyncIterable[T]) -> Iterable[T]:
         yield chunk
 
     thread.join()
+
+
+class _ThreadIterEnd:
+    pass
+
+
+class _ThreadIterError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def iter_in_thread(iterable: Iterable[T], maxsize: int = 1, name: str = None) -> Iterable[T]:
+    """在后台线程中迭代iterable，通过容量为maxsize的有界队列按顺序产出结果。
+
+    多个iter_in_thread串联即可构成生产者/消费者流水线，相邻阶段互相重叠执行，
+    有界队列保证上游最多只领先下游maxsize个元素。调用方关闭本生成器（提前结束迭代）时后台线程在下一次入队时退出，
+    并在后台线程中关闭iterable（例如生成器）使其finally中的清理逻辑得以执行，关闭操作等待后台线程退出后才返回。
+    """
+    queue = Queue(maxsize=max(1, maxsize))
+    stop_event = threading.Event()
+
+    def put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def helper():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_ThreadIterEnd())
+        except BaseException as e:
+            put(_ThreadIterError(e))
+        finally:
+            # 在迭代iterable的线程中关闭它，串联的上游阶段也随之依次关闭
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=helper, name=name, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = queue.get()
+            if isinstance(item, _ThreadIterEnd):
+                break
+            if isinstance(item, _ThreadIterError):
+                raise item.error
+            yield item
+    finally:
+        stop_event.set()
+        thread.join()
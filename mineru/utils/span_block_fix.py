@@ -1,5 +1,5 @@
 # Copyright (c) Opendatalab. All rights reserved.
-from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio
+from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio, BboxSpatialIndex
 from mineru.utils.enum_class import BlockType, ContentType
 from mineru.utils.ocr_utils import _is_overlaps_y_exceeds_threshold, _is_overlaps_x_exceeds_threshold
 
@@ -9,6 +9,8 @@ VERTICAL_SPAN_IN_BLOCK_THRESHOLD = 0.8
 def fill_spans_in_blocks(blocks, spans, radio):
     """将allspans中的span按位置关系，放入blocks中."""
     block_with_spans = []
+    span_index = BboxSpatialIndex([span['bbox'] for span in spans])
+    assigned_span_indexes = set()
     for block in blocks:
         block_type = block[7]
         block_bbox = block[0:4]
@@ -22,21 +24,25 @@ def fill_spans_in_blocks(blocks, spans, radio):
         ]:
             block_dict['group_id'] = block[-1]
         block_spans = []
-        for span in spans:
+        # 只检查与block相交的span，已经放入其他block的span跳过
+        for span_idx in span_index.query(block_bbox):
+            if span_idx in assigned_span_indexes:
+                continue
+            span = spans[span_idx]
             temp_radio = radio
             span_bbox = span['bbox']
             if span['type'] in [ContentType.IMAGE, ContentType.TABLE]:
                 temp_radio = 0.9
             if calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > temp_radio and span_block_type_compatible(span['type'], block_type):
                 block_spans.append(span)
+                assigned_span_indexes.add(span_idx)
 
         block_dict['spans'] = block_spans
         block_with_spans.append(block_dict)
 
-        # 从spans删除已经放入block_spans中的span
-        if len(block_spans) > 0:
-            for span in block_spans:
-                spans.remove(span)
+    # 从spans删除已经放入block_spans中的span
+    if len(assigned_span_indexes) > 0:
+        spans[:] = [span for span_idx, span in enumerate(spans) if span_idx not in assigned_span_indexes]
 
     return block_with_spans, spans
 
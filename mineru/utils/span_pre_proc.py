@@ -8,10 +8,11 @@ import numpy as np
 from loguru import logger
 
 from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio, calculate_iou, \
-    get_minbox_if_overlap_by_ratio
+    get_minbox_if_overlap_by_ratio, BboxSpatialIndex, batch_calculate_overlap_area_in_bbox1_area_ratio
 from mineru.utils.enum_class import BlockType, ContentType
 from mineru.utils.pdf_image_tools import get_crop_img
 from mineru.utils.pdf_text_tool import get_page
+from mineru.utils.pdfium_lock import pdfium_lock
 
 
 def remove_outside_spans(spans, all_bboxes, all_discarded_blocks):
@@ -29,79 +30,119 @@ def remove_outside_spans(spans, all_bboxes, all_discarded_blocks):
     other_block_bboxes = get_block_bboxes(all_bboxes, other_block_type)
     discarded_block_bboxes = get_block_bboxes(all_discarded_blocks, [BlockType.DISCARDED])
 
+    # span与各类block两两之间的重叠面积比例，block数量较少，直接按矩阵批量计算
+    span_bboxes = [span['bbox'] for span in spans]
+
+    def overlap_any(block_bboxes, ratio):
+        return (batch_calculate_overlap_area_in_bbox1_area_ratio(span_bboxes, block_bboxes) > ratio).any(axis=1)
+
+    in_discarded = overlap_any(discarded_block_bboxes, 0.4)
+    in_image = overlap_any(image_bboxes, 0.5)
+    in_table = overlap_any(table_bboxes, 0.5)
+    in_other_block = overlap_any(other_block_bboxes, 0.5)
+
     new_spans = []
 
-    for span in spans:
-        span_bbox = span['bbox']
+    for span_idx, span in enumerate(spans):
         span_type = span['type']
 
-        if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.4 for block_bbox in
-               discarded_block_bboxes):
+        if in_discarded[span_idx]:
             new_spans.append(span)
             continue
 
         if span_type == ContentType.IMAGE:
-            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.5 for block_bbox in
-                   image_bboxes):
+            if in_image[span_idx]:
                 new_spans.append(span)
         elif span_type == ContentType.TABLE:
-            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.5 for block_bbox in
-                   table_bboxes):
+            if in_table[span_idx]:
                 new_spans.append(span)
         else:
-            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.5 for block_bbox in
-                   other_block_bboxes):
+            if in_other_block[span_idx]:
                 new_spans.append(span)
 
     return new_spans
 
 
+def get_span_candidates(spans):
+    """
+    用空间索引找出每个span可能与之重叠的span下标，并计算每个span的等值分组id。
+    原先的实现用 == 和 in 比较span（字典按值比较），内容完全相同的span被视为同一个span，
+    分组id为与其相等的第一个span的下标，用于在索引化之后保持完全一致的去重语义。
+    相等的span的bbox必然相同，因此只需在候选集合中查找。
+    """
+    span_index = BboxSpatialIndex([span['bbox'] for span in spans])
+    candidates_list = [span_index.query(span['bbox']) for span in spans]
+    equal_ids = []
+    for i, span in enumerate(spans):
+        equal_id = i
+        for j in candidates_list[i]:
+            if j >= i:
+                break
+            if spans[j]['bbox'] == span['bbox'] and spans[j] == span:
+                equal_id = equal_ids[j]
+                break
+        equal_ids.append(equal_id)
+    return candidates_list, equal_ids
+
+
+def remove_spans_by_equal_ids(spans, dropped_ids):
+    """对每个被删除的分组执行一次spans.remove，即删除该分组中的第一个span（下标等于分组id）"""
+    if len(dropped_ids) > 0:
+        spans[:] = [span for i, span in enumerate(spans) if i not in dropped_ids]
+
+
 def remove_overlaps_low_confidence_spans(spans):
     dropped_spans = []
+    dropped_ids = set()
+    candidates_list, equal_ids = get_span_candidates(spans)
     #  删除重叠spans中置信度低的的那些
-    for span1 in spans:
-        for span2 in spans:
-            if span1 != span2:
+    for i, span1 in enumerate(spans):
+        for j in candidates_list[i]:
+            span2 = spans[j]
+            if equal_ids[i] != equal_ids[j]:
                 # span1 或 span2 任何一个都不应该在 dropped_spans 中
-                if span1 in dropped_spans or span2 in dropped_spans:
+                if equal_ids[i] in dropped_ids or equal_ids[j] in dropped_ids:
                     continue
                 else:
                     if calculate_iou(span1['bbox'], span2['bbox']) > 0.9:
                         if span1['score'] < span2['score']:
-                            span_need_remove = span1
+                            span_need_remove, remove_id = span1, equal_ids[i]
                         else:
-                            span_need_remove = span2
-                        if (
-                            span_need_remove is not None
-                            and span_need_remove not in dropped_spans
-                        ):
+                            span_need_remove, remove_id = span2, equal_ids[j]
+                        if remove_id not in dropped_ids:
+                            dropped_ids.add(remove_id)
                             dropped_spans.append(span_need_remove)
 
-    if len(dropped_spans) > 0:
-        for span_need_remove in dropped_spans:
-            spans.remove(span_need_remove)
+    remove_spans_by_equal_ids(spans, dropped_ids)
 
     return spans, dropped_spans
 
 
 def remove_overlaps_min_spans(spans):
     dropped_spans = []
+    dropped_ids = set()
+    candidates_list, equal_ids = get_span_candidates(spans)
+    # 与原先按bbox查找第一个匹配span的逻辑一致
+    first_index_by_bbox = {}
+    for i, span in enumerate(spans):
+        first_index_by_bbox.setdefault(tuple(span['bbox']), i)
     #  删除重叠spans中较小的那些
-    for span1 in spans:
-        for span2 in spans:
-            if span1 != span2:
+    for i, span1 in enumerate(spans):
+        for j in candidates_list[i]:
+            span2 = spans[j]
+            if equal_ids[i] != equal_ids[j]:
                 # span1 或 span2 任何一个都不应该在 dropped_spans 中
-                if span1 in dropped_spans or span2 in dropped_spans:
+                if equal_ids[i] in dropped_ids or equal_ids[j] in dropped_ids:
                     continue
                 else:
                     overlap_box = get_minbox_if_overlap_by_ratio(span1['bbox'], span2['bbox'], 0.65)
                     if overlap_box is not None:
-                        span_need_remove = next((span for span in spans if span['bbox'] == overlap_box), None)
-                        if span_need_remove is not None and span_need_remove not in dropped_spans:
-                            dropped_spans.append(span_need_remove)
-    if len(dropped_spans) > 0:
-        for span_need_remove in dropped_spans:
-            spans.remove(span_need_remove)
+                        remove_index = first_index_by_bbox[tuple(overlap_box)]
+                        if equal_ids[remove_index] not in dropped_ids:
+                            dropped_ids.add(equal_ids[remove_index])
+                            dropped_spans.append(spans[remove_index])
+
+    remove_spans_by_equal_ids(spans, dropped_ids)
 
     return spans, dropped_spans
 
@@ -122,7 +163,9 @@ def __replace_unicode(text: str):
 """pdf_text dict方案 char级别"""
 def txt_spans_extract(pdf_page, spans, pil_img, scale, all_bboxes, all_discarded_blocks):
 
-    page_dict = get_page(pdf_page)
+    # 文本页和字符提取是pdfium调用，只在这里持有pdfium_lock
+    with pdfium_lock:
+        page_dict = get_page(pdf_page)
 
     page_all_chars = []
     page_all_lines = []
@@ -296,17 +339,18 @@ def chars_to_content(span):
         # Calculate the median width
         median_width = statistics.median(char_widths)
 
-        content = ''
-        for char in span['chars']:
+        content_list = []
+        chars = span['chars']
+        # 每个char与其真正的后继配对（内容完全相同的重复char也按各自位置取后继）
+        for char1, char2 in zip(chars, chars[1:] + [None]):
 
             # 如果下一个char的x0和上一个char的x1距离超过0.25个字符宽度，则需要在中间插入一个空格
-            char1 = char
-            char2 = span['chars'][span['chars'].index(char) + 1] if span['chars'].index(char) + 1 < len(span['chars']) else None
-            if char2 and char2['bbox'][0] - char1['bbox'][2] > median_width * 0.25 and char['char'] != ' ' and char2['char'] != ' ':
-                content += f"{char['char']} "
+            if char2 and char2['bbox'][0] - char1['bbox'][2] > median_width * 0.25 and char1['char'] != ' ' and char2['char'] != ' ':
+                content_list.append(f"{char1['char']} ")
             else:
-                content += char['char']
+                content_list.append(char1['char'])
 
+        content = ''.join(content_list)
         content = __replace_unicode(content)
         content = __replace_ligatures(content)
         content = __replace_ligatures(content)
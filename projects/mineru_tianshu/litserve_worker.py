@@ -20,6 +20,7 @@ from loguru import logger
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from task_db import TaskDB
+from mineru.backend.pipeline.model_warmup import get_model_preload_enable, warmup_pipeline_models
 from mineru.cli.common import do_parse, read_fn
 from mineru.utils.config_reader import get_device
 from mineru.utils.model_utils import get_vram, clean_memory
@@ -108,6 +109,13 @@ class MinerUWorkerAPI(ls.LitAPI):
             else:
                 os.environ['MINERU_VIRTUAL_VRAM_SIZE'] = '1'
         
+        # 预加载 pipeline 模型并用合成页面预热，避免第一个任务承担模型加载耗时（MINERU_MODEL_PRELOAD=0 关闭）
+        if get_model_preload_enable(default=True):
+            try:
+                warmup_pipeline_models()
+            except Exception as e:
+                logger.warning(f"⚠️  Model warm-up failed, models will be loaded on first task: {e}")
+        
         # 初始化 MarkItDown（如果可用）
         if MARKITDOWN_AVAILABLE:
             self.markitdown = MarkItDown()
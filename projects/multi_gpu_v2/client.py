@@ -1,4 +1,5 @@
 import base64
+import json
 import os
 from loguru import logger
 import asyncio
@@ -34,6 +35,63 @@ async def mineru_parse_async(session, file_path, url='http://127.0.0.1:8000/pred
         return {'error': str(e)}
 
 
+async def mineru_parse_stream_async(session, file_path, url='http://127.0.0.1:8000/file_parse',
+                                    stream_format='ndjson', **options):
+    """
+    Stream results from the mineru-api /file_parse endpoint.
+    Yields event dicts as they arrive: progress, page (per-page middle_json / md_content),
+    document (final results after paragraph splitting and cross-page table merging), then done or error.
+    Options are sent as form fields, e.g. backend='pipeline', lang_list=['ch'], return_middle_json=True.
+    """
+    form = aiohttp.FormData()
+    with open(file_path, 'rb') as f:
+        form.add_field('files', f.read(), filename=os.path.basename(file_path))
+    form.add_field('stream_format', stream_format)
+    for key, value in options.items():
+        for item in (value if isinstance(value, (list, tuple)) else [value]):
+            form.add_field(key, str(item).lower() if isinstance(item, bool) else str(item))
+
+    async with session.post(url, data=form) as response:
+        if response.status != 200:
+            error_text = await response.text()
+            logger.error(f"❌ Server error for {file_path}: {error_text}")
+            yield {'event': 'error', 'error': error_text}
+            return
+
+        if stream_format == 'sse':
+            # SSE messages are separated by a blank line, payload is in the data: field
+            data_lines = []
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').rstrip('\r\n')
+                if line.startswith('data:'):
+                    data_lines.append(line[5:].lstrip())
+                elif not line and data_lines:
+                    yield json.loads('\n'.join(data_lines))
+                    data_lines = []
+        else:
+            async for raw_line in response.content:
+                line = raw_line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+async def mineru_parse_stream_log(session, file_path, **options):
+    """
+    Consume the stream, logging progress and pages as they finish. Returns the document event.
+    """
+    document = None
+    async for event in mineru_parse_stream_async(session, file_path, **options):
+        if event['event'] == 'progress':
+            logger.info(f"⏳ {event['file']}: {event['stage']} {event['processed_pages']}/{event['total_pages']}")
+        elif event['event'] == 'page':
+            logger.info(f"📄 {event['file']} page {event['page_idx']}: {len(event['md_content'] or '')} chars")
+        elif event['event'] == 'document':
+            document = event
+        elif event['event'] == 'error':
+            logger.error(f"❌ Failed to process {file_path}: {event['error']}")
+    return document
+
+
 async def main():
     """
     Main function to run all parsing tasks concurrently.
@@ -74,6 +132,9 @@ async def main():
 
         logger.info(f"All Results: {all_results}")
 
+        # === Streaming (requires `mineru-api` instead of the LitServe server) ===
+        # document = await mineru_parse_stream_log(session, existing_files[0], backend='pipeline', lang_list=['ch'])
+
         
     logger.info("🎉 All processing completed!")
 
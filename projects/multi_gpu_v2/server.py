@@ -6,6 +6,7 @@ import litserve as ls
 from fastapi import HTTPException
 from loguru import logger
 
+from mineru.backend.pipeline.model_warmup import get_model_preload_enable, warmup_pipeline_models
 from mineru.cli.common import do_parse, read_fn
 from mineru.utils.config_reader import get_device
 from mineru.utils.model_utils import get_vram
@@ -36,6 +37,14 @@ class MinerUAPI(ls.LitAPI):
             config_endpoint()
         logger.info(f"MINERU_MODEL_SOURCE: {os.environ['MINERU_MODEL_SOURCE']}")
 
+        # Load the pipeline models and run one synthetic page before the worker accepts requests,
+        # so the first request does not pay for weight loading. Set MINERU_MODEL_PRELOAD=0 to skip.
+        if get_model_preload_enable(default=True):
+            try:
+                warmup_pipeline_models()
+            except Exception as e:
+                logger.warning(f"Model warm-up failed, models will be loaded on first request: {e}")
+
 
     def decode_request(self, request):
         """Decode file and options from request"""
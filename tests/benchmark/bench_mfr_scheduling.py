@@ -0,0 +1,116 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""对比UniMERNet公式识别的两种调度方式的吞吐量(formulas/s)：
+
+baseline: 按截图面积排序、固定batch大小，使用transformers的generate解码(整个batch等待最长的序列)。
+length-aware: 按预测的token长度分桶、按token预算决定batch大小，解码时移除已结束的序列。
+
+公式截图来自对语料中每一页运行公式检测(MFD)的结果，公式越密集的语料差异越明显。
+同时输出两种方式识别结果不一致的公式数。
+
+用法:
+    python tests/benchmark/bench_mfr_scheduling.py -p demo/pdfs
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from mineru.backend.pipeline.model_init import AtomModelSingleton
+from mineru.backend.pipeline.model_list import AtomicModel
+from mineru.cli.common import read_fn, pdf_suffixes
+from mineru.utils.config_reader import get_device
+from mineru.utils.enum_class import ModelPath
+from mineru.utils.guess_suffix_or_lang import guess_suffix_by_path
+from mineru.utils.model_utils import get_vram
+from mineru.utils.models_download_utils import auto_download_and_get_model_root_path
+from mineru.utils.pdf_image_tools import load_images_from_pdf
+
+
+def load_formula_crops(input_path, mfd_model):
+    crops = []
+    for doc_path in sorted(Path(input_path).glob('*')):
+        if guess_suffix_by_path(doc_path) not in pdf_suffixes:
+            continue
+        images_list, pdf_doc = load_images_from_pdf(read_fn(doc_path))
+        pdf_doc.close()
+        np_images = [np.asarray(image_dict['img_pil']) for image_dict in images_list]
+        images_mfd_res = mfd_model.batch_predict(np_images, 1)
+        for image, mfd_res in zip(np_images, images_mfd_res):
+            for xyxy in mfd_res.boxes.xyxy:
+                xmin, ymin, xmax, ymax = [int(p.item()) for p in xyxy]
+                crops.append(image[ymin:ymax, xmin:xmax])
+    return crops
+
+
+def run_once(mfr_model, crops, batch_size, length_aware):
+    mfr_model.length_aware_batching = length_aware
+    if length_aware:
+        mfr_model.model.__dict__.pop('_greedy_retire_supported', None)
+    else:
+        mfr_model.model._greedy_retire_supported = lambda: False
+    start = time.perf_counter()
+    results = mfr_model.recognize_crops(crops, batch_size)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--path', default=str(Path(__file__).parents[2] / 'demo' / 'pdfs'))
+    parser.add_argument('-b', '--batch-size', type=int, default=None)
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='重复使用语料中的公式截图，得到更大的测试集')
+    args = parser.parse_args()
+
+    device = get_device()
+    atom_model_manager = AtomModelSingleton()
+    mfd_model = atom_model_manager.get_atom_model(
+        atom_model_name=AtomicModel.MFD,
+        mfd_weights=str(
+            os.path.join(auto_download_and_get_model_root_path(ModelPath.yolo_v8_mfd), ModelPath.yolo_v8_mfd)
+        ),
+        device=device,
+    )
+    mfr_model = atom_model_manager.get_atom_model(
+        atom_model_name=AtomicModel.MFR,
+        mfr_weight_dir=str(os.path.join(
+            auto_download_and_get_model_root_path(ModelPath.unimernet_small), ModelPath.unimernet_small
+        )),
+        device=device,
+    )
+    if not hasattr(mfr_model, 'length_aware_batching'):
+        logger.error('This benchmark requires the unimernet_small formula model (MINERU_FORMULA_CH_SUPPORT=0)')
+        return
+
+    crops = load_formula_crops(args.path, mfd_model) * args.repeat
+    if not crops:
+        logger.error(f'No formulas detected in {args.path}')
+        return
+    batch_size = args.batch_size
+    if batch_size is None:
+        # 与pipeline后端一致：MFR_BASE_BATCH_SIZE × 显存对应的batch_ratio
+        gpu_memory = get_vram(device)
+        batch_ratio = 1
+        for min_memory, ratio in [(16, 16), (12, 8), (8, 4), (6, 2)]:
+            if gpu_memory >= min_memory:
+                batch_ratio = ratio
+                break
+        batch_size = 16 * batch_ratio
+
+    # 预热
+    run_once(mfr_model, crops[:batch_size], batch_size, length_aware=False)
+
+    baseline_results, baseline_cost = run_once(mfr_model, crops, batch_size, length_aware=False)
+    scheduled_results, scheduled_cost = run_once(mfr_model, crops, batch_size, length_aware=True)
+
+    logger.info(f'{len(crops)} formulas, batch size {batch_size}, device {device}')
+    logger.info(f'baseline: {baseline_cost:.2f}s, {len(crops) / baseline_cost:.2f} formulas/s')
+    logger.info(f'length-aware: {scheduled_cost:.2f}s, {len(crops) / scheduled_cost:.2f} formulas/s')
+    logger.info(f'speedup: {baseline_cost / scheduled_cost:.2f}x')
+    mismatches = sum(1 for a, b in zip(baseline_results, scheduled_results) if a != b)
+    logger.info(f'{mismatches}/{len(crops)} formulas differ between the two schedules')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""对比pdf_classify.classify的单次pdfium实现与原先基于pdfminer的实现：
+
+pdfminer: 将抽样页面另存为新PDF，用pdfium统计字符数，再用pdfminer解析两次(extract_text检测(cid:xxx)乱码、
+PDFPageAggregator统计图像覆盖率)。
+pdfium: 一次遍历抽样页面的pdfium对象得到字符数、unicode映射错误数和图像覆盖率。
+
+两种实现使用相同的抽样页面，逐个文件输出分类结果、各项指标和耗时，分类结果不一致时以非0状态退出。
+
+用法:
+    python tests/benchmark/bench_pdf_classify.py -p demo/pdfs
+"""
+import argparse
+import re
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pypdfium2 as pdfium
+from loguru import logger
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.high_level import extract_text
+from pdfminer.layout import LAParams, LTFigure, LTImage
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+from mineru.utils.pdf_classify import (
+    CHARS_THRESHOLD,
+    HIGH_IMAGE_COVERAGE,
+    INVALID_CHARS_THRESHOLD,
+    classify,
+    get_sample_page_indices,
+)
+
+LAPARAMS = LAParams(
+    line_overlap=0.5,
+    char_margin=2.0,
+    line_margin=0.5,
+    word_margin=0.1,
+    boxes_flow=None,
+    detect_vertical=False,
+    all_texts=False,
+)
+
+
+def classify_pdfminer(pdf_bytes, page_indices):
+    """原先的分类实现，返回(分类结果, 乱码比例, 高图像覆盖率页面比例)"""
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    sample_doc = pdfium.PdfDocument.new()
+    sample_doc.import_pages(pdf, page_indices)
+    output_buffer = BytesIO()
+    sample_doc.save(output_buffer)
+    sample_doc.close()
+    pdf.close()
+    sample_pdf_bytes = output_buffer.getvalue()
+
+    sample_pdf = pdfium.PdfDocument(sample_pdf_bytes)
+    cleaned_chars = 0
+    for page in sample_pdf:
+        cleaned_chars += len(re.sub(r'\s+', '', page.get_textpage().get_text_bounded()))
+    page_count = len(sample_pdf)
+    sample_pdf.close()
+
+    text = extract_text(pdf_file=BytesIO(sample_pdf_bytes), laparams=LAPARAMS).replace("\n", "")
+    matches = re.findall(r'\(cid:\d+\)', text)
+    cid_len = sum(len(match) for match in matches)
+    invalid_ratio = len(matches) / (len(matches) + len(text) - cid_len) if text else 0
+
+    rsrcmgr = PDFResourceManager()
+    device = PDFPageAggregator(rsrcmgr, laparams=LAPARAMS)
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    high_coverage_pages = 0
+    for page in PDFPage.get_pages(BytesIO(sample_pdf_bytes)):
+        interpreter.process_page(page)
+        layout = device.get_result()
+        page_area = layout.width * layout.height
+        image_area = sum(
+            element.width * element.height for element in layout if isinstance(element, (LTImage, LTFigure))
+        )
+        if page_area > 0 and min(image_area / page_area, 1.0) >= HIGH_IMAGE_COVERAGE:
+            high_coverage_pages += 1
+    coverage_ratio = high_coverage_pages / page_count
+
+    if cleaned_chars / page_count < CHARS_THRESHOLD or invalid_ratio > INVALID_CHARS_THRESHOLD:
+        result = 'ocr'
+    elif coverage_ratio >= 0.8:
+        result = 'ocr'
+    else:
+        result = 'txt'
+    return result, invalid_ratio, coverage_ratio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--path', nargs='+', default=[
+        str(Path(__file__).parents[2] / 'demo' / 'pdfs'),
+        str(Path(__file__).parents[2] / 'tests' / 'unittest' / 'pdfs'),
+    ])
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_paths = []
+    for path in args.path:
+        path = Path(path)
+        pdf_paths += sorted(path.glob('**/*.pdf')) if path.is_dir() else [path]
+    if not pdf_paths:
+        logger.error(f'No pdf files found in {args.path}')
+        return
+
+    mismatches = 0
+    pdfminer_total = pdfium_total = 0
+    for pdf_path in pdf_paths:
+        pdf_bytes = pdf_path.read_bytes()
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        page_count = len(pdf)
+        pdf.close()
+        if page_count == 0:
+            continue
+        page_indices = get_sample_page_indices(page_count, seed=args.seed)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            pdfminer_result, invalid_ratio, coverage_ratio = classify_pdfminer(pdf_bytes, page_indices)
+        pdfminer_cost = (time.perf_counter() - start) / args.repeat
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            pdfium_result = classify(pdf_bytes, seed=args.seed)
+        pdfium_cost = (time.perf_counter() - start) / args.repeat
+
+        pdfminer_total += pdfminer_cost
+        pdfium_total += pdfium_cost
+        mismatches += pdfminer_result != pdfium_result
+        logger.info(
+            f'{pdf_path.name}: pdfminer={pdfminer_result} ({pdfminer_cost * 1000:.1f}ms, '
+            f'cid ratio {invalid_ratio:.3f}, high coverage pages {coverage_ratio:.2f}), '
+            f'pdfium={pdfium_result} ({pdfium_cost * 1000:.1f}ms)'
+        )
+
+    logger.info(
+        f'{len(pdf_paths)} files: pdfminer {pdfminer_total:.3f}s, pdfium {pdfium_total:.3f}s, '
+        f'speedup {pdfminer_total / pdfium_total:.1f}x, {mismatches} decisions differ'
+    )
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
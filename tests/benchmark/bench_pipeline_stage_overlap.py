@@ -0,0 +1,76 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""对比pipeline后端串行执行与三阶段重叠执行(渲染/推理/middle_json组装)的吞吐量(pages/s)。
+
+用法:
+    python tests/benchmark/bench_pipeline_stage_overlap.py -p demo/pdfs -m auto
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from mineru.cli.common import read_fn, pdf_suffixes, image_suffixes
+from mineru.data.data_reader_writer import FileBasedDataWriter
+from mineru.utils.guess_suffix_or_lang import guess_suffix_by_path
+
+
+def load_corpus(input_path):
+    doc_path_list = []
+    for doc_path in sorted(Path(input_path).glob('*')):
+        if guess_suffix_by_path(doc_path) in pdf_suffixes + image_suffixes:
+            doc_path_list.append(doc_path)
+    return [read_fn(doc_path) for doc_path in doc_path_list]
+
+
+def run_once(pdf_bytes_list, lang, parse_method, overlap):
+    from mineru.backend.pipeline.pipeline_analyze import doc_analyze_streaming
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        image_writer_list = [
+            FileBasedDataWriter(os.path.join(output_dir, str(idx), 'images'))
+            for idx in range(len(pdf_bytes_list))
+        ]
+        page_count = 0
+        start = time.perf_counter()
+        for _, _, middle_json, _ in doc_analyze_streaming(
+                pdf_bytes_list, image_writer_list, [lang] * len(pdf_bytes_list),
+                parse_method=parse_method, overlap=overlap,
+        ):
+            page_count += len(middle_json['pdf_info'])
+        cost = time.perf_counter() - start
+    return page_count, cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--path', default=str(Path(__file__).parents[2] / 'demo' / 'pdfs'))
+    parser.add_argument('-l', '--lang', default='ch')
+    parser.add_argument('-m', '--method', default='auto', choices=['auto', 'txt', 'ocr'])
+    parser.add_argument('-w', '--window', type=int, default=None, help='MINERU_MIN_BATCH_INFERENCE_SIZE')
+    args = parser.parse_args()
+
+    if args.window is not None:
+        os.environ['MINERU_MIN_BATCH_INFERENCE_SIZE'] = str(args.window)
+
+    pdf_bytes_list = load_corpus(args.path)
+    if not pdf_bytes_list:
+        logger.error(f'No pdf or image files found in {args.path}')
+        return
+
+    # 预热，避免模型加载时间计入第一组结果
+    run_once(pdf_bytes_list[:1], args.lang, args.method, overlap=False)
+
+    results = {}
+    for name, overlap in [('serial', False), ('overlapped', True)]:
+        page_count, cost = run_once(pdf_bytes_list, args.lang, args.method, overlap)
+        results[name] = page_count / cost
+        logger.info(f'{name}: {page_count} pages in {cost:.2f}s, {results[name]:.2f} pages/s')
+
+    logger.info(f"speedup: {results['overlapped'] / results['serial']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
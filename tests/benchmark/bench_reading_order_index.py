@@ -0,0 +1,141 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""在合成的高密度页面(财报、词典类，数千行/数千字符)上对比阅读顺序赋值和字符拼接的耗时，
+新实现与原先基于list.index的实现结果必须一致，且加速比不低于--min-speedup，否则以非0状态退出。
+
+用法:
+    python tests/benchmark/bench_reading_order_index.py --lines 3000 --chars 5000
+"""
+import argparse
+import copy
+import random
+import statistics
+import sys
+import time
+
+from loguru import logger
+
+from mineru.utils.block_sort import cal_block_index
+from mineru.utils.enum_class import BlockType
+from mineru.utils.span_pre_proc import chars_to_content
+
+
+def make_dense_page(line_count, lines_per_block=20, duplicate_ratio=0.05, seed=0):
+    """生成一页由大量文本行组成的block，并混入少量bbox完全相同的行"""
+    rng = random.Random(seed)
+    line_bboxes = []
+    for i in range(line_count):
+        if line_bboxes and rng.random() < duplicate_ratio:
+            line_bboxes.append(list(rng.choice(line_bboxes)))
+        else:
+            column = i % 4
+            row = i // 4
+            line_bboxes.append([column * 150 + 10, row * 2, column * 150 + 140, row * 2 + 2])
+
+    blocks = []
+    for start in range(0, line_count, lines_per_block):
+        lines = [{'bbox': bbox, 'spans': []} for bbox in line_bboxes[start:start + lines_per_block]]
+        blocks.append({
+            'type': BlockType.TEXT,
+            'bbox': [min(b[0] for b in line_bboxes[start:start + lines_per_block]),
+                     min(b[1] for b in line_bboxes[start:start + lines_per_block]),
+                     max(b[2] for b in line_bboxes[start:start + lines_per_block]),
+                     max(b[3] for b in line_bboxes[start:start + lines_per_block])],
+            'lines': lines,
+        })
+    sorted_bboxes = list(line_bboxes)
+    rng.shuffle(sorted_bboxes)
+    return blocks, sorted_bboxes
+
+
+def make_dense_span(char_count, seed=0):
+    # 不含完全相同的重复char：重复char时原先的实现以第一次出现位置的后继判断空格，新实现使用真正的后继，结果会不同
+    rng = random.Random(seed)
+    chars = []
+    x = 0.0
+    for i in range(char_count):
+        width = rng.uniform(4, 6)
+        gap = rng.choice([0.0, 0.0, 0.0, 3.0])
+        chars.append({'char': rng.choice('abcdefghij0123456789'), 'bbox': [x + gap, 0, x + gap + width, 10], 'char_idx': i})
+        x += gap + width
+    rng.shuffle(chars)
+    return {'bbox': [0, 0, x, 10], 'chars': chars}
+
+
+def legacy_cal_block_index(fix_blocks, sorted_bboxes):
+    """原先layoutreader分支的实现，作为结果与耗时的基准"""
+    for block in fix_blocks:
+        line_index_list = []
+        if len(block['lines']) == 0:
+            block['index'] = sorted_bboxes.index(block['bbox'])
+        else:
+            for line in block['lines']:
+                line['index'] = sorted_bboxes.index(line['bbox'])
+                line_index_list.append(line['index'])
+            block['index'] = statistics.median(line_index_list)
+    return fix_blocks
+
+
+def legacy_chars_to_content(span):
+    """原先chars_to_content的字符拼接实现(不含unicode/连字替换)"""
+    span['chars'] = sorted(span['chars'], key=lambda x: x['char_idx'])
+    median_width = statistics.median([char['bbox'][2] - char['bbox'][0] for char in span['chars']])
+    content = ''
+    for char in span['chars']:
+        char1 = char
+        char2 = span['chars'][span['chars'].index(char) + 1] if span['chars'].index(char) + 1 < len(span['chars']) else None
+        if char2 and char2['bbox'][0] - char1['bbox'][2] > median_width * 0.25 and char['char'] != ' ' and char2['char'] != ' ':
+            content += f"{char['char']} "
+        else:
+            content += char['char']
+    span['content'] = content.strip()
+    del span['chars']
+
+
+def timeit(func, make_args, repeat):
+    costs = []
+    result = None
+    for _ in range(repeat):
+        args = make_args()
+        start = time.perf_counter()
+        result = func(*args)
+        costs.append(time.perf_counter() - start)
+    return min(costs), result, args
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=3000)
+    parser.add_argument('--chars', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-speedup', type=float, default=5.0)
+    args = parser.parse_args()
+
+    blocks, sorted_bboxes = make_dense_page(args.lines)
+    legacy_cost, _, legacy_args = timeit(
+        legacy_cal_block_index, lambda: (copy.deepcopy(blocks), sorted_bboxes), args.repeat
+    )
+    new_cost, _, new_args = timeit(
+        cal_block_index, lambda: (copy.deepcopy(blocks), sorted_bboxes), args.repeat
+    )
+    legacy_index = [(b['index'], [line['index'] for line in b['lines']]) for b in legacy_args[0]]
+    new_index = [(b['index'], [line['index'] for line in b['lines']]) for b in new_args[0]]
+    assert legacy_index == new_index, 'cal_block_index result differs from list.index implementation'
+    block_speedup = legacy_cost / new_cost
+    logger.info(f'cal_block_index: {args.lines} lines, legacy {legacy_cost * 1000:.1f}ms, '
+                f'new {new_cost * 1000:.1f}ms, speedup {block_speedup:.1f}x')
+
+    span = make_dense_span(args.chars)
+    legacy_cost, _, legacy_args = timeit(legacy_chars_to_content, lambda: (copy.deepcopy(span),), args.repeat)
+    new_cost, _, new_args = timeit(chars_to_content, lambda: (copy.deepcopy(span),), args.repeat)
+    assert legacy_args[0]['content'] == new_args[0]['content'], 'chars_to_content result differs'
+    chars_speedup = legacy_cost / new_cost
+    logger.info(f'chars_to_content: {args.chars} chars, legacy {legacy_cost * 1000:.1f}ms, '
+                f'new {new_cost * 1000:.1f}ms, speedup {chars_speedup:.1f}x')
+
+    if min(block_speedup, chars_speedup) < args.min_speedup:
+        logger.error(f'speedup below {args.min_speedup}x')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
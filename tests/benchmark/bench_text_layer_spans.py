@@ -0,0 +1,143 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""对比pipeline后端中文本区域span的两种构造方式：OCR det(当前默认) 与 文本层span(MINERU_TEXT_LAYER_SPANS)。
+
+吞吐量: 两种方式处理整个语料的耗时与pages/s。
+准确率: 以OCR det方式的结果为基准，逐页比较文本span的内容(去除空白后的字符串相似度)和文本行数，
+输出平均/最低相似度以及差异最大的页面，平均相似度低于--min-similarity时以非0状态退出。
+
+用法:
+    python tests/benchmark/bench_text_layer_spans.py -p demo/pdfs -m txt
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from loguru import logger
+
+from mineru.cli.common import read_fn, pdf_suffixes
+from mineru.data.data_reader_writer import FileBasedDataWriter
+from mineru.utils.enum_class import ContentType
+from mineru.utils.guess_suffix_or_lang import guess_suffix_by_path
+
+
+def load_corpus(input_path):
+    doc_path_list = []
+    for doc_path in sorted(Path(input_path).glob('*')):
+        if guess_suffix_by_path(doc_path) in pdf_suffixes:
+            doc_path_list.append(doc_path)
+    return [(doc_path.name, read_fn(doc_path)) for doc_path in doc_path_list]
+
+
+def run_once(pdf_bytes_list, lang, parse_method, text_layer_spans):
+    from mineru.backend.pipeline.pipeline_analyze import doc_analyze_streaming
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        image_writer_list = [
+            FileBasedDataWriter(os.path.join(output_dir, str(idx), 'images'))
+            for idx in range(len(pdf_bytes_list))
+        ]
+        middle_json_list = [None] * len(pdf_bytes_list)
+        start = time.perf_counter()
+        for pdf_idx, _, middle_json, _ in doc_analyze_streaming(
+                pdf_bytes_list, image_writer_list, [lang] * len(pdf_bytes_list),
+                parse_method=parse_method, use_page_cache=False, text_layer_spans=text_layer_spans,
+        ):
+            middle_json_list[pdf_idx] = middle_json
+        cost = time.perf_counter() - start
+    return middle_json_list, cost
+
+
+def get_page_text_lines(page_info):
+    """按阅读顺序取出页面中所有行的文本span内容"""
+    text_lines = []
+
+    def walk(block):
+        for sub_block in block.get('blocks', []):
+            walk(sub_block)
+        for line in block.get('lines', []):
+            text_lines.append(''.join(
+                span.get('content', '') for span in line['spans'] if span['type'] == ContentType.TEXT
+            ))
+
+    for block in page_info['para_blocks']:
+        walk(block)
+    return text_lines
+
+
+def compare_pages(doc_names, baseline_list, text_layer_list):
+    page_stats = []
+    for doc_name, baseline_json, text_layer_json in zip(doc_names, baseline_list, text_layer_list):
+        for page_idx, (baseline_page, text_layer_page) in enumerate(
+                zip(baseline_json['pdf_info'], text_layer_json['pdf_info'])
+        ):
+            baseline_lines = get_page_text_lines(baseline_page)
+            text_layer_lines = get_page_text_lines(text_layer_page)
+            baseline_text = re.sub(r'\s+', '', ''.join(baseline_lines))
+            text_layer_text = re.sub(r'\s+', '', ''.join(text_layer_lines))
+            if not baseline_text and not text_layer_text:
+                similarity = 1.0
+            else:
+                similarity = SequenceMatcher(None, baseline_text, text_layer_text, autojunk=False).ratio()
+            page_stats.append({
+                'page': f'{doc_name}:{page_idx}',
+                'similarity': similarity,
+                'baseline_lines': len(baseline_lines),
+                'text_layer_lines': len(text_layer_lines),
+            })
+    return page_stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--path', default=str(Path(__file__).parents[2] / 'demo' / 'pdfs'))
+    parser.add_argument('-l', '--lang', default='ch')
+    parser.add_argument('-m', '--method', default='auto', choices=['auto', 'txt'])
+    parser.add_argument('--min-similarity', type=float, default=0.98)
+    parser.add_argument('--show-worst', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.path)
+    if not corpus:
+        logger.error(f'No pdf files found in {args.path}')
+        return
+    doc_names = [doc_name for doc_name, _ in corpus]
+    pdf_bytes_list = [pdf_bytes for _, pdf_bytes in corpus]
+
+    # 预热，避免模型加载时间计入第一组结果
+    run_once(pdf_bytes_list[:1], args.lang, args.method, text_layer_spans=False)
+
+    baseline_list, baseline_cost = run_once(pdf_bytes_list, args.lang, args.method, text_layer_spans=False)
+    text_layer_list, text_layer_cost = run_once(pdf_bytes_list, args.lang, args.method, text_layer_spans=True)
+
+    page_count = sum(len(middle_json['pdf_info']) for middle_json in baseline_list)
+    logger.info(f'ocr-det: {page_count} pages in {baseline_cost:.2f}s, {page_count / baseline_cost:.2f} pages/s')
+    logger.info(f'text-layer: {page_count} pages in {text_layer_cost:.2f}s, {page_count / text_layer_cost:.2f} pages/s')
+    logger.info(f'speedup: {baseline_cost / text_layer_cost:.2f}x')
+
+    page_stats = compare_pages(doc_names, baseline_list, text_layer_list)
+    similarities = [stat['similarity'] for stat in page_stats]
+    mean_similarity = sum(similarities) / len(similarities) if similarities else 1.0
+    logger.info(
+        f'text similarity: mean {mean_similarity:.4f}, min {min(similarities, default=1.0):.4f}, '
+        f'{sum(1 for s in similarities if s == 1.0)}/{len(similarities)} pages identical'
+    )
+    for stat in sorted(page_stats, key=lambda x: x['similarity'])[:args.show_worst]:
+        if stat['similarity'] == 1.0:
+            break
+        logger.info(
+            f"{stat['page']}: similarity {stat['similarity']:.4f}, "
+            f"lines {stat['baseline_lines']} -> {stat['text_layer_lines']}"
+        )
+
+    if mean_similarity < args.min_similarity:
+        logger.error(f'mean text similarity below {args.min_similarity}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""批量推理相关测试共用的假模型调用。"""
+import threading
+
+
+class FakeModelCall:
+    """
+    代替批量推理函数的假模型调用：按输入逐项返回result_fn(item, *args)，并线程安全地记录每次调用的(输入数量, *args)。
+    on_call(items, *args)在返回结果之前调用，用于在测试中通过事件或屏障控制调用的先后顺序；
+    输入包含fail_on时抛出error。
+    """
+
+    def __init__(self, result_fn, fail_on=None, error=RuntimeError, on_call=None):
+        self.result_fn = result_fn
+        self.fail_on = fail_on
+        self.error = error
+        self.on_call = on_call
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def __call__(self, items, *args):
+        with self.lock:
+            self.calls.append((len(items), *args))
+        if self.on_call is not None:
+            self.on_call(items, *args)
+        if self.fail_on is not None and self.fail_on in items:
+            raise self.error(f'bad page {self.fail_on}')
+        return [self.result_fn(item, *args) for item in items]
+
+    @property
+    def call_sizes(self):
+        with self.lock:
+            return [call[0] for call in self.calls]
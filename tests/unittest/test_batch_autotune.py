@@ -0,0 +1,86 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""batch size调优器的探测、OOM回退和profile持久化测试。"""
+import json
+
+import pytest
+
+from mineru.backend.pipeline import batch_autotune
+from mineru.backend.pipeline.batch_autotune import BatchSizeAutotuner
+
+
+@pytest.fixture(autouse=True)
+def cpu_device(monkeypatch):
+    monkeypatch.setenv('MINERU_DEVICE_MODE', 'cpu')
+
+
+class FakeClock:
+    """代替time模块的时钟，推理耗时由测试决定，不受机器负载影响"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(batch_autotune, 'time', clock)
+    return clock
+
+
+def test_probe_and_persist(tmp_path, fake_clock):
+    def fixed_overhead_predict(batch, batch_size):
+        # 每次调用有固定开销，batch越大吞吐越高
+        fake_clock.now += 0.005 + 0.0001 * len(batch)
+        return [item * 10 for item in batch]
+
+    profile_path = str(tmp_path / 'batch_profile.json')
+    autotuner = BatchSizeAutotuner(profile_path=profile_path, max_batch_size=8, enable=True)
+    results = autotuner.run_batches('ocr_det', list(range(100)), fixed_overhead_predict, 1)
+    assert results == [item * 10 for item in range(100)]
+
+    entries = json.load(open(profile_path))['entries']
+    assert [entry['batch_size'] for entry in entries.values()] == [8]
+
+    # 下次启动直接使用profile中的batch size
+    batch_sizes = []
+    reloaded = BatchSizeAutotuner(profile_path=profile_path, max_batch_size=8, enable=True)
+    reloaded.run_batches('ocr_det', list(range(20)), lambda batch, bs: batch_sizes.append(len(batch)) or batch, 1)
+    assert batch_sizes == [8, 8, 4]
+
+
+def test_oom_backoff_splits_failed_batch(tmp_path):
+    calls = []
+
+    def predict(batch, batch_size):
+        calls.append(len(batch))
+        if len(batch) > 4:
+            raise RuntimeError('CUDA out of memory. Tried to allocate 2.00 GiB')
+        return list(batch)
+
+    autotuner = BatchSizeAutotuner(profile_path=str(tmp_path / 'p.json'), enable=True)
+    results = autotuner.run_batches('ocr_det', list(range(40)), predict, 16, shape_bucket='1048576px')
+    assert results == list(range(40))
+    # 16和8先后OOM，失败的批次逐级拆成两半，已知会OOM的大小不再尝试
+    assert calls[:4] == [16, 8, 4, 4] and max(calls[2:]) <= 4
+    entry = next(iter(autotuner.stats()['entries'].values()))
+    assert entry['max_batch_size'] == 4 and entry['oom_count'] >= 2
+
+
+def test_run_with_batch_size_retries_whole_call(tmp_path):
+    def predict(batch_size):
+        if batch_size > 8:
+            raise RuntimeError('CUDA out of memory')
+        return batch_size
+
+    autotuner = BatchSizeAutotuner(profile_path=str(tmp_path / 'p.json'), enable=True)
+    assert autotuner.run_with_batch_size('mfr', predict, 32, work_count=100) == 8
+
+
+def test_disabled_uses_initial_batch_size(tmp_path):
+    autotuner = BatchSizeAutotuner(profile_path=str(tmp_path / 'p.json'), enable=False)
+    calls = []
+    autotuner.run_batches('ocr_det', list(range(10)), lambda batch, bs: calls.append((len(batch), bs)) or batch, 1)
+    assert calls == [(10, 1)]
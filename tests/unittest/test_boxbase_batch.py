@@ -0,0 +1,51 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""boxbase 中批量bbox几何计算与逐对标量函数的逐位一致性测试。"""
+import random
+
+import numpy as np
+import pytest
+
+from mineru.utils.boxbase import (
+    batch_calculate_iou,
+    batch_calculate_overlap_area_2_minbox_area_ratio,
+    batch_calculate_overlap_area_in_bbox1_area_ratio,
+    calculate_iou,
+    calculate_overlap_area_2_minbox_area_ratio,
+    calculate_overlap_area_in_bbox1_area_ratio,
+)
+
+
+def make_bboxes(rng, count, integer):
+    bboxes = []
+    for _ in range(count):
+        if bboxes and rng.random() < 0.2:
+            # 边界相接或完全相同的bbox
+            x0, y0, x1, y1 = rng.choice(bboxes)
+            bbox = rng.choice([[x1, y0, x1 + 10, y1], [x0, y0, x1, y1]])
+        else:
+            x0, y0 = rng.uniform(0, 500), rng.uniform(0, 500)
+            width = 0 if rng.random() < 0.05 else rng.uniform(0, 120)
+            bbox = [x0, y0, x0 + width, y0 + rng.uniform(0, 60)]
+        bboxes.append([int(v) for v in bbox] if integer else bbox)
+    return bboxes
+
+
+@pytest.mark.parametrize("integer", [True, False])
+@pytest.mark.parametrize("batch_func, func", [
+    (batch_calculate_iou, calculate_iou),
+    (batch_calculate_overlap_area_in_bbox1_area_ratio, calculate_overlap_area_in_bbox1_area_ratio),
+    (batch_calculate_overlap_area_2_minbox_area_ratio, calculate_overlap_area_2_minbox_area_ratio),
+])
+def test_batch_kernel_matches_scalar(batch_func, func, integer):
+    rng = random.Random(0)
+    bboxes1 = make_bboxes(rng, 200, integer)
+    bboxes2 = make_bboxes(rng, 150, integer) + bboxes1[:30]
+    matrix = batch_func(bboxes1, bboxes2)
+    expected = np.array([[func(b1, b2) for b2 in bboxes2] for b1 in bboxes1], dtype=np.float64)
+    assert matrix.shape == (len(bboxes1), len(bboxes2))
+    assert np.array_equal(matrix, expected)
+
+
+def test_batch_kernel_empty_input():
+    assert batch_calculate_iou([], [[0, 0, 1, 1]]).shape == (0, 1)
+    assert batch_calculate_overlap_area_in_bbox1_area_ratio([[0, 0, 1, 1]], []).shape == (1, 0)
@@ -0,0 +1,22 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""chars_to_content以每个char真正的后继判断是否插入空格。"""
+from mineru.utils.span_pre_proc import chars_to_content
+
+
+def make_char(char, x0, x1, char_idx):
+    return {'char': char, 'bbox': [x0, 0, x1, 10], 'char_idx': char_idx}
+
+
+def test_duplicate_chars_use_their_own_successor():
+    # 第二个'a'与第一个完全相同，它的后继是'b'（间距足够大），因此'a'和'b'之间插入空格
+    a = make_char('a', 0, 5, 0)
+    span = {'chars': [a, dict(a), make_char('b', 20, 25, 1)]}
+    chars_to_content(span)
+    assert span['content'] == 'aa b'
+    assert 'chars' not in span
+
+
+def test_spaces_follow_gaps():
+    span = {'chars': [make_char('b', 20, 25, 2), make_char('a', 0, 5, 0), make_char('c', 5, 10, 1)]}
+    chars_to_content(span)
+    assert span['content'] == 'ac b'
@@ -0,0 +1,48 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""DocumentHandle 的页码范围、零拷贝与复用测试。"""
+from pathlib import Path
+
+import pypdfium2 as pdfium
+
+from mineru.cli.common import convert_pdf_bytes_to_bytes_by_pypdfium2
+from mineru.utils.document_handle import DocumentHandle
+from mineru.utils.pdf_classify import classify
+from mineru.utils.result_cache import make_cache_key
+
+PDF_BYTES = (Path(__file__).parents[2] / "demo" / "pdfs" / "demo1.pdf").read_bytes()
+
+
+def test_full_range_is_zero_copy():
+    assert convert_pdf_bytes_to_bytes_by_pypdfium2(PDF_BYTES) is PDF_BYTES
+    with DocumentHandle(PDF_BYTES) as doc:
+        assert doc.is_full_range and doc.pdf_bytes is PDF_BYTES
+        assert classify(doc) == classify(PDF_BYTES)
+
+
+def test_page_range_offsets():
+    with DocumentHandle(PDF_BYTES, start_page_id=1, end_page_id=2) as doc:
+        assert len(doc) == 2 and not doc.is_full_range
+        assert doc[0].get_size() == doc.pdf_doc[1].get_size()
+        # 文本页只提取一次
+        assert doc.get_textpage(1) is doc.get_textpage(1)
+        # 裁剪后的PDF只生成一次
+        assert doc.pdf_bytes is doc.pdf_bytes
+        trimmed = pdfium.PdfDocument(doc.pdf_bytes)
+        assert len(trimmed) == 2
+        trimmed.close()
+        assert make_cache_key(doc, 0, None, "pipeline", "auto", "ch", True, True) == make_cache_key(
+            PDF_BYTES, 1, 2, "pipeline", "auto", "ch", True, True, page_count=doc.total_page_count
+        )
+        assert len(doc.get_pypdf_pages()) == 2
+    # 重复关闭不会出错
+    doc.close()
+
+
+def test_pypdf_unreadable_full_range_uses_resaved_pdf():
+    # 去掉startxref后pdfium仍能打开，pypdf无法读取，完整范围时也需要使用pdfium重新保存的PDF
+    broken_bytes = PDF_BYTES.replace(b"startxref", b"xxxxxxxxx")
+    with DocumentHandle(broken_bytes) as doc:
+        assert doc.is_full_range and doc.pdf_bytes is not broken_bytes
+        pages = doc.get_pypdf_pages()
+        assert len(pages) == len(doc)
+        assert [tuple(float(v) for v in page.mediabox[2:]) for page in pages] == doc.get_page_sizes()
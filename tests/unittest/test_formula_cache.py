@@ -0,0 +1,62 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""公式识别缓存(recognize_formulas_with_cache)的hash归一化、去重与磁盘缓存测试。"""
+import cv2
+import numpy as np
+
+from fake_model import FakeModelCall
+from mineru.model.mfr import formula_cache
+from mineru.model.mfr.formula_cache import get_formula_crop_hash, recognize_formulas_with_cache
+
+
+def render_formula(text, scale=1.0, margin=(5, 5)):
+    (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+    img = np.full((h + baseline + 2 * margin[1], w + 2 * margin[0], 3), 255, dtype=np.uint8)
+    cv2.putText(img, text, (margin[0], margin[1] + h), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 2)
+    return img
+
+
+def formula_result(crop):
+    return f"latex{crop.shape[1]}"
+
+
+def test_formula_crop_hash_normalization():
+    # 四周空白不同的同一公式得到相同的hash
+    assert get_formula_crop_hash(render_formula("x+y")) == get_formula_crop_hash(render_formula("x+y", margin=(12, 3)))
+    assert get_formula_crop_hash(render_formula("x+y")) != get_formula_crop_hash(render_formula("x-y"))
+    # 空白图片不参与缓存
+    assert get_formula_crop_hash(np.full((20, 40, 3), 255, dtype=np.uint8)) is None
+
+
+def test_duplicates_are_recognized_once(monkeypatch):
+    monkeypatch.setenv("MINERU_FORMULA_CACHE_SIZE", "16")
+    monkeypatch.delenv("MINERU_FORMULA_CACHE_DIR", raising=False)
+    monkeypatch.setattr(formula_cache, "_formula_cache", None)
+    blank = np.full((20, 40, 3), 255, dtype=np.uint8)
+    crops = [render_formula("x"), render_formula("y"), render_formula("x", margin=(9, 9)), blank]
+    recognizer = FakeModelCall(formula_result)
+    results = recognize_formulas_with_cache(crops, recognizer, namespace="test")
+    assert recognizer.call_sizes == [3]
+    assert results[0] == results[2] and results[3] == "latex40"
+
+    # 第二次调用全部命中缓存，只有无法计算hash的空白图片需要识别
+    results_again = recognize_formulas_with_cache(crops, recognizer, namespace="test")
+    assert recognizer.call_sizes == [3, 1]
+    assert results_again == results
+    # 不同模型的命名空间互不影响
+    recognize_formulas_with_cache(crops[:1], recognizer, namespace="other")
+    assert recognizer.call_sizes == [3, 1, 1]
+
+
+def test_disk_cache_shared_between_instances(monkeypatch, tmp_path):
+    monkeypatch.setenv("MINERU_FORMULA_CACHE_SIZE", "0")
+    monkeypatch.setenv("MINERU_FORMULA_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(formula_cache, "_formula_cache", None)
+    crops = [render_formula("a=b")]
+    recognizer = FakeModelCall(formula_result)
+    expected = recognize_formulas_with_cache(crops, recognizer, namespace="test")
+
+    # 新的缓存实例（相当于新进程）从磁盘读取结果
+    monkeypatch.setattr(formula_cache, "_formula_cache", None)
+    assert recognize_formulas_with_cache(crops, recognizer, namespace="test") == expected
+    assert recognizer.call_sizes == [1]
+    assert formula_cache.get_formula_cache_stats()["disk_hits"] == 1
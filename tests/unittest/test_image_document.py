@@ -0,0 +1,76 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""图片直接输入(ImageDocument)与 图片→PDF→渲染 路径的页面几何一致性测试。"""
+from io import BytesIO
+
+import pypdfium2 as pdfium
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from mineru.cli.common import read_fn
+from mineru.utils.document_handle import ImageDocument, is_pdf_bytes, open_document
+from mineru.utils.enum_class import ImageType
+from mineru.utils.pdf_classify import classify, classify_pdf_doc
+from mineru.utils.pdf_image_tools import images_bytes_to_pdf_bytes, load_images_from_pdf_core
+
+
+def make_tiff(sizes):
+    frames = [Image.new("RGB", size, (i * 60, 128, 255 - i * 60)) for i, size in enumerate(sizes)]
+    buffer = BytesIO()
+    frames[0].save(buffer, format="TIFF", save_all=True, append_images=frames[1:])
+    return buffer.getvalue()
+
+
+def test_geometry_matches_pdf_path():
+    # 小图按200dpi放大，大图按最长边3500缩小
+    image_bytes = make_tiff([(1001, 757), (1500, 2001), (3000, 4001)])
+    pdf_bytes = images_bytes_to_pdf_bytes(image_bytes)
+    expected = load_images_from_pdf_core(pdf_bytes, image_type=ImageType.PIL)
+    pdf_doc = pdfium.PdfDocument(pdf_bytes)
+    with open_document(image_bytes) as doc:
+        assert isinstance(doc, ImageDocument) and len(doc) == 3
+        assert classify(doc) == "ocr"
+        for index, image_dict in enumerate(doc.load_images()):
+            assert image_dict["img_pil"].size == expected[index]["img_pil"].size
+            assert image_dict["scale"] == expected[index]["scale"]
+            assert doc[index].get_size() == pdf_doc[index].get_size()
+    pdf_doc.close()
+
+
+def test_page_range_streams_frames():
+    image_bytes = make_tiff([(300, 200), (200, 300), (100, 100)])
+    with open_document(image_bytes, start_page_id=1, end_page_id=1) as doc:
+        assert len(doc) == 1 and doc.get_page_size(0) == (200.0, 300.0)
+        page_buffer = doc.load_images(image_type=ImageType.BUFFER)[0]["page_buffer"]
+        assert (page_buffer.width, page_buffer.height) == (556, 834)
+        trimmed = pdfium.PdfDocument(doc.pdf_bytes)
+        assert len(trimmed) == 1 and trimmed[0].get_size() == (200.0, 300.0)
+        trimmed.close()
+
+
+def test_image_document_has_no_text_layer():
+    with open_document(make_tiff([(300, 200)])) as doc:
+        assert not doc.has_text_layer
+        assert doc.get_textpage(0) is None
+        # 直接对handle分类也不会访问文本层
+        assert classify_pdf_doc(doc) == "ocr"
+
+
+def test_pdf_detection_uses_leading_header():
+    # 元数据中包含%PDF字符串的图片仍按图片打开
+    metadata = PngInfo()
+    metadata.add_text("Comment", "exported from %PDF-1.7 source")
+    buffer = BytesIO()
+    Image.new("RGB", (64, 32), "white").save(buffer, format="PNG", pnginfo=metadata)
+    png_bytes = buffer.getvalue()
+    assert b"%PDF" in png_bytes[:1024] and not is_pdf_bytes(png_bytes)
+    assert isinstance(open_document(png_bytes), ImageDocument)
+
+    pdf_bytes = images_bytes_to_pdf_bytes(png_bytes)
+    assert is_pdf_bytes(pdf_bytes) and is_pdf_bytes(b"\r\n " + pdf_bytes)
+
+
+def test_read_fn_returns_pdf_unless_image_native(tmp_path):
+    image_path = tmp_path / "page.png"
+    Image.new("RGB", (64, 32), "white").save(image_path)
+    assert is_pdf_bytes(read_fn(image_path))
+    assert read_fn(image_path, image_native=True) == image_path.read_bytes()
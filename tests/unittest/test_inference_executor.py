@@ -0,0 +1,61 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""推理执行器不阻塞事件循环、统计队列深度的测试。"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mineru.utils.inference_executor import InferenceExecutor, ParseCancelledError, raise_if_cancelled
+
+
+def test_event_loop_stays_responsive():
+    executor = InferenceExecutor(max_workers=1)
+
+    async def main():
+        jobs = [asyncio.create_task(executor.run(time.sleep, 0.3)) for _ in range(2)]
+        # 推理线程执行期间事件循环仍可调度其他协程
+        start = time.perf_counter()
+        await asyncio.sleep(0.05)
+        assert time.perf_counter() - start < 0.2
+        stats = executor.stats()
+        assert stats["running"] == 1 and stats["queued"] == 1
+        await asyncio.gather(*jobs)
+
+    asyncio.run(main())
+    stats = executor.stats()
+    assert stats["completed"] == 2 and stats["queued"] == 0 and stats["running"] == 0
+    executor.shutdown()
+
+
+def test_cancelled_job_leaves_queue():
+    executor = InferenceExecutor(max_workers=1)
+    running = executor.submit(time.sleep, 0.2)
+    queued = executor.submit(time.sleep, 0.2)
+    assert queued.cancel()
+    running.result()
+    stats = executor.stats()
+    assert stats["cancelled"] == 1 and stats["queued"] == 0 and stats["completed"] == 1
+    executor.shutdown()
+
+
+def test_running_job_stops_on_cancel_event():
+    executor = InferenceExecutor(max_workers=1)
+    cancel_event = threading.Event()
+    started = threading.Event()
+
+    def job():
+        # 模拟按窗口推理的解析任务，每个窗口之前检查取消
+        raise_if_cancelled(None)
+        started.set()
+        while True:
+            cancel_event.wait(1)
+            raise_if_cancelled(cancel_event)
+
+    future = executor.submit(job)
+    started.wait()
+    cancel_event.set()
+    with pytest.raises(ParseCancelledError):
+        future.result(timeout=5)
+    assert executor.stats()["failed"] == 1
+    executor.shutdown()
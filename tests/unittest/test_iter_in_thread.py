@@ -0,0 +1,45 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""iter_in_thread串联的流水线在调用方提前关闭时的清理测试。"""
+import threading
+
+from mineru.utils.run_async import iter_in_thread
+
+
+def test_closing_pipeline_closes_upstream_generators():
+    closed = []
+
+    def source():
+        try:
+            for item in range(100):
+                yield item
+        finally:
+            closed.append(("source", threading.current_thread().name))
+
+    def double(items):
+        try:
+            for item in items:
+                yield item * 2
+        finally:
+            items.close()
+            closed.append(("double", threading.current_thread().name))
+
+    pipeline = iter_in_thread(double(iter_in_thread(source(), name="render")), name="infer")
+    assert [next(pipeline), next(pipeline)] == [0, 2]
+    pipeline.close()
+    # close返回时两个后台线程都已退出，上游生成器在各自的线程中被关闭
+    assert closed == [("source", "render"), ("double", "infer")]
+    assert not any(thread.name in ("render", "infer") for thread in threading.enumerate())
+
+
+def test_error_is_raised_to_consumer():
+    def failing():
+        yield 1
+        raise ValueError("bad window")
+
+    results = []
+    try:
+        for item in iter_in_thread(failing()):
+            results.append(item)
+    except ValueError as e:
+        results.append(str(e))
+    assert results == [1, "bad window"]
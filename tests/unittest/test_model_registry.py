@@ -0,0 +1,63 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""模型加载记录和预热就绪状态测试。"""
+from mineru.backend.pipeline import model_warmup
+from mineru.backend.pipeline.model_warmup import get_model_preload_enable, is_models_ready, warmup_pipeline_models
+from mineru.utils.config_reader import get_model_replica_key
+from mineru.utils.model_registry import get_loaded_models, track_model_load
+
+
+def test_track_model_load_records_model():
+    with track_model_load('unittest_model', 'cpu'):
+        pass
+    records = [record for record in get_loaded_models() if record['name'] == 'unittest_model']
+    assert len(records) == 1
+    assert records[0]['device'] == 'cpu'
+    assert records[0]['load_time'] >= 0
+    # CPU上无法统计显存
+    assert records[0]['memory_mb'] is None
+
+
+def test_model_preload_enable(monkeypatch):
+    monkeypatch.delenv('MINERU_MODEL_PRELOAD', raising=False)
+    assert get_model_preload_enable() is False
+    assert get_model_preload_enable(default=True) is True
+    monkeypatch.setenv('MINERU_MODEL_PRELOAD', '0')
+    assert get_model_preload_enable(default=True) is False
+    monkeypatch.setenv('MINERU_MODEL_PRELOAD', 'true')
+    assert get_model_preload_enable() is True
+
+
+def test_models_ready_follows_warmup_state(monkeypatch):
+    monkeypatch.setattr(model_warmup, '_warmup_status', model_warmup._WarmupStatus())
+    monkeypatch.delenv('MINERU_MODEL_PRELOAD', raising=False)
+    # 未开启预加载时按需加载，视为就绪
+    assert is_models_ready()
+
+    monkeypatch.setenv('MINERU_MODEL_PRELOAD', '1')
+    assert not is_models_ready()
+    model_warmup._warmup_status.state = 'loading'
+    assert not is_models_ready()
+    model_warmup._warmup_status.state = 'ready'
+    assert is_models_ready()
+
+
+def test_warmup_covers_every_configured_device(monkeypatch):
+    monkeypatch.setattr(model_warmup, '_warmup_status', model_warmup._WarmupStatus())
+    monkeypatch.setenv('MINERU_DEVICE_MODE', 'cpu')
+    monkeypatch.setenv('MINERU_PIPELINE_DEVICES', 'cpu,cpu')
+    warmed = []
+    monkeypatch.setattr(
+        model_warmup, '_warmup_analyze_models', lambda *args, **kwargs: warmed.append(get_model_replica_key())
+    )
+    monkeypatch.setattr(model_warmup, '_warmup_ocr_models', lambda *args, **kwargs: warmed.append('post-process ocr'))
+    monkeypatch.setattr(model_warmup, '_warmup_reading_order', lambda: warmed.append('reading order'))
+
+    warmup_pipeline_models(langs=['ch'], formula_enable=True, table_enable=True)
+    # 每个设备线程的模型副本都在各自的device_context中预热，之后才报告就绪
+    assert warmed == [('cpu', 0), ('cpu', 1), 'post-process ocr', 'reading order']
+    assert model_warmup.get_warmup_status()['state'] == 'ready'
+
+    warmed.clear()
+    monkeypatch.delenv('MINERU_PIPELINE_DEVICES')
+    warmup_pipeline_models(langs=['ch'], formula_enable=True, table_enable=True)
+    assert warmed == [None, 'reading order']
@@ -0,0 +1,65 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""多设备分片推理的测试，使用CPU上的多个虚拟设备。"""
+import threading
+
+import pytest
+
+from fake_model import FakeModelCall
+from mineru.backend.pipeline.multi_device import MultiDeviceAnalyzer, parse_device_list
+from mineru.utils.config_reader import get_device, get_model_replica_key
+
+
+def page_result(page, formula_enable, table_enable):
+    device, replica = get_model_replica_key()
+    return page, get_device(), replica
+
+
+def test_parse_device_list():
+    assert parse_device_list('cuda:0, cuda:1') == ['cuda:0', 'cuda:1']
+    assert parse_device_list(['cpu', 'cpu']) == ['cpu', 'cpu']
+    assert parse_device_list('') is None and parse_device_list(None) is None
+
+
+def test_results_in_page_order_and_work_stealing():
+    shard_count = 20
+    shards_by_replica = {0: 0, 1: 0}
+    lock = threading.Lock()
+    both_started = threading.Barrier(2, timeout=5)
+    replica_0_done = threading.Event()
+
+    def on_call(pages, formula_enable, table_enable):
+        # 两个副本各领取一个分片后，副本1的分片阻塞到副本0处理完其余全部分片，模拟较慢的设备
+        _, replica = get_model_replica_key()
+        with lock:
+            shards_by_replica[replica] += 1
+            first_shard = shards_by_replica[replica] == 1
+            if sum(shards_by_replica.values()) == shard_count:
+                replica_0_done.set()
+        if first_shard:
+            both_started.wait()
+        if replica == 1:
+            assert replica_0_done.wait(5)
+
+    fake_analyze = FakeModelCall(page_result, on_call=on_call)
+    analyzer = MultiDeviceAnalyzer(fake_analyze, ['cpu', 'cpu'], shard_pages=2)
+    results = analyzer.analyze(list(range(40)))
+    analyzer.shutdown()
+
+    assert [page for page, _, _ in results] == list(range(40))
+    assert {device for _, device, _ in results} == {'cpu'}
+    # 两个虚拟设备都参与推理，较快的副本0处理更多分片
+    assert shards_by_replica == {0: shard_count - 1, 1: 1}
+    stats = analyzer.stats()
+    assert sum(device_stats['pages'] for device_stats in stats['devices']) == 40
+    # 调用方线程不在device_context中
+    assert get_model_replica_key() is None
+
+
+def test_shard_error_is_raised():
+    fake_analyze = FakeModelCall(page_result, fail_on=7, error=ValueError)
+    analyzer = MultiDeviceAnalyzer(fake_analyze, ['cpu', 'cpu'], shard_pages=2)
+    with pytest.raises(ValueError, match='bad page 7'):
+        analyzer.analyze(list(range(20)))
+    # 失败后推理器仍可继续处理新的调用
+    assert [page for page, _, _ in analyzer.analyze([1, 2, 3])] == [1, 2, 3]
+    analyzer.shutdown()
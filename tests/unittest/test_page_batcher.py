@@ -0,0 +1,108 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""跨请求页面微批调度器的合并、分组、结果路由与失败隔离测试。"""
+import threading
+
+import pytest
+
+from fake_model import FakeModelCall
+from mineru.backend.pipeline import page_batcher
+from mineru.backend.pipeline.page_batcher import PageBatchScheduler, get_page_batch_scheduler, get_page_batch_stats
+
+
+def page_result(page, formula_enable, table_enable):
+    return f"{page}:{formula_enable}:{table_enable}"
+
+
+def submit_concurrently(scheduler, requests):
+    results = [None] * len(requests)
+    errors = [None] * len(requests)
+
+    def worker(index, pages, flags):
+        try:
+            results[index] = scheduler.analyze(pages, *flags)
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i, *request)) for i, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_pages_from_concurrent_requests_are_merged():
+    analyze = FakeModelCall(page_result)
+    # 等待时间足够长，批次只会在累计到max_pages页时推理，合并结果与线程调度无关
+    scheduler = PageBatchScheduler(analyze, max_wait_ms=60000, max_pages=6)
+    requests = [
+        (["a1", "a2"], (True, True)),
+        (["b1"], (True, True)),
+        (["c1", "c2", "c3"], (True, True)),
+        (["d1", "d2", "d3", "d4", "d5", "d6"], (False, True)),
+    ]
+    results, errors = submit_concurrently(scheduler, requests)
+    assert errors == [None] * 4
+    # 每个请求按原顺序拿回自己的结果
+    for (pages, flags), result in zip(requests, results):
+        assert result == [page_result(page, *flags) for page in pages]
+    # 开关相同的请求合并为一个批次，开关不同的请求单独推理
+    assert sorted(analyze.calls) == [(6, False, True), (6, True, True)]
+    stats = scheduler.stats()
+    assert stats["batch_pages"]["count"] == 2 and stats["request_latency_ms"]["count"] == 4
+    scheduler.shutdown()
+
+
+def test_max_pages_and_failure_isolation():
+    analyze = FakeModelCall(page_result, fail_on="bad")
+    # 4个单页请求按到达顺序两两组成批次
+    scheduler = PageBatchScheduler(analyze, max_wait_ms=60000, max_pages=2)
+    requests = [(["x"], (True, True)), (["bad"], (True, True)), (["y"], (True, True)), (["z"], (True, True))]
+    results, errors = submit_concurrently(scheduler, requests)
+    assert all(pages <= 2 for pages in analyze.call_sizes)
+    # 合并批次失败后逐个重试，只有出错的请求收到异常
+    assert (2, True, True) in analyze.calls and (1, True, True) in analyze.calls
+    assert results[0] == ["x:True:True"] and results[2] == ["y:True:True"] and results[3] == ["z:True:True"]
+    assert errors[0] is None and errors[2] is None and errors[3] is None and isinstance(errors[1], RuntimeError)
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.analyze(["late"])
+
+
+def test_wait_times_out_and_dequeues_request():
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_analyze(pages, formula_enable, table_enable):
+        started.set()
+        release.wait()
+        return pages
+
+    scheduler = PageBatchScheduler(blocking_analyze, max_wait_ms=0, max_pages=1, timeout=0.2)
+    results, errors = submit_concurrently(scheduler, [(["first"], (True, True))])
+    assert isinstance(errors[0], TimeoutError) and started.is_set()
+    # 推理仍被占用时超时的请求从队列中移除，不会在之后被推理
+    results, errors = submit_concurrently(scheduler, [(["second"], (True, True))])
+    assert isinstance(errors[0], TimeoutError)
+    assert scheduler.stats()["queued_requests"] == 0
+    release.set()
+    scheduler.shutdown()
+
+
+def test_schedulers_are_keyed_by_devices(monkeypatch):
+    monkeypatch.setattr(page_batcher, "_page_batch_schedulers", {})
+    monkeypatch.setenv("MINERU_PAGE_BATCH_WAIT_MS", "1")
+    single_device, multi_device = FakeModelCall(page_result), FakeModelCall(page_result)
+    scheduler = get_page_batch_scheduler(single_device)
+    assert get_page_batch_scheduler(FakeModelCall(page_result)) is scheduler
+    # 设备配置不同的请求使用各自的调度器和推理函数，而不是复用首次创建的调度器
+    device_scheduler = get_page_batch_scheduler(multi_device, key=("cpu", "cpu"))
+    assert device_scheduler is not scheduler
+    assert device_scheduler.analyze(["p"]) == ["p:True:True"]
+    assert multi_device.calls == [(1, True, True)] and single_device.calls == []
+    assert [stats["devices"] for stats in get_page_batch_stats()] == [None, ["cpu", "cpu"]]
+    scheduler.shutdown()
+    device_scheduler.shutdown()
+
+    monkeypatch.setenv("MINERU_PAGE_BATCH_WAIT_MS", "0")
+    assert get_page_batch_scheduler(single_device, key=("cpu", "cpu")) is None
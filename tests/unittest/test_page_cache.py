@@ -0,0 +1,36 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""页面推理缓存的key、默认开关和条目存储测试。"""
+from mineru.backend.pipeline.page_cache import PageInferenceCache, get_page_inference_cache, get_text_lines_hash
+
+
+def test_pages_with_different_text_layers_do_not_share_entries():
+    hidden_ocr_layer = [{'bbox': [10.0, 10.0, 200.0, 30.0], 'text': 'scanned text', 'rotation': 0}]
+    keys = [
+        PageInferenceCache.make_key('RENDER', False, 'ch', True, True, get_text_lines_hash(text_lines))
+        for text_lines in (hidden_ocr_layer, [], None)
+    ]
+    # 渲染结果相同的页面，文本层不同（有隐藏OCR层/文本层为空/未提取文本层）时key各不相同
+    assert len(set(keys)) == 3
+    assert get_text_lines_hash([dict(line) for line in hidden_ocr_layer]) == get_text_lines_hash(hidden_ocr_layer)
+
+    cache = PageInferenceCache(max_pages=8)
+    cache.put(keys[0], [{'category_id': 1}])
+    assert cache.get(keys[1]) is None and cache.get(keys[0]) == [{'category_id': 1}]
+
+
+def test_cache_is_opt_in_and_returns_independent_copies(monkeypatch):
+    monkeypatch.delenv('MINERU_PAGE_CACHE_SIZE', raising=False)
+    assert get_page_inference_cache() is None
+
+    cache = PageInferenceCache(max_pages=1)
+    layout_dets = [{'category_id': 1, 'poly': [0, 0, 10, 0, 10, 10, 0, 10]}]
+    cache.put('a', layout_dets)
+    layout_dets[0]['category_id'] = 2
+    first = cache.get('a')
+    # 缓存不受调用方后续修改的影响，每次命中得到独立的对象
+    first[0]['poly'].clear()
+    assert cache.get('a') == [{'category_id': 1, 'poly': [0, 0, 10, 0, 10, 10, 0, 10]}]
+
+    cache.put('b', layout_dets)
+    stats = cache.stats()
+    assert stats['entries'] == 1 and stats['bytes'] > 0 and cache.get('a') is None
@@ -0,0 +1,26 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""pdf_classify 的分类结果与抽样确定性测试。"""
+from pathlib import Path
+
+import pytest
+
+from mineru.utils.pdf_classify import classify, get_sample_page_indices
+
+DEMO_DIR = Path(__file__).parents[2] / "demo" / "pdfs"
+
+
+@pytest.mark.parametrize("file_name, expected", [
+    ("demo1.pdf", "txt"),
+    ("demo2.pdf", "txt"),
+    ("small_ocr.pdf", "ocr"),
+])
+def test_classify(file_name, expected):
+    assert classify((DEMO_DIR / file_name).read_bytes()) == expected
+
+
+def test_sample_page_indices_are_seeded():
+    assert get_sample_page_indices(5) == [0, 1, 2, 3, 4]
+    indices = get_sample_page_indices(100, seed=1)
+    assert len(indices) == 10 and indices == sorted(set(indices))
+    assert indices == get_sample_page_indices(100, seed=1)
+    assert indices != get_sample_page_indices(100, seed=2)
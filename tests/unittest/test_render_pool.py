@@ -0,0 +1,55 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""渲染进程池出错重建时只关闭出错调用所使用的进程池，渲染进程内的文档缓存按文件身份区分。"""
+import os
+from collections import OrderedDict
+
+import pypdfium2 as pdfium
+
+from mineru.utils import pdf_image_tools
+from mineru.utils.pdf_image_tools import _get_worker_pdf_doc, get_render_pool, shutdown_render_pool
+
+
+def test_stale_pool_shutdown_keeps_current_pool():
+    stale_pool = get_render_pool()
+    shutdown_render_pool(kill=True, executor=stale_pool)
+    assert pdf_image_tools._render_pool is None
+
+    # 其他请求已重建进程池后，旧调用的出错处理不能关闭新的进程池
+    current_pool = get_render_pool()
+    assert current_pool is not stale_pool
+    shutdown_render_pool(kill=True, executor=stale_pool)
+    assert pdf_image_tools._render_pool is current_pool
+
+    shutdown_render_pool()
+    assert pdf_image_tools._render_pool is None
+
+
+def test_worker_doc_cache_follows_file_identity(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_image_tools, "_worker_pdf_docs", OrderedDict())
+    pdf_path = str(tmp_path / "shared.pdf")
+
+    def write_pdf(page_count):
+        pdf_doc = pdfium.PdfDocument.new()
+        for _ in range(page_count):
+            pdf_doc.new_page(100, 100)
+        with open(pdf_path, "wb") as f:
+            pdf_doc.save(f)
+        pdf_doc.close()
+
+    write_pdf(1)
+    assert len(_get_worker_pdf_doc(pdf_path)) == 1
+    assert _get_worker_pdf_doc(pdf_path) is _get_worker_pdf_doc(pdf_path)
+
+    # 临时文件删除后同一路径被复用，不能渲染缓存中的旧文档
+    os.remove(pdf_path)
+    write_pdf(3)
+    assert len(_get_worker_pdf_doc(pdf_path)) == 3
+    assert len(pdf_image_tools._worker_pdf_docs) == 1
+
+    # 共享文件删除后，下一个任务开始时关闭对应的缓存文档
+    os.remove(pdf_path)
+    other_path = str(tmp_path / "other.pdf")
+    write_pdf(2)
+    os.rename(pdf_path, other_path)
+    _get_worker_pdf_doc(other_path)
+    assert [key[0] for key in pdf_image_tools._worker_pdf_docs] == [other_path]
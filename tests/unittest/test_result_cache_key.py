@@ -0,0 +1,71 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""结果缓存key包含影响输出的开关，切换开关后不会命中旧缓存。"""
+from pathlib import Path
+
+import pytest
+
+from mineru.utils import result_cache
+from mineru.utils.result_cache import ParseResultCache, make_cache_key
+
+PDF_BYTES = (Path(__file__).parents[2] / "demo" / "pdfs" / "demo1.pdf").read_bytes()
+
+
+@pytest.fixture(autouse=True)
+def output_settings_env(monkeypatch):
+    monkeypatch.setenv("MINERU_DEVICE_MODE", "cpu")
+    for name in ("MINERU_TEXT_LAYER_SPANS", "MINERU_BATCH_AUTOTUNE", "MINERU_FORMULA_CACHE_SIZE",
+                 "MINERU_FORMULA_CACHE_DIR", "MINERU_IMAGE_NATIVE_INPUT", "MINERU_TABLE_MERGE_ENABLE"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def pipeline_key():
+    return make_cache_key(PDF_BYTES, 0, None, "pipeline", "auto", "ch", True, True)
+
+
+@pytest.mark.parametrize("name, value", [
+    ("MINERU_TEXT_LAYER_SPANS", "1"),
+    ("MINERU_FORMULA_CACHE_SIZE", "0"),
+    ("MINERU_TABLE_MERGE_ENABLE", "false"),
+])
+def test_output_setting_changes_key(monkeypatch, name, value):
+    default_key = pipeline_key()
+    monkeypatch.setenv(name, value)
+    assert pipeline_key() != default_key
+
+
+def test_flipped_toggle_misses_cache(monkeypatch, tmp_path):
+    cache = ParseResultCache(str(tmp_path), max_bytes=1024 * 1024)
+    cache.put(pipeline_key(), [{"page_info": {}}], {"pdf_info": []}, str(tmp_path / "images"))
+    assert cache.get(pipeline_key()) is not None
+
+    monkeypatch.setenv("MINERU_TEXT_LAYER_SPANS", "1")
+    assert cache.get(pipeline_key()) is None
+
+
+def test_batch_autotune_does_not_change_key(monkeypatch):
+    # batch size调优不改变解析结果，切换时不应使缓存失效
+    default_key = pipeline_key()
+    monkeypatch.setenv("MINERU_BATCH_AUTOTUNE", "1")
+    assert pipeline_key() == default_key
+
+
+def test_updated_weights_change_key(monkeypatch, tmp_path):
+    weights_path = tmp_path / "models" / "Layout" / "YOLO" / "doclayout_yolo_docstructbench_imgsz1280_2501.pt"
+    weights_path.parent.mkdir(parents=True)
+    weights_path.write_bytes(b"v1")
+    monkeypatch.setenv("MINERU_MODEL_SOURCE", "local")
+    monkeypatch.setattr("mineru.utils.models_download_utils.get_local_models_dir", lambda: {"pipeline": str(tmp_path)})
+    monkeypatch.setattr(result_cache, "_model_weights_fingerprints", {})
+    old_key = pipeline_key()
+
+    # 同一路径下的权重被更新，新进程中计算的key不同
+    weights_path.write_bytes(b"v2-updated")
+    monkeypatch.setattr(result_cache, "_model_weights_fingerprints", {})
+    assert pipeline_key() != old_key
+
+
+def test_bytes_key_uses_caller_page_count():
+    # 字节输入按调用方提供的页数归一化end_page_id，与显式指定最后一页的key相同
+    assert make_cache_key(PDF_BYTES, 0, None, "pipeline", "auto", "ch", True, True, page_count=3) == make_cache_key(
+        PDF_BYTES, 0, 2, "pipeline", "auto", "ch", True, True
+    )
@@ -0,0 +1,223 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""span_pre_proc/span_block_fix 中基于空间索引的重叠处理与原先两两遍历实现的结果一致性回归测试。
+
+以 demo/pdfs 和 tests/unittest/pdfs 中每一页的文本层 line/span 作为span和block的几何来源，
+并混入抖动的重叠span、完全相同的span和图表block，覆盖各个分支。
+"""
+import copy
+import random
+from pathlib import Path
+
+import pypdfium2 as pdfium
+
+from mineru.utils.boxbase import (
+    BboxSpatialIndex,
+    calculate_iou,
+    calculate_overlap_area_in_bbox1_area_ratio,
+    get_minbox_if_overlap_by_ratio,
+)
+from mineru.utils.enum_class import BlockType, ContentType
+from mineru.utils.pdf_text_tool import get_page
+from mineru.utils.span_block_fix import fill_spans_in_blocks, span_block_type_compatible
+from mineru.utils.span_pre_proc import (
+    remove_outside_spans,
+    remove_overlaps_low_confidence_spans,
+    remove_overlaps_min_spans,
+)
+
+ROOT_DIR = Path(__file__).parents[2]
+PDF_PATHS = sorted((ROOT_DIR / "demo" / "pdfs").glob("*.pdf")) + sorted(
+    (ROOT_DIR / "tests" / "unittest" / "pdfs").glob("*.pdf")
+)
+
+
+def legacy_remove_outside_spans(spans, all_bboxes, all_discarded_blocks):
+    def get_block_bboxes(blocks, block_type_list):
+        return [block[0:4] for block in blocks if block[7] in block_type_list]
+
+    image_bboxes = get_block_bboxes(all_bboxes, [BlockType.IMAGE_BODY])
+    table_bboxes = get_block_bboxes(all_bboxes, [BlockType.TABLE_BODY])
+    other_block_type = []
+    for block_type in BlockType.__dict__.values():
+        if not isinstance(block_type, str):
+            continue
+        if block_type not in [BlockType.IMAGE_BODY, BlockType.TABLE_BODY]:
+            other_block_type.append(block_type)
+    other_block_bboxes = get_block_bboxes(all_bboxes, other_block_type)
+    discarded_block_bboxes = get_block_bboxes(all_discarded_blocks, [BlockType.DISCARDED])
+
+    new_spans = []
+    for span in spans:
+        span_bbox = span["bbox"]
+        span_type = span["type"]
+        if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, b) > 0.4 for b in discarded_block_bboxes):
+            new_spans.append(span)
+            continue
+        if span_type == ContentType.IMAGE:
+            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, b) > 0.5 for b in image_bboxes):
+                new_spans.append(span)
+        elif span_type == ContentType.TABLE:
+            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, b) > 0.5 for b in table_bboxes):
+                new_spans.append(span)
+        else:
+            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, b) > 0.5 for b in other_block_bboxes):
+                new_spans.append(span)
+    return new_spans
+
+
+def legacy_remove_overlaps_low_confidence_spans(spans):
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2:
+                if span1 in dropped_spans or span2 in dropped_spans:
+                    continue
+                if calculate_iou(span1["bbox"], span2["bbox"]) > 0.9:
+                    span_need_remove = span1 if span1["score"] < span2["score"] else span2
+                    if span_need_remove not in dropped_spans:
+                        dropped_spans.append(span_need_remove)
+    for span_need_remove in dropped_spans:
+        spans.remove(span_need_remove)
+    return spans, dropped_spans
+
+
+def legacy_remove_overlaps_min_spans(spans):
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2:
+                if span1 in dropped_spans or span2 in dropped_spans:
+                    continue
+                overlap_box = get_minbox_if_overlap_by_ratio(span1["bbox"], span2["bbox"], 0.65)
+                if overlap_box is not None:
+                    span_need_remove = next((span for span in spans if span["bbox"] == overlap_box), None)
+                    if span_need_remove is not None and span_need_remove not in dropped_spans:
+                        dropped_spans.append(span_need_remove)
+    for span_need_remove in dropped_spans:
+        spans.remove(span_need_remove)
+    return spans, dropped_spans
+
+
+def legacy_fill_spans_in_blocks(blocks, spans, radio):
+    block_with_spans = []
+    for block in blocks:
+        block_type = block[7]
+        block_bbox = block[0:4]
+        block_dict = {"type": block_type, "bbox": block_bbox}
+        if block_type in [
+            BlockType.IMAGE_BODY, BlockType.IMAGE_CAPTION, BlockType.IMAGE_FOOTNOTE,
+            BlockType.TABLE_BODY, BlockType.TABLE_CAPTION, BlockType.TABLE_FOOTNOTE
+        ]:
+            block_dict["group_id"] = block[-1]
+        block_spans = []
+        for span in spans:
+            temp_radio = 0.9 if span["type"] in [ContentType.IMAGE, ContentType.TABLE] else radio
+            if calculate_overlap_area_in_bbox1_area_ratio(span["bbox"], block_bbox) > temp_radio \
+                    and span_block_type_compatible(span["type"], block_type):
+                block_spans.append(span)
+        block_dict["spans"] = block_spans
+        block_with_spans.append(block_dict)
+        for span in block_spans:
+            spans.remove(span)
+    return block_with_spans, spans
+
+
+def make_block(bbox, block_type, group_id):
+    return list(bbox) + [None, None, None, block_type, None, None, None, None, 0.9, group_id]
+
+
+def build_page_fixture(page, rng):
+    """用页面文本层的line/span构造span列表、block列表和discarded block列表"""
+    page_dict = get_page(page)
+    spans = []
+    blocks = []
+    discarded_blocks = []
+    for block_idx, text_block in enumerate(page_dict["blocks"]):
+        block_bbox = [round(v, 2) for v in text_block["bbox"]]
+        choice = rng.random()
+        if choice < 0.1:
+            blocks.append(make_block(block_bbox, BlockType.IMAGE_BODY, block_idx))
+            spans.append({"type": ContentType.IMAGE, "bbox": block_bbox, "score": rng.random()})
+        elif choice < 0.2:
+            blocks.append(make_block(block_bbox, BlockType.TABLE_BODY, block_idx))
+            spans.append({"type": ContentType.TABLE, "bbox": block_bbox, "score": rng.random()})
+        elif choice < 0.25:
+            discarded_blocks.append(make_block(block_bbox, BlockType.DISCARDED, block_idx))
+        else:
+            block_type = BlockType.TITLE if choice < 0.3 else BlockType.TEXT
+            blocks.append(make_block(block_bbox, block_type, block_idx))
+
+        for line in text_block["lines"]:
+            for text_span in line["spans"]:
+                bbox = [round(v, 2) for v in text_span["bbox"]]
+                span_type = ContentType.INLINE_EQUATION if rng.random() < 0.1 else ContentType.TEXT
+                span = {"type": span_type, "bbox": bbox, "score": round(rng.random(), 3)}
+                spans.append(span)
+                roll = rng.random()
+                if roll < 0.1:
+                    # 内容完全相同的重复span
+                    spans.append(dict(span))
+                elif roll < 0.2:
+                    # 与原span高度重叠但置信度不同
+                    jitter = [v + rng.uniform(-0.3, 0.3) for v in bbox]
+                    spans.append({"type": span_type, "bbox": jitter, "score": round(rng.random(), 3)})
+                elif roll < 0.25:
+                    # 包含在原span中的较小span
+                    x0, y0, x1, y1 = bbox
+                    spans.append({"type": ContentType.TEXT, "bbox": [x0, y0, (x0 + x1) / 2, y1], "score": 0.5})
+    rng.shuffle(spans)
+    return spans, blocks, discarded_blocks
+
+
+def iter_page_fixtures():
+    rng = random.Random(0)
+    for pdf_path in PDF_PATHS:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            for page_idx in range(len(pdf)):
+                yield f"{pdf_path.name}:{page_idx}", build_page_fixture(pdf[page_idx], rng)
+        finally:
+            pdf.close()
+
+
+def test_spatial_index_query_is_superset():
+    rng = random.Random(1)
+    bboxes = []
+    for _ in range(500):
+        x0, y0 = rng.uniform(0, 600), rng.uniform(0, 800)
+        bboxes.append([x0, y0, x0 + rng.uniform(0, 300), y0 + rng.uniform(0, 40)])
+    index = BboxSpatialIndex(bboxes)
+    for query_bbox in bboxes[:100]:
+        expected = [
+            i for i, bbox in enumerate(bboxes)
+            if max(bbox[0], query_bbox[0]) <= min(bbox[2], query_bbox[2])
+            and max(bbox[1], query_bbox[1]) <= min(bbox[3], query_bbox[3])
+        ]
+        candidates = index.query(query_bbox)
+        assert candidates == sorted(candidates)
+        assert set(expected) <= set(candidates)
+
+
+def test_span_passes_match_pairwise_implementation():
+    assert PDF_PATHS, "no demo pdfs found"
+    page_count = 0
+    for page_name, (spans, blocks, discarded_blocks) in iter_page_fixtures():
+        page_count += 1
+
+        legacy_spans = legacy_remove_outside_spans(copy.deepcopy(spans), blocks, discarded_blocks)
+        new_spans = remove_outside_spans(copy.deepcopy(spans), blocks, discarded_blocks)
+        assert new_spans == legacy_spans, page_name
+
+        legacy_result = legacy_remove_overlaps_low_confidence_spans(copy.deepcopy(legacy_spans))
+        new_result = remove_overlaps_low_confidence_spans(copy.deepcopy(legacy_spans))
+        assert new_result == legacy_result, page_name
+
+        legacy_result = legacy_remove_overlaps_min_spans(legacy_result[0])
+        new_result = remove_overlaps_min_spans(new_result[0])
+        assert new_result == legacy_result, page_name
+
+        for blocks_to_fill, radio in [(discarded_blocks, 0.4), (blocks, 0.5)]:
+            legacy_filled = legacy_fill_spans_in_blocks(blocks_to_fill, copy.deepcopy(legacy_result[0]), radio)
+            new_filled = fill_spans_in_blocks(blocks_to_fill, copy.deepcopy(legacy_result[0]), radio)
+            assert new_filled == legacy_filled, page_name
+    assert page_count > 0
@@ -0,0 +1,111 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""/file_parse 流式返回的事件编码和事件顺序测试。"""
+import asyncio
+import json
+import threading
+
+from mineru.cli import fast_api
+from mineru.cli.fast_api import format_stream_event, stream_parse_events
+
+
+def test_format_stream_event():
+    event = {"event": "page", "file": "demo", "page_idx": 0, "md_content": "# 标题"}
+    line = format_stream_event(event, "ndjson")
+    assert line.endswith("\n") and json.loads(line) == event
+
+    message = format_stream_event(event, "sse")
+    assert message.startswith("event: page\ndata: ") and message.endswith("\n\n")
+    assert json.loads(message.split("data: ", 1)[1]) == event
+
+
+def test_stream_events_keep_order(monkeypatch):
+    async def fake_aio_do_parse(event_callback=None, **kwargs):
+        # 模拟推理线程中产生的事件
+        def worker():
+            for page_idx in range(3):
+                event_callback({"event": "page", "file": "demo", "page_idx": page_idx})
+        thread = threading.Thread(target=worker)
+        thread.start()
+        await asyncio.to_thread(thread.join)
+        event_callback({"event": "document", "file": "demo", "md_content": "done"})
+
+    monkeypatch.setattr(fast_api, "aio_do_parse", fake_aio_do_parse)
+
+    async def collect():
+        parse_kwargs = {"backend": "pipeline", "parse_method": "auto"}
+        return [json.loads(line) async for line in stream_parse_events(parse_kwargs, "ndjson", "/tmp", False)]
+
+    events = asyncio.run(collect())
+    assert [event["event"] for event in events] == ["page", "page", "page", "document", "done"]
+    assert [event["page_idx"] for event in events[:3]] == [0, 1, 2]
+
+
+def test_stream_reports_error(monkeypatch):
+    async def failing_aio_do_parse(event_callback=None, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(fast_api, "aio_do_parse", failing_aio_do_parse)
+
+    async def collect():
+        parse_kwargs = {"backend": "pipeline", "parse_method": "auto"}
+        return [json.loads(line) async for line in stream_parse_events(parse_kwargs, "ndjson", "/tmp", False)]
+
+    events = asyncio.run(collect())
+    assert len(events) == 1 and events[0]["event"] == "error" and "boom" in events[0]["error"]
+
+
+def test_client_disconnect_cancels_running_parse(monkeypatch):
+    worker_stopped = threading.Event()
+
+    async def fake_aio_do_parse(event_callback=None, cancel_event=None, **kwargs):
+        # 模拟推理线程中按窗口产生事件，直到cancel_event被设置
+        def worker():
+            page_idx = 0
+            while not cancel_event.wait(0.001):
+                event_callback({"event": "page", "file": "demo", "page_idx": page_idx})
+                page_idx += 1
+            # 取消后回调不再入队
+            event_callback({"event": "page", "file": "demo", "page_idx": -1})
+            worker_stopped.set()
+        thread = threading.Thread(target=worker)
+        thread.start()
+        await asyncio.to_thread(thread.join)
+
+    monkeypatch.setattr(fast_api, "aio_do_parse", fake_aio_do_parse)
+
+    async def read_first_event():
+        parse_kwargs = {"backend": "pipeline", "parse_method": "auto"}
+        stream = stream_parse_events(parse_kwargs, "ndjson", "/tmp", False)
+        first = json.loads(await stream.__anext__())
+        # 客户端断开连接时StreamingResponse关闭生成器
+        await stream.aclose()
+        await asyncio.to_thread(worker_stopped.wait, 5)
+        return first
+
+    first = asyncio.run(read_first_event())
+    assert first["page_idx"] == 0
+    assert worker_stopped.is_set()
+
+
+def test_request_slot_held_until_stream_finishes(monkeypatch):
+    async def fake_aio_do_parse(event_callback=None, **kwargs):
+        event_callback({"event": "page", "file": "demo", "page_idx": 0})
+
+    monkeypatch.setattr(fast_api, "aio_do_parse", fake_aio_do_parse)
+
+    async def run():
+        request_queue = fast_api.RequestQueue(max_concurrent=1)
+        await request_queue.acquire()
+        request_slot = fast_api.RequestSlot(request_queue).detach()
+        parse_kwargs = {"backend": "pipeline", "parse_method": "auto"}
+        stream = stream_parse_events(parse_kwargs, "ndjson", "/tmp", False, request_slot=request_slot)
+        await stream.__anext__()
+        # 流尚未结束时槽位仍被占用
+        held = request_queue.running
+        async for _ in stream:
+            pass
+        # 响应结束后background再次释放也只生效一次
+        request_slot.release()
+        return held, request_queue.running
+
+    assert asyncio.run(run()) == (1, 0)
@@ -0,0 +1,61 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""文本层span构造(get_text_layer_result_lists)的回退规则测试。"""
+from pathlib import Path
+
+import pypdfium2 as pdfium
+import pytest
+
+from mineru.utils.ocr_utils import get_text_layer_result_lists, is_text_layer_garbled
+from mineru.utils.pdf_text_tool import get_page_text_lines
+
+PDF_PATH = Path(__file__).parents[2] / "demo" / "pdfs" / "demo1.pdf"
+
+
+def make_region(bbox):
+    x0, y0, x1, y1 = bbox
+    return {"category_id": 1, "poly": [x0, y0, x1, y0, x1, y1, x0, y1]}
+
+
+def get_demo_text_lines(scale=2.0):
+    pdf = pdfium.PdfDocument(str(PDF_PATH))
+    try:
+        return get_page_text_lines(pdf[0], scale)
+    finally:
+        pdf.close()
+
+
+def test_text_layer_lines_become_span_skeletons():
+    text_lines = get_demo_text_lines()
+    line = text_lines[0]
+    region = make_region([line["bbox"][0] - 5, line["bbox"][1] - 5, line["bbox"][2] + 5, line["bbox"][3] + 5])
+    result_lists = get_text_layer_result_lists([region], text_lines, [])
+    assert len(result_lists[0]) == 1
+    span = result_lists[0][0]
+    assert span["category_id"] == 15 and span["text"] == "" and span["score"] == 1.0
+    assert span["poly"][0] == pytest.approx(line["bbox"][0], abs=1e-3)
+    assert span["poly"][5] == pytest.approx(line["bbox"][3], abs=1e-3)
+
+    # 行内公式所在的区间从文本行中切除
+    x0, y0, x1, y1 = line["bbox"]
+    mfd_res = [{"bbox": [int(x0) + 40, int(y0), int(x0) + 80, int(y1)]}]
+    result_lists = get_text_layer_result_lists([region], text_lines, mfd_res)
+    assert len(result_lists[0]) == 2
+
+
+def test_regions_without_usable_text_layer_fall_back_to_det():
+    text_lines = get_demo_text_lines()
+    line = text_lines[0]
+    empty_region = make_region([0, 0, 50, 50])
+    # 区域远大于其中的文本行，认为区域内还有文本层之外的文字
+    sparse_region = make_region([line["bbox"][0], line["bbox"][1], line["bbox"][2], line["bbox"][1] + 2000])
+    garbled_lines = [dict(line, text="�" * 10)]
+    region = make_region(line["bbox"])
+    assert get_text_layer_result_lists([empty_region, sparse_region], text_lines[:1], []) == [None, None]
+    assert get_text_layer_result_lists([region], garbled_lines, []) == [None]
+    assert get_text_layer_result_lists([region], [dict(line, rotation=1.5707963)], []) == [None]
+
+
+def test_is_text_layer_garbled():
+    assert is_text_layer_garbled("  \n")
+    assert is_text_layer_garbled("ab�")
+    assert not is_text_layer_garbled("正常的文本 normal text\u0002")